@@ -13,6 +13,11 @@ so "the-ben-shapiro-show" and "The Ben Shapiro Show" are equivalent.
 
 Example usage:
 daily_wire_video_feed.py "The Ben Shapiro Show"
+daily_wire_video_feed.py --cache-dir ~/.cache/rss "The Ben Shapiro Show"
+daily_wire_video_feed.py --store ~/.cache/rss/dailywire.sqlite "The Ben Shapiro Show"
+
+With --store, the site's build id and each episode's video URL are kept between runs
+(the video URLs until their tokens expire), so a run only downloads the episode list and the new episodes.
 
 Requirements:
 Depends on the "requests" library.
@@ -25,47 +30,117 @@ Code has only been tested on Python 3.13 (as of Feb. 2025).
 ## Imports
 
 from atexit import register as atexit
-from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+from dataclasses import dataclass
 from datetime import datetime, timezone
 from html import escape
 from os import path
 from sys import argv, stderr, exit as sysexit
+from threading import Lock
+from time import time
 from traceback import extract_tb
-from typing import Any
+from typing import IO, TYPE_CHECKING, Any
 from urllib import parse as urlparse
 from xml.dom.minidom import Document, Element, parseString as parseXML
+import argparse
+import base64
+import binascii
 import json
 import os
 import re
+import sys
 import syslog
 
-import requests as req
+# Only the modules needed to parse arguments are imported here, so that --help and argument errors are quick.
+# The rest (which import requests) are imported by the functions that use them.
+from python_feed_lib import Pipeline, add_pipeline_args, create_pipeline, get_cache_dir, get_metrics_dir, report_metrics
+
+if TYPE_CHECKING:
+    import requests as req
+    from python_feed_lib import ResultStore
+
+
+## Globals
 
-from python_feed_lib import create_text_node, with_session
+# The keys of the values kept in the store
+BUILD_ID_KEY: str = "build-id"
+VIDEO_URL_KEY: str = "video-url/"
+# How long to keep the build id. It is also forgotten as soon as episode data is not found with it
+BUILD_ID_TTL: float = 7 * 24 * 60 * 60 # One week
+# How long to keep a video URL that does not say when it expires
+DEFAULT_VIDEO_URL_TTL: float = 6 * 60 * 60 # Six hours
+# Video URLs are forgotten this long before they expire, so that a feed reader has time to download the video
+VIDEO_URL_MARGIN: float = 60 * 60 # One hour
+# The query parameters that may give the time (in seconds since the epoch) that a video URL expires
+EXPIRY_PARAMETERS: tuple[str, ...] = ("exp", "expires", "Expires")
 
 
 ## Main function
 
 def main(args: list[str]) -> None:
     """The main function."""
-    if len(args) != 2 or args[1] == "--help" or args[1] == "-h":
-        print(
-            f"Usage: {argv[0]} "
-            "{name}\nExample: "
-            f"{argv[0]} 'Ben After Dark'",
-            file=stderr)
-        sysexit(1)
+    conf = parse_args(args)
     syslog.openlog(ident="DailyWireVideo", facility=syslog.LOG_NEWS)
     atexit(syslog.closelog)
+    if (metrics_dir := get_metrics_dir()) is not None:
+        atexit(report_metrics, None, "DailyWireVideo", metrics_dir)
     try:
-        with with_session(referer="https://www.dailywire.com", user_agent=get_user_agent()) as session:
-            videos = get_videos(args[1], session)
-        feed = create_feed(args[1], videos)
-        print(feed.toxml())
+        with create_session(conf) as session:
+            generate(conf, session, sys.stdout)
     except RuntimeError as err:
         syslog.syslog(f"Unable to download: {err}\n{'\n'.join(extract_tb(err.__traceback__).format())}")
         print(f"Unable to download: {err}", file=stderr)
-        exit(1)
+        sysexit(1)
+
+def create_session(conf: "Config"):
+    """Create the session to download the feed with."""
+    from python_feed_lib import with_session
+    return with_session(
+        referer="https://www.dailywire.com",
+        user_agent=get_user_agent(),
+        cache_dir=conf.cache_dir,
+    )
+
+def generate(conf: "Config", sess: "req.Session", out: IO[str]) -> None:
+    """Download the show's videos, writing the feed to out."""
+    from python_feed_lib import FeedWriter, ResultStore
+    with (ResultStore(conf.store, namespace="dailywire") if conf.store is not None else nullcontext()) as store:
+        videos = get_videos(conf.name, sess, conf.workers, conf.max_age, conf.max_entries, store)
+    FeedWriter(out).write_feed(conf.pipeline.run(create_feed(conf.name, videos)))
+
+
+@dataclass
+class Config:
+    name: str
+    cache_dir: str|None
+    workers: int
+    pipeline: Pipeline
+    store: str|None = None
+    max_age: float|None = None
+    max_entries: int|None = None
+
+def parse_args(args: list[str]) -> Config:
+    """Parse arguments."""
+    parser = argparse.ArgumentParser(
+        prog=args[0],
+        epilog=f"Example: {args[0]} 'Ben After Dark'",
+    )
+    parser.add_argument("name", type=str, help="Name of the show")
+    parser.add_argument("-c", "--cache-dir", type=str, default=None, help="Directory to cache HTTP responses in", dest="cache_dir")
+    parser.add_argument("-w", "--workers", type=int, default=3, help="Number of episodes to download at once", dest="workers")
+    parser.add_argument("-s", "--store", type=str, default=None, help="Database to keep the build id and video URLs in between runs", dest="store")
+    add_pipeline_args(parser)
+    parsed = parser.parse_args(args[1:])
+    return Config(
+        name = parsed.name,
+        cache_dir = parsed.cache_dir if parsed.cache_dir is not None else get_cache_dir(),
+        workers = max(parsed.workers, 1),
+        pipeline = create_pipeline(parser, parsed),
+        store = parsed.store,
+        # Also applied to the episode list, so that old episodes are never downloaded
+        max_age = parsed.max_age,
+        max_entries = parsed.max_entries,
+    )
 
 
 ## XML/Feed Functions
@@ -102,6 +177,7 @@ class VideoElement:
 
     def to_xml(self, doc: Document) -> Element:
         """Create an XML element."""
+        from python_feed_lib import create_text_node
         entry = doc.createElement("entry")
         entry.appendChild(create_text_node("title", escape(self.title), doc))
         entry.appendChild(create_link_element("link", self.article_url, doc))
@@ -125,6 +201,7 @@ class VideoElement:
 
 def create_feed(title: str, videos: list[VideoElement]) -> Document:
     """Create a feed."""
+    from python_feed_lib import create_text_node
     doc: Document = parseXML("""<?xml version="1.0" encoding="utf-8"?>
     <feed xmlns="http://www.w3.org/2005/Atom"></feed>""")
     root = doc.documentElement
@@ -147,6 +224,7 @@ def create_link_element(tag: str, href: str, doc: Document, text: str|None = Non
     """Create a link.
     If text is not provided, then no text element will be created.
     """
+    from python_feed_lib import create_text_node
     element = doc.createElement(tag) if text is None else create_text_node(tag, text, doc)
     element.setAttribute("href", href)
     return element
@@ -194,13 +272,18 @@ def create_video(element: dict[str, Any]) -> VideoElement|None:
 
 ## Download Functions
 
-def get_video_url(article: VideoElement, buildid: str, session: req.Session) -> str:
+def get_video_url(article: VideoElement, build_id: "BuildId", session: "req.Session") -> str:
     """Get the URL of the video corresponding to the element.
     Raises a RuntimeError if unable to get the video URL.
     """
     assert article.slug is not None
-    url = path.join("https://www.dailywire.com/_next/data/", buildid, f"episode/{article.slug}.json")
-    res = session.get(url)
+    while True:
+        current = build_id.get()
+        url = path.join("https://www.dailywire.com/_next/data/", current, f"episode/{article.slug}.json")
+        res = session.get(url)
+        # The episode data moves when the site is rebuilt, so a stored build id is tried again once it is downloaded
+        if res.status_code != 404 or not build_id.invalidate(current):
+            break
     if res.status_code != 200:
         raise RuntimeError(f"Unable to download episode data: received status code {res.status_code}")
     js: dict[str, Any] = {}
@@ -212,7 +295,7 @@ def get_video_url(article: VideoElement, buildid: str, session: req.Session) ->
        or "v4EpisodeData" not in (cmap := js["pageProps"]) \
        or "videoURL" not in (cmap := cmap["v4EpisodeData"]):
         raise RuntimeError("Unable to extract video url from episode data")
-    # TODO: This link is not stable, the token eventually expires
+    # This link is not stable, the token eventually expires (see get_url_expiry)
     assert isinstance(cmap["videoURL"], str)
     assert cmap["videoURL"].startswith("http")
     return cmap["videoURL"]
@@ -230,19 +313,108 @@ def get_user_agent() -> str:
         return env
     return "Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/115.0"
 
-def get_build_id(show_url: str, session: req.Session) -> str:
+def get_build_id(show_url: str, session: "req.Session") -> str:
     """Get the build id."""
     res = session.get(show_url)
     if res.status_code != 200:
         raise RuntimeError(f"Unable to get the build id: Received status code {res.status_code}")
-    getter = re.compile(r'"buildId": ?"(.*?)"')
-    _match = getter.search(res.text)
+    # The page is searched as bytes, since decoding it would need its encoding to be guessed
+    getter = re.compile(rb'"buildId": ?"(.*?)"')
+    _match = getter.search(res.content)
     if _match is None or len(_match.groups()) < 1:
         raise RuntimeError("Unable to find build id in page")
-    return _match.groups()[0]
+    return _match.groups()[0].decode("utf-8", errors="replace")
+
+class BuildId:
+    """The build id of the site, which is part of the episode data URLs.
+    It is downloaded when first needed (rather than for every run), and kept in the store if there is one.
+    """
+    show_url: str
+    session: "req.Session"
+    store: "ResultStore|None"
+    value: str|None
+    # If the value was downloaded during this run (rather than read from the store)
+    downloaded: bool = False
+
+    def __init__(self, show_url: str, session: "req.Session", store: "ResultStore|None" = None):
+        self.show_url = show_url
+        self.session = session
+        self.store = store
+        self.value = store.get(BUILD_ID_KEY) if store is not None else None
+        # Workers wait for the one downloading the build id, rather than each downloading it
+        self._lock = Lock()
+
+    def get(self) -> str:
+        """Get the build id, downloading it if it is not known."""
+        with self._lock:
+            if self.value is None:
+                self.value = get_build_id(self.show_url, self.session)
+                self.downloaded = True
+                if self.store is not None:
+                    self.store.put(BUILD_ID_KEY, self.value, BUILD_ID_TTL)
+            return self.value
+
+    def invalidate(self, stale: str) -> bool:
+        """Forget a build id that episode data was not found with.
+        Returns True if the episode data should be downloaded again (with the next build id from get).
+        A build id downloaded during this run is kept, since the episode is missing rather than the build id stale.
+        """
+        with self._lock:
+            if self.value != stale: # Another worker has already replaced it
+                return True
+            if self.downloaded:
+                return False
+            syslog.syslog(syslog.LOG_INFO, f"Build id {stale} is out of date")
+            self.value = None
+            if self.store is not None:
+                self.store.delete(BUILD_ID_KEY)
+            return True
 
-def get_videos(series_name: str, session: req.Session) -> list[VideoElement]:
-    """Download the main page for the video."""
+def get_url_expiry(url: str) -> float|None:
+    """Get the time (in seconds since the epoch) that a tokenized video URL expires, or None if the URL does not say.
+    The time is read from an expiry parameter, or from the "exp" claim of a token parameter that is a JSON Web Token.
+    """
+    query = urlparse.parse_qs(urlparse.urlsplit(url).query)
+    for name in EXPIRY_PARAMETERS:
+        for value in query.get(name, []):
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    for token in query.get("token", []):
+        parts = token.split(".")
+        if len(parts) != 3:
+            continue
+        try:
+            claims = json.loads(base64.urlsafe_b64decode(parts[1] + "=" * (-len(parts[1]) % 4)))
+        except (binascii.Error, UnicodeDecodeError, json.JSONDecodeError):
+            continue
+        if isinstance(claims, dict) and isinstance(exp := claims.get("exp"), (int, float)):
+            return float(exp)
+    return None
+
+def store_video_url(store: "ResultStore", slug: str, url: str) -> None:
+    """Keep a video URL until shortly before it expires."""
+    expiry = get_url_expiry(url)
+    ttl = DEFAULT_VIDEO_URL_TTL if expiry is None else expiry - time() - VIDEO_URL_MARGIN
+    if ttl > 0:
+        store.put(VIDEO_URL_KEY + slug, url, ttl)
+
+def get_videos(
+        series_name: str,
+        session: "req.Session",
+        workers: int = 3,
+        max_age: float|None = None,
+        max_entries: int|None = None,
+        store: "ResultStore|None" = None,
+) -> list[VideoElement]:
+    """Download the main page for the video.
+    Only the episodes at most max_age days old, and of those the max_entries newest, have their video URLs downloaded.
+    If store is given, video URLs (and the build id) found by a previous run are used until they expire.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    from python_feed_lib import select_newest
+    from python_feed_lib.dates import parse_timestamp
     params = {
         "slug": series_name.replace(' ', '-').lower(),
         "membershipPlan": None
@@ -258,23 +430,29 @@ def get_videos(series_name: str, session: req.Session) -> list[VideoElement]:
         raise RuntimeError("Invalid episode list: Missing componentItems element")
     if not isinstance(js["componentItems"], list):
         raise RuntimeError("Invalid episode list: componentItems is not a List")
-    build_id = get_build_id(f"https://www.dailywire.com/show/{params['slug']}", session)
-    def process_video(item: dict[str, Any]) -> VideoElement|None:
+    build_id = BuildId(f"https://www.dailywire.com/show/{params['slug']}", session, store)
+    parsed = [video for item in js["componentItems"] if (video := create_video(item)) is not None and video.slug is not None]
+    # Shows list their whole back catalogue, so old episodes are dropped before any of their pages are downloaded
+    videos = select_newest(parsed, lambda video: parse_timestamp(video.published), max_age, max_entries)
+    def process_video(video: VideoElement) -> VideoElement|None:
         """Process a video."""
-        parsed = create_video(item)
-        if parsed is None or parsed.slug is None:
-            return None
+        assert video.slug is not None
+        if store is not None and (stored := store.get(VIDEO_URL_KEY + video.slug)) is not None:
+            video.video_url = stored
+            return video
         try:
-            parsed.video_url = get_video_url(parsed, build_id, session)
-            if parsed.video_url.lower() == "access denied":
+            video.video_url = get_video_url(video, build_id, session)
+            if video.video_url.lower() == "access denied":
                 return None
         except RuntimeError as err:
             syslog.syslog(syslog.LOG_INFO, str(err))
             return None
-        return parsed
-    with ThreadPoolExecutor(max_workers=3) as exec:
-        results = [exec.submit(process_video, item) for item in js["componentItems"]]
-        return [res for res in (_r.result() for _r in results) if res is not None]
+        if store is not None:
+            store_video_url(store, video.slug, video.video_url)
+        return video
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(process_video, videos))
+    return [res for res in results if res is not None]
 
 
 ## Driver
@@ -1,91 +1,259 @@
 #! /usr/bin/python3
 
-from enum import Enum, auto
-from typing import Iterable
-from xml.etree import ElementTree
+"""
+Filter articles with unwanted categories out of a feed (Atom, RSS 0.9x or RSS 2.0).
+The feed is streamed: each article is parsed, checked, and written (or dropped) before the next one is read,
+so memory use does not grow with the size of the feed.
+"""
+
+from dataclasses import dataclass
+from typing import IO, Any, Iterator
+from xml.etree.ElementTree import Element, iterparse
+import re
 import sys
 from os import path
 
+from python_feed_lib.pipeline import compile_matcher
+
+## Globals
+
+# Articles are <entry> elements in Atom, and <item> elements in RSS
+ARTICLE_NAMES: frozenset[str] = frozenset(("entry", "item"))
+# The prefix that is always bound to the XML namespace (e.g. xml:lang)
+XML_NAMESPACE: str = "http://www.w3.org/XML/1998/namespace"
+
+# Escapes for text and attribute values
+# (xml.sax.saxutils is not used, since it imports urllib.request, which takes longer to import than the rest of the script)
+TEXT_ESCAPES: dict[int, str] = str.maketrans({"&": "&amp;", "<": "&lt;", ">": "&gt;"})
+ATTRIBUTE_ESCAPES: dict[int, str] = str.maketrans({
+    "&": "&amp;", "<": "&lt;", ">": "&gt;", "\"": "&quot;", "\n": "&#10;", "\r": "&#13;", "\t": "&#9;",
+})
+
+
+## Main function
+
 def main(args: list[str]) -> None:
     """The main function."""
+    generate(parse_args(args), None, sys.stdout)
+
+@dataclass
+class Config:
+    source: str
+    categories: list[str]
+
+def parse_args(args: list[str]) -> Config:
+    """Parse arguments."""
     if len(args) <= 2:
         print(f"Usage: {args[0]} "
               "{<filename>|->} {<category1> ... <categoryn>}\n\"-\" "
               "will read from standard in", file=sys.stderr)
         sys.exit(1)
-    feed: ElementTree.ElementTree
-    if args[1] == "-": # Read from stdin
-        feed = ElementTree.parse(sys.stdin)
+    return Config(source=args[1], categories=args[2:])
+
+def generate(conf: Config, sess: Any, out: IO[str]) -> None:
+    """Filter the feed, writing it to out.
+    An http(s) source is downloaded with sess (a requests.Session), if given.
+    """
+    matcher = compile_matcher(conf.categories)
+    if conf.source == "-": # Read from stdin
+        filter_feed(sys.stdin.buffer, matcher, out)
+    elif sess is not None and conf.source.startswith(("http://", "https://")): # Download
+        with sess.get(conf.source, stream=True) as res:
+            res.raise_for_status()
+            res.raw.decode_content = True # Undo any Content-Encoding
+            filter_feed(res.raw, matcher, out)
     else: # Read from file
-        with open(path.expandvars(path.expanduser(args[1]))) as opened:
-            feed = ElementTree.parse(opened)
-    categories = args[2:]
-    remove_matching_articles(categories, feed)
-    feed.write(sys.stdout, encoding="unicode")
-
-class ArticleType(Enum):
-    """Supported feed types."""
-    RSS0 = auto()
-    RSS2 = auto()
-    ATOM = auto()
-
-def get_article_categories(article: ElementTree.Element, a_type: ArticleType) -> list[str]:
+        # Opened as bytes, so that the parser uses the encoding the feed declares
+        with open(path.expandvars(path.expanduser(conf.source)), "rb") as opened:
+            filter_feed(opened, matcher, out)
+
+
+## Matching
+
+def local_name(tag: str) -> str:
+    """Get an element's name without its namespace, e.g. "entry" for "{http://www.w3.org/2005/Atom}entry"."""
+    return tag.rpartition("}")[2]
+
+def get_article_categories(article: Element) -> Iterator[str]:
     """Get the categories of an article."""
-    categories = article.findall("category") # Atom and RSS both use the <category> tag
-    if a_type == ArticleType.ATOM: # Atom feed
-        # Contained in the term attribute
-        return [c.attrib["term"] for c in categories if "term" in c.attrib] 
-    else: # RSS feed
-        # Contained in the text element
-        return [c.text for c in categories if c.text is not None and c.text != ""]
-
-def get_feed_type(feed: ElementTree.ElementTree) -> ArticleType:
-    """Get the type of the feed."""
-    root = feed.getroot()
-    if root.tag.lower() == "feed":
-        return ArticleType.ATOM
-    elif "version" in root.attrib and root.attrib["version"] == "2.0":
-        return ArticleType.RSS2
-    return ArticleType.RSS0
-
-
-def get_articles(root: ElementTree.Element, feed_type: ArticleType) -> Iterable[ElementTree.Element]:
-    """Get the articles from a feed."""
-    # <entry> for Atom, <item> for RSS
-    if feed_type == ArticleType.ATOM:
-        return root.findall("entry")
-    return root.findall("item")
-
-
-def get_root(feed: ElementTree.ElementTree, feed_type: ArticleType) -> ElementTree.Element|None:
-    """Get the root element."""
-    if feed_type == ArticleType.ATOM:
-        return feed.getroot()
-    # Articles in RSS are inside of the "channel" element
-    root = feed.getroot()
-    return root.find("channel")
-
-
-def article_matches_p(article: ElementTree.Element, categories: list[str], a_type: ArticleType) -> bool:
-    """Test if the article matches any of the categories."""
-    a_cat = get_article_categories(article, a_type)
-    for category in categories:
-        for cat in a_cat:
-            if category.lower() in cat.lower():
-                return True
-    return False
-
-def remove_matching_articles(categories: list[str], feed: ElementTree.ElementTree):
-    """Remove articles with a matching category."""
-    feed_type = get_feed_type(feed)
-    root = get_root(feed, feed_type)
-    if root is None: # No articles
-        return
-    to_remove: list[ElementTree.Element] = [
-        a for a in get_articles(root, feed_type) if article_matches_p(a, categories, feed_type)
-    ]
-    for article in to_remove:
-        root.remove(article)
+    for category in article:
+        if local_name(category.tag) != "category": # Atom and RSS both use the <category> tag
+            continue
+        if (term := category.get("term")) is not None: # Atom: contained in the term attribute
+            yield term
+        elif category.text: # RSS: contained in the text
+            yield category.text
+
+def article_matches_p(article: Element, matcher: re.Pattern[str]) -> bool:
+    """Test if any of the article's categories contains one of the categories."""
+    return any(matcher.search(category) is not None for category in get_article_categories(article))
+
+
+## Output
+
+def escape(text: str) -> str:
+    """Escape text for use in an element."""
+    return text.translate(TEXT_ESCAPES)
+
+def quoteattr(value: str) -> str:
+    """Escape and quote an attribute value."""
+    return f"\"{value.translate(ATTRIBUTE_ESCAPES)}\""
+
+class Scope:
+    """The namespace prefixes bound at an element."""
+    prefixes: dict[str, str]
+    # The prefix to write each namespace with, for elements and for attributes (which cannot use the default namespace)
+    element_prefixes: dict[str, str]
+    attribute_prefixes: dict[str, str]
+
+    def __init__(self, prefixes: dict[str, str]):
+        self.prefixes = prefixes
+        self.element_prefixes = {uri: prefix for prefix, uri in prefixes.items()}
+        self.attribute_prefixes = {uri: prefix for prefix, uri in prefixes.items() if prefix}
+
+    def declare(self, declarations: list[tuple[str, str]]) -> "Scope":
+        """Get the scope inside an element with these (prefix, uri) declarations."""
+        return Scope({**self.prefixes, **dict(declarations)})
+
+    def qualify(self, name: str, attribute: bool = False) -> str:
+        """Get the prefixed form of a tag or attribute name, e.g. "atom:link" for "{http://www.w3.org/2005/Atom}link"."""
+        if not name.startswith("{"):
+            return name
+        uri, local = name[1:].split("}", 1)
+        prefix = (self.attribute_prefixes if attribute else self.element_prefixes).get(uri)
+        if prefix is None:
+            raise RuntimeError(f"The namespace {uri} is not declared")
+        return f"{prefix}:{local}" if prefix else local
+
+class FeedSerializer:
+    """Write a feed's elements with the namespace prefixes (and declarations) of the source feed.
+    ElementTree would invent its own prefixes (ns0, ns1, ...), and declare them on each article written by itself.
+    """
+    out: IO[str]
+    scopes: list[Scope]
+    # The namespaces declared on each element (from iterparse's start-ns events)
+    declarations: dict[Element, list[tuple[str, str]]]
+
+    def __init__(self, out: IO[str]):
+        self.out = out
+        self.scopes = [Scope({"xml": XML_NAMESPACE})]
+        self.declarations = {}
+
+    def write_start(self, element: Element, empty: bool = False) -> None:
+        """Write an element's start tag (or, if empty, the whole element)."""
+        declarations = self.declarations.pop(element, [])
+        scope = self.scopes[-1].declare(declarations) if declarations else self.scopes[-1]
+        parts = [f"<{scope.qualify(element.tag)}"]
+        for prefix, uri in declarations:
+            parts.append(f" xmlns:{prefix}={quoteattr(uri)}" if prefix else f" xmlns={quoteattr(uri)}")
+        for key, val in element.items():
+            parts.append(f" {scope.qualify(key, attribute=True)}={quoteattr(val)}")
+        parts.append(" />" if empty else ">")
+        self.out.write("".join(parts))
+        if not empty:
+            self.scopes.append(scope)
+
+    def write_end(self, element: Element) -> None:
+        """Write an element's end tag."""
+        self.out.write(f"</{self.scopes.pop().qualify(element.tag)}>")
+
+    def write_text(self, text: str|None) -> None:
+        """Write text (or a tail)."""
+        if text:
+            self.out.write(escape(text))
+
+    def write(self, element: Element) -> None:
+        """Write an element and its descendants (but not its tail)."""
+        if len(element) == 0 and not element.text:
+            self.write_start(element, empty=True)
+            return
+        self.write_start(element)
+        self.write_text(element.text)
+        # An explicit stack (of each element's remaining children), since articles can be nested deeper than the recursion limit
+        stack: list[tuple[Element, Iterator[Element]]] = [(element, iter(element))]
+        while stack:
+            parent, children = stack[-1]
+            if (child := next(children, None)) is None:
+                stack.pop()
+                self.write_end(parent)
+                if stack:
+                    self.write_text(parent.tail)
+            elif len(child) == 0 and not child.text:
+                self.write_start(child, empty=True)
+                self.write_text(child.tail)
+            else:
+                self.write_start(child)
+                self.write_text(child.text)
+                stack.append((child, iter(child)))
+
+    def discard(self, element: Element) -> None:
+        """Forget an element (and its descendants) that will not be written."""
+        if self.declarations:
+            for node in element.iter():
+                self.declarations.pop(node, None)
+
+
+## Filtering
+
+def is_container(element: Element, depth: int) -> bool:
+    """Test if an element's children are streamed: the root (<feed> or <rss>), and RSS's <channel>."""
+    return depth == 0 or (depth == 1 and local_name(element.tag) == "channel")
+
+def filter_feed(source: IO[bytes], matcher: re.Pattern[str], out: IO[str]) -> int:
+    """Stream the feed from source to out, leaving out the articles with a category matched by matcher.
+    Returns the number of articles left out.
+
+    The root and RSS's <channel> are written as they start and end, and each of their children is parsed whole,
+    written (or dropped), and freed. Text is only complete once the parser has moved past it,
+    so each element's text (and each child's tail) is written at the next start or end tag of the stream.
+    """
+    serializer = FeedSerializer(out)
+    declarations: list[tuple[str, str]] = [] # The declarations for the next element
+    stack: list[Element] = [] # The open elements
+    containers: list[Element] = [] # The open elements whose children are streamed
+    text_pending: Element|None = None # A container whose text has not been written
+    tail_pending: Element|None = None # A written child whose tail has not been written
+    removed = 0
+    for event, item in iterparse(source, events=("start-ns", "start", "end")):
+        if event == "start-ns":
+            declarations.append(item)
+            continue
+        element: Element = item
+        if event == "start" and declarations:
+            serializer.declarations[element] = declarations
+            declarations = []
+        in_stream = len(stack) - (event == "end") == len(containers)
+        if in_stream or (containers and containers[-1] is element):
+            # An element of the stream starts or ends, so the text before it is complete
+            if text_pending is not None:
+                serializer.write_text(text_pending.text)
+                text_pending = None
+            if tail_pending is not None:
+                serializer.write_text(tail_pending.tail)
+                tail_pending = None
+        if event == "start":
+            if in_stream and is_container(element, len(stack)):
+                serializer.write_start(element)
+                containers.append(element)
+                text_pending = element
+            stack.append(element)
+            continue
+        stack.pop()
+        if containers and containers[-1] is element:
+            serializer.write_end(element)
+            containers.pop()
+            tail_pending = element
+        elif in_stream:
+            if local_name(element.tag) in ARTICLE_NAMES and article_matches_p(element, matcher):
+                serializer.discard(element)
+                removed += 1
+            else:
+                serializer.write(element)
+                tail_pending = element
+            # Free the child (its tail is still read from it)
+            if stack:
+                stack[-1].remove(element)
+    return removed
 
 
 if __name__=="__main__":
@@ -5,37 +5,57 @@ Downloads and enriches the news feed for Fox6 Milwaukee.
 This feed contains local news for Milwaukee, WI.
 """
 
+from contextlib import nullcontext
 from dataclasses import dataclass
+from functools import cache
 from html import escape
 from sys import argv, exit
-from xml.dom.minidom import parseString, Document, Element
-from xml.parsers.expat import ExpatError
+from typing import IO, TYPE_CHECKING
+from xml.dom.minidom import Document, Element
 import argparse
 import json
 import logging
+import sys
 
-from bs4 import BeautifulSoup, Tag
-from bs4.formatter import XMLFormatter
-from requests import Session
-from requests.exceptions import HTTPError
+# Only the modules needed to parse arguments are imported here, so that --help and argument errors are quick.
+# The rest (which import Beautiful Soup and requests) are imported by the functions that use them.
+from python_feed_lib import Pipeline, add_pipeline_args, create_pipeline, get_user_agent, get_cache_dir, setup_logging, time_stage
 
-from python_feed_lib import with_session, convert_feed, get_user_agent, setup_logging, enrich_articles, get_entry_link, cleanup_html
+if TYPE_CHECKING:
+    from bs4 import Tag
+    from requests import Session
+    from python_feed_lib import Extractor, Page, Sanitizer
 
 # URL of the feed to download from
 # TODO: Expand this to include other things?
 FEED_URL: str = "https://www.fox6now.com/rss/category/news"
-Logger: logging.Logger
+# Only the article body and the video metadata are parsed from article pages
+METADATA_SELECTOR: str = 'script[type="application/ld+json"]'
+Logger = logging.getLogger("Fox6Downloader")
+
+@cache
+def get_sanitizer() -> "Sanitizer":
+    """Get the rules that remove scripts, comments and the newsletter/app signup links from articles."""
+    from python_feed_lib import Sanitizer
+    return Sanitizer(
+        hrefs=("https://www.fox6now.com/newsletters",),
+        href_prefixes=("https://foxlocal.onelink.me/", "https://fox6news.onelink.me/"),
+    )
+
+@cache
+def get_extractor() -> "Extractor":
+    """Get the extractor for article pages."""
+    from python_feed_lib import Extractor
+    return Extractor(".article-content", METADATA_SELECTOR)
 
 def main(args: list[str]) -> None:
     """The main function."""
-    global Logger
     conf = parse_args(args)
-    Logger = setup_logging("Fox6Downloader")
-    with with_session("https://www.fox6now.com", conf.user_agent, conf.proxy) as sess:
+    setup_logging("Fox6Downloader")
+    from requests.exceptions import HTTPError
+    with create_session(conf) as sess:
         try:
-            feed: Document = get_feed(FEED_URL, sess)
-            enrich_articles(feed, get_article, update_article, sess)
-            print(feed.toxml())
+            generate(conf, sess, sys.stdout)
         except HTTPError as err:
             Logger.fatal("Unable to download base feed: %s", err)
             exit(1)
@@ -43,11 +63,40 @@ def main(args: list[str]) -> None:
             Logger.fatal("Error processing feed: %s", err)
             exit(1)
 
+def create_session(conf: "Config"):
+    """Create the session to download the feed with."""
+    from python_feed_lib import with_session
+    return with_session("https://www.fox6now.com", conf.user_agent, conf.proxy, cache_dir=conf.cache_dir)
+
+def generate(conf: "Config", sess: "Session", out: IO[str]) -> None:
+    """Download and enrich the feed, writing it to out."""
+    from python_feed_lib import FeedWriter, ResultStore, SeenIndex, enrich_articles, remove_seen_entries
+    with (ResultStore(conf.store, namespace="fox6") if conf.store is not None else nullcontext()) as store, \
+         (SeenIndex(conf.seen_index, namespace="fox6") if conf.seen_index is not None else nullcontext()) as seen:
+        feed: Document = conf.pipeline.run(get_feed(FEED_URL, sess))
+        if seen is not None and conf.only_new:
+            Logger.debug("Removed %d entries seen by earlier runs", remove_seen_entries(feed, seen))
+        # Entries are written as they are enriched
+        with FeedWriter(out) as writer:
+            writer.start(feed)
+            enrich_articles(
+                feed, fetch_article, update_article, sess,
+                window=8, store=store, on_entry=writer.write_entry, seen=seen,
+                # Parse trees cannot be sent between processes, so worker processes return the content as XML text
+                parser=parse_article if conf.processes else extract_article, processes=conf.processes,
+            )
+
 
 @dataclass
 class Config:
     user_agent: str
     proxy: str|None
+    cache_dir: str|None
+    store: str|None
+    pipeline: Pipeline
+    processes: int|None = None
+    seen_index: str|None = None
+    only_new: bool = False
 
 def parse_args(argv: list[str]) -> Config:
     """Parse arguments."""
@@ -55,7 +104,22 @@ def parse_args(argv: list[str]) -> Config:
     parser = argparse.ArgumentParser(prog=argv[0])
     parser.add_argument("-p", "--proxy", type=str, default=None, help="Proxy URL to use", required=False, dest="proxy")
     parser.add_argument("-u", "--user-agent", type=str, default=None, help="User agent to use for HTTP(s) requests", dest="user_agent")
+    parser.add_argument("-c", "--cache-dir", type=str, default=None, help="Directory to cache HTTP responses in", dest="cache_dir")
+    parser.add_argument("-s", "--store", type=str, default=None, help="Database to keep enriched articles in between runs", dest="store")
+    parser.add_argument(
+        "--processes", type=int, default=None,
+        help="Number of processes to parse articles in (by default, articles are parsed by the threads that download them)",
+        dest="processes",
+    )
+    parser.add_argument(
+        "--seen-index", type=str, default=None,
+        help="Database of the entries produced by earlier runs, which are left out unless --store has their enrichment", dest="seen_index",
+    )
+    parser.add_argument("--only-new", action="store_true", help="Only output entries that are not in the seen index", dest="only_new")
+    add_pipeline_args(parser)
     parsed = parser.parse_args(argv[1:])
+    if parsed.only_new and parsed.seen_index is None:
+        parser.error("--only-new requires --seen-index")
     if "user_agent" in vars(parsed) and parsed.user_agent is not None:
         user_agent = parsed.user_agent
     else:
@@ -64,84 +128,97 @@ def parse_args(argv: list[str]) -> Config:
         proxy = parsed.proxy
     else:
         proxy = None
+    if "cache_dir" in vars(parsed) and parsed.cache_dir is not None:
+        cache_dir = parsed.cache_dir
+    else:
+        cache_dir = get_cache_dir()
     return Config(
         user_agent = user_agent,
         proxy = proxy,
+        cache_dir = cache_dir,
+        store = parsed.store,
+        pipeline = create_pipeline(parser, parsed),
+        processes = parsed.processes,
+        seen_index = parsed.seen_index,
+        only_new = parsed.only_new,
     )
 
-def get_feed(url: str, sess: Session) -> Document:
+def get_feed(url: str, sess: "Session") -> Document:
     """Download the base feed."""
+    from python_feed_lib import convert_feed, parse_xml
     res = sess.get(url)
     res.raise_for_status()
-    parsed: Document = parseString(res.text)
+    with time_stage("parse"):
+        parsed: Document = parse_xml(res)
     if parsed.documentElement.tagName.lower() == "rss":
         return convert_feed(parsed)
     return parsed
 
-def remove_signup_links(article: Tag) -> None:
-    """Remove the newsletter links from an article.
-    Changes are done in-place.
-    """
-    for ad in article.find_all("a", attrs={"href": "https://www.fox6now.com/newsletters"}):
-        if ad is not None and ad.parent is not None:
-            ad.parent.decompose()
-    for ad in article.find_all("a", href=lambda x: isinstance(x, str) and (x.startswith("https://foxlocal.onelink.me/") or x.startswith("https://fox6news.onelink.me/"))):
-        if ad is not None and ad.parent is not None:
-            ad.parent.decompose()
-
-def get_article(
-        entry: Element,
-        sess: Session,
-) -> tuple[Element, tuple[Tag|None, str|None]]|Element:
-    """Get the article contents. Returns (received_entry, (article_body, video_url))|received_entry.
-    Intended to be called by enrich_articles in concert with update_article.
+def fetch_article(entry: Element, sess: "Session") -> "tuple[Element, Page]|Element":
+    """Download the article. Returns (received_entry, page)|received_entry.
+    Intended to be called by enrich_articles in concert with parse_article and update_article.
     """
+    from python_feed_lib import fetch_page, get_entry_link
     try:
-        link = get_entry_link(entry)
-        res = sess.get(link)
-        res.raise_for_status()
-        article = BeautifulSoup(res.text, "lxml")
-        content = None
-        video = None
-        _c = article.find(class_="article-content")
-        if isinstance(_c, Tag): # Article has content
-            cleanup_html(_c)
-            remove_signup_links(_c)
-            content = _c
-        _v = article.find("script", attrs={"type": "application/ld+json"})
-        if isinstance(_v, Tag): # Article has a video
-            js: dict[str, str|dict] = json.loads(_v.get_text())
-            if "contentUrl" not in js or not isinstance(js["contentUrl"], str):
-                Logger.info("Could not extract video URL from metadata element")
-                if content is None:
-                    return entry
-                return entry, (content, video)
-            video = js["contentUrl"]
-        assert video is None or isinstance(video, str)
-        return entry, (content, video)
+        # Only the start of the page, up to the end of the article body and metadata, is downloaded (unless it is cached)
+        return entry, fetch_page(get_entry_link(entry), sess, get_extractor())
     except BaseException as err:
         Logger.error("Unable to fetch article: %s", err)
         return entry
 
-def update_article(entry: Element, contents: tuple[Tag|None, str|None], doc: Document) -> None:
+def extract_article(page: "Page") -> "tuple[Tag|None, str|None]|None":
+    """Get the article body and video URL from the page. Returns None if it has neither.
+    Intended to be called by enrich_articles in concert with fetch_article and update_article,
+    when the articles are parsed in the threads that download them.
+    """
+    article = get_extractor().extract(page.content, encoding=page.charset)
+    content = None
+    video = None
+    _c = article.first(".article-content")
+    if _c is not None: # Article has content
+        # Detach the content, so that the rest of the page can be freed
+        content = _c.extract()
+        get_sanitizer().sanitize(content)
+    _v = article.first(METADATA_SELECTOR)
+    metadata = _v.get_text() if _v is not None else None
+    # BeautifulSoup trees are reference cycles, so free the page now rather than when the GC next runs
+    article.decompose()
+    if metadata is not None: # Article has a video
+        js: dict[str, str|dict] = json.loads(metadata)
+        if "contentUrl" not in js or not isinstance(js["contentUrl"], str):
+            Logger.info("Could not extract video URL from metadata element")
+            if content is None:
+                return None
+            return content, video
+        video = js["contentUrl"]
+    assert video is None or isinstance(video, str)
+    return content, video
+
+def parse_article(page: "Page") -> tuple[str|None, str|None]|None:
+    """Get the article body (as an Atom <content> element) and video URL from the page, as extract_article does.
+    The results are strings, so that this can be called in a worker process.
+    """
+    from python_feed_lib import create_content_xml
+    if (extracted := extract_article(page)) is None:
+        return None
+    content, video = extracted
+    if content is None:
+        return None, video
+    xml = create_content_xml(content)
+    content.decompose()
+    return xml, video
+
+def update_article(entry: Element, contents: "tuple[Tag|str|None, str|None]", doc: Document) -> None:
     """Update the article with the received contents.
-    Intended to be called by enrich_articles in concert with get_article.
+    Intended to be called by enrich_articles in concert with fetch_article and extract_article (or parse_article).
     """
+    from python_feed_lib import create_content_node, import_content
     content, video = contents
-    if content is not None:
-        cont_str = content.decode(formatter=XMLFormatter.REGISTRY["minimal"]) # Make sure this is XML
-        try:
-            parsed: Document = parseString(cont_str) # Probably not the most efficient way
-        except ExpatError as err:
-            Logger.error(
-                "Unable to parse XML produced by this script: %s\nThis article will be skipped.",
-                err,
-            )
-            return
-        cont = parsed.documentElement
-        container = doc.createElement("content")
-        container.appendChild(cont)
-        entry.appendChild(container)
+    if isinstance(content, str): # Parsed in a worker process
+        entry.appendChild(import_content(content, doc))
+    elif content is not None:
+        entry.appendChild(create_content_node(content, doc))
+        content.decompose() # The parse tree is no longer needed
     if video is not None:
         vid_element: Element = doc.createElement("link")
         vid_element.setAttribute("rel", "enclosure")
@@ -4,7 +4,7 @@
 NPR does not put the URL of the audio in the RSS feed.
 
 Usage:
-python npr_podcast_downloader.py [--proxy <proxy>] [url]
+python npr_podcast_downloader.py [--proxy <proxy>] [--cache-dir <dir>] [--store <database>] [--seen-index <database> [--only-new]] [url]
 
 Requirements:
 Depends on the requests and beautiful soup 4 libraries.
@@ -14,29 +14,34 @@ Due to the use of the "walrus operator" (:=), this requires at least Python 3.8.
 Code has only been tested on Python 3.13 (as of Feb. 2025).
 """
 
+from atexit import register as atexit
+from contextlib import nullcontext
 from sys import argv, stderr, exit
 from traceback import extract_tb
+from typing import IO, TYPE_CHECKING
+import sys
 import syslog
 
+# Only the modules needed to parse arguments are imported here, so that --help and argument errors are quick.
+# The feed processing (which imports Beautiful Soup and requests) is imported when the feeds are generated.
 from .config import Config, parse_args
-from .feeds import process_feeds
 
-from python_feed_lib import with_session
+from python_feed_lib import get_metrics_dir, report_metrics
+
+if TYPE_CHECKING:
+    from requests import Session
 
 def main(args: list[str]) -> None:
     """The main function."""
+    # Exits on --help and invalid arguments, before anything is logged
+    conf: Config = parse_args(args)
     syslog.openlog(ident="NprPodcastDownloader", facility=syslog.LOG_NEWS)
+    if (metrics_dir := get_metrics_dir()) is not None:
+        atexit(report_metrics, None, "NprPodcastDownloader", metrics_dir)
     try:
-        conf: Config = parse_args(args)
-        with with_session(
-                referer="https://www.npr.org",
-                user_agent=conf.user_agent,
-                proxy=conf.proxy,
-        ) as session:
-            # Download and convert the feed
-            feed = process_feeds(conf.urls, session)
-            print(feed.toprettyxml())
-    except BaseException as err:
+        with create_session(conf) as session:
+            generate(conf, session, sys.stdout)
+    except Exception as err:
         print(f"Unable to download: {err}", file=stderr)
         syslog.syslog(
             syslog.LOG_ERR,
@@ -44,5 +49,25 @@ def main(args: list[str]) -> None:
         )
         exit(1)
 
+def create_session(conf: Config):
+    """Create the session to download the feeds with."""
+    from python_feed_lib import with_session
+    return with_session(
+        referer="https://www.npr.org",
+        user_agent=conf.user_agent,
+        proxy=conf.proxy,
+        cache_dir=conf.cache_dir,
+    )
+
+def generate(conf: Config, sess: "Session", out: IO[str]) -> None:
+    """Download and combine the feeds, writing the feed to out as the articles are enriched."""
+    from python_feed_lib import FeedWriter, ResultStore, SeenIndex
+    from .feeds import process_feeds
+    with (ResultStore(conf.store, namespace="npr") if conf.store is not None else nullcontext()) as store, \
+         (SeenIndex(conf.seen_index, namespace="npr") if conf.seen_index is not None else nullcontext()) as seen, \
+         FeedWriter(out, pretty=True) as writer:
+        process_feeds(conf.urls, sess, store, writer, conf.pipeline, conf.processes, seen, conf.only_new)
+
 ## Start the main function
-main(argv)
+if __name__ == "__main__":
+    main(argv)
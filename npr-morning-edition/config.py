@@ -5,9 +5,11 @@ Parse arguments.
 """
 
 from argparse import ArgumentParser
-from dataclasses import dataclass
+from dataclasses import dataclass, field
 from os import getenv
 
+from python_feed_lib import Pipeline, add_pipeline_args, create_pipeline, get_cache_dir
+
 # Default values
 USER_AGENT: str = "Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/115.0"
 
@@ -23,21 +25,49 @@ def get_user_agent() -> str:
 class Config:
     urls: list[str]
     proxy: str|None = None
+    cache_dir: str|None = None
+    store: str|None = None
     user_agent: str = get_user_agent()
+    pipeline: Pipeline = field(default_factory=Pipeline)
+    processes: int|None = None
+    seen_index: str|None = None
+    only_new: bool = False
 
 def parse_args(args: list[str]) -> Config:
     """Parse arguments."""
     parser = ArgumentParser(prog="npr_podcast_downloader", description="Downloads NPR podcasts.")
     parser.add_argument("-p", "--proxy", type=str, default=None, help="Proxy URL", required=False, dest="proxy")
     parser.add_argument("-u", "--user-agent", type=str, default=None, help="User agent to use", required=False, dest="user_agent")
+    parser.add_argument("-c", "--cache-dir", type=str, default=None, help="Directory to cache HTTP responses in", required=False, dest="cache_dir")
+    parser.add_argument("-s", "--store", type=str, default=None, help="Database to keep enriched articles in between runs", required=False, dest="store")
+    parser.add_argument(
+        "--processes", type=int, default=None,
+        help="Number of processes to parse articles in (by default, articles are parsed by the threads that download them)",
+        required=False, dest="processes",
+    )
+    parser.add_argument(
+        "--seen-index", type=str, default=None,
+        help="Database of the entries produced by earlier runs, which are left out unless --store has their enrichment", required=False, dest="seen_index",
+    )
+    parser.add_argument(
+        "--only-new", action="store_true", help="Only output entries that are not in the seen index", required=False, dest="only_new",
+    )
     parser.add_argument("urls", type=str, nargs="*", help="Podcast URL")
+    add_pipeline_args(parser)
     parsed = parser.parse_args(args[1:])
     if len(parsed.urls) < 1:
-        parser.print_usage()
-        raise RuntimeError("At least one URL must be specified!")
+        parser.error("At least one URL must be specified!")
+    if parsed.only_new and parsed.seen_index is None:
+        parser.error("--only-new requires --seen-index")
     return Config(
         proxy=parsed.proxy,
+        cache_dir=parsed.cache_dir if parsed.cache_dir is not None else get_cache_dir(),
+        store=parsed.store,
         # TODO: Change this after coding for combining feeds
         urls=parsed.urls,
-        user_agent=parsed.user_agent if parsed.user_agent is not None else get_user_agent()
+        user_agent=parsed.user_agent if parsed.user_agent is not None else get_user_agent(),
+        pipeline=create_pipeline(parser, parsed),
+        processes=parsed.processes,
+        seen_index=parsed.seen_index,
+        only_new=parsed.only_new,
     )
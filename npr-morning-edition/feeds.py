@@ -4,64 +4,113 @@
 Work with feeds.
 """
 
-from typing import Iterable
-from xml.dom.minidom import Document, Element,  parseString
+from concurrent.futures import ThreadPoolExecutor
+from xml.dom.minidom import Document, Element
 import re
 import syslog
 
-import bs4
 from requests import Session, HTTPError
 
 from python_feed_lib import (
-    cleanup_html,
+    Extractor,
+    FeedWriter,
+    Pipeline,
+    Page,
+    ResultStore,
+    SeenIndex,
     convert_element,
     convert_feed,
+    dedup_entries,
     enrich_articles,
+    fetch_page,
+    get_entries,
     get_single_element,
-    sort_elements,
+    merge_entries,
+    parse_xml,
+    remove_seen_entries,
+    time_stage,
 )
 
+# The most feeds to download at once
+MAX_FEED_DOWNLOADS: int = 8
 
-def process_feeds(urls: list[str], sess: Session) -> Document:
-    """Download and combine the feeds."""
-    main: Document = convert_feed(get_feed(urls[0], sess))
+# Only the audio link is parsed from article pages
+AUDIO_SELECTOR: str = ".audio-module-listen[href]"
+EXTRACTOR = Extractor(AUDIO_SELECTOR)
+
+
+def process_feeds(
+        urls: list[str],
+        sess: Session,
+        store: ResultStore|None = None,
+        writer: FeedWriter|None = None,
+        pipeline: Pipeline|None = None,
+        processes: int|None = None,
+        seen: SeenIndex|None = None,
+        only_new: bool = False,
+) -> Document:
+    """Download and combine the feeds.
+    If pipeline is given, it is run on the combined feed before the articles are enriched.
+    If processes is given, the article pages are parsed in that many processes (see enrich_articles).
+    If store is given, articles enriched by a previous run are restored from it.
+    If seen is given, articles produced by a previous run (from any of the feeds) are not enriched again:
+    they are removed from the feed, unless they could be restored from store (and only_new is False).
+    If writer is given, the feed is written to it as the articles are enriched (and the returned feed is no longer usable).
+    """
     if len(urls) == 1: # No need to combine
-        enrich_articles(main, get_article, enrich_article, sess)
-        return main
-    # This is done in serial
-    feeds: Iterable[Document] = (get_feed(url, sess) for url in urls[1:])
+        feeds: list[Document] = [get_feed(urls[0], sess)]
+        main: Document = convert_feed(feeds[0])
+    else:
+        # The feeds are downloaded at once, through the same session (and connection pool)
+        with ThreadPoolExecutor(max_workers=min(len(urls), MAX_FEED_DOWNLOADS)) as pool:
+            feeds = list(pool.map(lambda url: get_feed(url, sess), urls))
+        main = convert_feed(feeds[0])
+        merge_entries(main, (get_feed_entries(feed) for feed in feeds[1:]))
+        # The same article may be in several feeds, so only download it once
+        if (removed := dedup_entries(main)) > 0:
+            syslog.syslog(syslog.LOG_DEBUG, f"Removed {removed} duplicate entries")
+    # The entries now belong to main, so the rest of the source documents (e.g. their RSS items) are freed before enriching.
+    # Nodes moved into main still refer to their source document, which would otherwise keep all of it alive.
     for feed in feeds:
-        join_feeds(main, feed)
-    sort_elements(main)
-    enrich_articles(main, get_article, enrich_article, sess)
+        feed.unlink()
+    del feeds
+    if pipeline is not None:
+        pipeline.run(main)
+    if seen is not None and only_new and (removed := remove_seen_entries(main, seen)) > 0:
+        syslog.syslog(syslog.LOG_DEBUG, f"Removed {removed} entries seen by earlier runs")
+    if writer is not None:
+        writer.start(main)
+    enrich_articles(
+        main, fetch_article, enrich_article, sess,
+        window=8, store=store, on_entry=writer.write_entry if writer is not None else None,
+        parser=parse_article, processes=processes, seen=seen,
+    )
     return main
 
-def join_feeds(main: Document, new: Document) -> None:
-    """Join the feeds together. Modified the main feed in-place."""
+def get_feed_entries(feed: Document) -> list[Element]:
+    """Get the articles of a feed as Atom entries."""
     # Atom uses "<feed>", RSS uses "<rss>"
-    is_atom: bool = new.documentElement.tagName == "feed"
-    main_doc = main.documentElement
-    for article in new.documentElement.getElementsByTagName("entry" if is_atom else "item"):
-        a = article if is_atom else convert_element(article, new) # Make sure this is Atom
-        main.importNode(a, deep=True)
-        main_doc.appendChild(a)
+    if feed.documentElement.tagName == "feed":
+        return get_entries(feed)
+    return [convert_element(item, feed) for item in feed.getElementsByTagName("item")]
 
 def get_feed(url: str, sess: Session) -> Document:
     """Download and parse the feed."""
     try:
         res = sess.get(url)
         res.raise_for_status()
-        return parseString(res.text)
+        with time_stage("parse"):
+            return parse_xml(res)
     except HTTPError as err:
         raise RuntimeError(f"Unable to download feed: {err}") from err
     except BaseException as err:
         raise RuntimeError(f"Unable to parse feed: {err}") from err
 
-def get_article(
+def fetch_article(
         entry: Element,
         sess: Session,
-) -> tuple[Element, tuple[bs4.Tag|None, str|None]]|Element:
-    """Download the article and extract the media and text content.
+) -> tuple[Element, Page]|Element:
+    """Download the article, returning its page (to be parsed by parse_article).
     Returns the associated element for easier processing later.
     If only the element is returned, then the fetch failed and the element may be discarded.
     """
@@ -72,34 +121,38 @@ def get_article(
         if not (link := link_node.getAttribute("href")):
             syslog.syslog(syslog.LOG_INFO, "The link does not contain an href attribute")
             return entry
-        res = sess.get(link)
-        res.raise_for_status()
-        body = bs4.BeautifulSoup(res.text, "lxml")
-        url_node = body.find(lambda x: x.has_attr("href"), class_="audio-module-listen")
-        if not isinstance(url_node, bs4.Tag) or not isinstance(url := url_node.attrs.get("href"), str):
-            syslog.syslog(syslog.LOG_INFO, f"Unable to extract media url from article at {link}")
-            return entry
-        cleanup_html(body)
-        url = re.sub(r"\?.*?$", "", url)
-        return entry, (body, url)
+        # The download stops once the audio link has been read (unless the page is cached)
+        return entry, fetch_page(link, sess, EXTRACTOR)
     except BaseException as err:
         syslog.syslog(syslog.LOG_ERR, f"Error while fetching entry media: {err}")
         return entry
 
-def enrich_article(entry: Element, contents: tuple[bs4.Tag|None, str|None], doc: Document) -> None:
+def parse_article(page: Page) -> str|None:
+    """Extract the media URL from an article's page. Returns None if there is none.
+    The result is a string, so that this can be called in a worker process.
+    """
+    body = EXTRACTOR.extract(page.content, encoding=page.charset)
+    url_node = body.first(AUDIO_SELECTOR)
+    url = url_node.attrs.get("href") if url_node is not None else None
+    # Only the URL is used, so free the page now rather than when the GC next runs
+    body.decompose()
+    if not isinstance(url, str):
+        syslog.syslog(syslog.LOG_INFO, f"Unable to extract media url from article at {page.url}")
+        return None
+    return re.sub(r"\?.*?$", "", url)
+
+def enrich_article(entry: Element, media: str, doc: Document) -> None:
     """Enrich the article contents."""
-    body, media = contents
-    if media is not None:
-        enclosure = doc.createElement("link")
-        for key, val in {
-                "rel": "enclosure",
-                "href": media,
-        }.items():
-            enclosure.setAttribute(key, val)
-        # RSS Guard seems to assume that untyped links are jpegs
-        if media.endswith(".mp3"):
-            enclosure.setAttribute("type", "audio/mpeg")
-        else:
-            syslog.syslog(syslog.LOG_DEBUG, f"The media link is not an mp3: {media}")
-        entry.appendChild(enclosure)
+    enclosure = doc.createElement("link")
+    for key, val in {
+            "rel": "enclosure",
+            "href": media,
+    }.items():
+        enclosure.setAttribute(key, val)
+    # RSS Guard seems to assume that untyped links are jpegs
+    if media.endswith(".mp3"):
+        enclosure.setAttribute("type", "audio/mpeg")
+    else:
+        syslog.syslog(syslog.LOG_DEBUG, f"The media link is not an mp3: {media}")
+    entry.appendChild(enclosure)
     # TODO: Append the text?
@@ -1,30 +1,116 @@
 #! /usr/bin/python3
 
-from .feeds import (
-    cleanup_html,
-    convert_element,
-    convert_feed,
-    create_text_node,
-    enrich_articles,
-    get_entry_link,
-    get_single_element,
-    get_user_agent,
-    sort_elements,
-    with_session,
-)
+"""
+Shared code for the feed scripts.
+Submodules are imported when one of their names is first used (PEP 562), since most of them
+depend on Beautiful Soup or requests, which take longer to import than a script takes to parse its arguments.
+Names used while parsing arguments (e.g. get_user_agent and get_cache_dir) live in modules that import neither.
+"""
 
-from .logging import setup_logging
+from importlib import import_module
+from typing import TYPE_CHECKING, Any
 
-__all__ = [
-    "cleanup_html",
-    "convert_element",
-    "convert_feed",
-    "create_text_node",
-    "enrich_articles",
-    "get_entry_link",
-    "get_single_element",
-    "get_user_agent",
-    "setup_logging",
-    "sort_elements",
-    "with_session",
-]
+if TYPE_CHECKING:
+    from .agent import get_user_agent
+    from .aio import enrich_articles_async, map_limited, to_async_getter
+    from .cache import ResponseCache, get_cache_dir
+    from .content import convert_html, create_content_node, create_content_xml, import_content
+    from .dates import parse_date, select_newest
+    from .extract import Extractor
+    from .feeds import (
+        Page,
+        cleanup_html,
+        convert_element,
+        convert_feed,
+        create_adapter,
+        create_process_pool,
+        create_text_node,
+        dedup_entries,
+        enrich_articles,
+        get_charset,
+        get_entries,
+        get_entry_id,
+        get_entry_link,
+        get_page,
+        get_single_element,
+        get_timestamp,
+        merge_entries,
+        parse_xml,
+        sort_elements,
+        truncate_entries,
+        with_session,
+    )
+    from .logging import setup_logging
+    from .metrics import METRICS, get_metrics_dir, report_metrics, time_stage
+    from .pipeline import Pipeline, add_pipeline_args, create_pipeline
+    from .sanitize import Sanitizer
+    from .seen import SeenIndex, remove_seen_entries
+    from .store import ResultStore
+    from .stream import fetch_page
+    from .writer import FeedWriter
+
+# The submodule that each name is imported from
+EXPORTS: dict[str, str] = {
+    "Extractor": "extract",
+    "FeedWriter": "writer",
+    "METRICS": "metrics",
+    "Page": "feeds",
+    "Pipeline": "pipeline",
+    "ResponseCache": "cache",
+    "ResultStore": "store",
+    "Sanitizer": "sanitize",
+    "SeenIndex": "seen",
+    "add_pipeline_args": "pipeline",
+    "cleanup_html": "feeds",
+    "convert_element": "feeds",
+    "convert_feed": "feeds",
+    "convert_html": "content",
+    "create_adapter": "feeds",
+    "create_content_node": "content",
+    "create_content_xml": "content",
+    "create_pipeline": "pipeline",
+    "create_process_pool": "feeds",
+    "create_text_node": "feeds",
+    "dedup_entries": "feeds",
+    "enrich_articles": "feeds",
+    "enrich_articles_async": "aio",
+    "fetch_page": "stream",
+    "get_cache_dir": "cache",
+    "get_charset": "feeds",
+    "get_entries": "feeds",
+    "get_entry_id": "feeds",
+    "get_entry_link": "feeds",
+    "get_metrics_dir": "metrics",
+    "get_page": "feeds",
+    "get_single_element": "feeds",
+    "get_timestamp": "feeds",
+    "get_user_agent": "agent",
+    "import_content": "content",
+    "map_limited": "aio",
+    "merge_entries": "feeds",
+    "parse_date": "dates",
+    "parse_xml": "feeds",
+    "remove_seen_entries": "seen",
+    "report_metrics": "metrics",
+    "select_newest": "dates",
+    "setup_logging": "logging",
+    "sort_elements": "feeds",
+    "time_stage": "metrics",
+    "to_async_getter": "aio",
+    "truncate_entries": "feeds",
+    "with_session": "feeds",
+}
+
+__all__ = list(EXPORTS)
+
+def __getattr__(name: str) -> Any:
+    """Import a name's submodule when the name is first used."""
+    if (module := EXPORTS.get(name)) is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(import_module(f".{module}", __name__), name)
+    # Later lookups find the name without calling __getattr__
+    globals()[name] = value
+    return value
+
+def __dir__() -> list[str]:
+    return sorted(set(globals()) | set(EXPORTS))
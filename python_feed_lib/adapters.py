@@ -0,0 +1,199 @@
+#! /usr/bin/python3
+
+"""
+Transport adapters used by with_session.
+"""
+
+from threading import BoundedSemaphore
+from time import perf_counter
+from typing import Any
+from urllib.parse import urlsplit
+import logging
+
+from requests import PreparedRequest, Response
+from requests.adapters import HTTPAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3.connectionpool import port_by_scheme
+from urllib3.util.retry import Retry
+
+from .cache import ResponseCache, CachedResponse
+from .metrics import METRICS, REQUEST_SECONDS, REQUESTS, RESPONSE_BYTES
+from .ratelimit import HostRateLimiter
+
+## Globals
+
+Logger = logging.getLogger(__name__)
+
+
+## Retries
+
+class FeedRetry(Retry):
+    """Retry settings for feed downloads.
+    This honors Retry-After, but waits at most max_retry_after seconds, since feed readers time out scripts.
+    urllib3 re-sends requests without going through the adapter again,
+    so if a rate limiter is given, each retry waits for a token for its host here (FeedAdapter.send waits for the first attempt's).
+    """
+    max_retry_after: float = 60
+    rate_limiter: HostRateLimiter|None
+
+    def __init__(self, *args: Any, rate_limiter: HostRateLimiter|None = None, **kwargs: Any):
+        super().__init__(*args, **kwargs)
+        self.rate_limiter = rate_limiter
+
+    def new(self, **kwargs: Any) -> "FeedRetry":
+        kwargs.setdefault("rate_limiter", self.rate_limiter)
+        return super().new(**kwargs)
+
+    def get_retry_after(self, response) -> float|None:
+        if (retry_after := super().get_retry_after(response)) is None:
+            return None
+        return min(retry_after, self.max_retry_after)
+
+    def increment(self, method=None, url=None, response=None, error=None, _pool=None, _stacktrace=None) -> "FeedRetry":
+        # Raises MaxRetryError (or the error) if no retries are left, so the request is sent again after this returns
+        retry = super().increment(method, url, response, error, _pool, _stacktrace)
+        if self.rate_limiter is not None and (target := get_retry_url(url, _pool)) is not None:
+            self.rate_limiter.acquire(target)
+        return retry
+
+def get_retry_url(url: str|None, pool: Any) -> str|None:
+    """Get the URL of a request that urllib3 is retrying, which it only has as a path unless the request goes through a proxy."""
+    if url is not None and "://" in url:
+        return url
+    if pool is None or getattr(pool, "host", None) is None:
+        return None
+    # The rate limiter keys hosts by their netloc, so the default port is left out as in the request's URL
+    host = f"[{pool.host}]" if ":" in pool.host else pool.host
+    port = "" if pool.port is None or pool.port == port_by_scheme.get(pool.scheme) else f":{pool.port}"
+    return f"{pool.scheme}://{host}{port}{url or '/'}"
+
+def create_retry(retries: int, backoff: float, rate_limiter: HostRateLimiter|None = None) -> FeedRetry:
+    """Retry connection errors, and 429 and 503 responses, with jittered exponential backoff.
+    If a rate limiter is given, retries wait for it too.
+    """
+    return FeedRetry(
+        rate_limiter=rate_limiter,
+        total=retries,
+        backoff_factor=backoff,
+        backoff_jitter=backoff,
+        status_forcelist=(429, 503),
+        allowed_methods=("GET", "HEAD"),
+        respect_retry_after_header=True,
+        raise_on_status=False, # Return the last response, so that callers can report the status
+    )
+
+
+## Adapters
+
+class FeedAdapter(HTTPAdapter):
+    """The adapter mounted by with_session.
+    If a cache is given, GET requests are made conditional on the cached ETag/Last-Modified,
+    and a 304 response is served from the cache.
+    If a rate limiter is given, each request waits for a token for its host
+    (and so does each retry, if the adapter's max_retries is a FeedRetry with the same rate limiter, as create_retry makes).
+    If max_in_flight is given, at most that many requests are sent at once (by all the sessions the adapter is mounted on),
+    counting each until its body has been read (or until its headers, for streamed responses).
+    The latency, status and size of each response are recorded per host (see metrics).
+    """
+    cache: ResponseCache|None
+    rate_limiter: HostRateLimiter|None
+    slots: BoundedSemaphore|None
+
+    def __init__(
+            self,
+            *args,
+            cache: ResponseCache|None = None,
+            rate_limiter: HostRateLimiter|None = None,
+            max_in_flight: int|None = None,
+            **kwargs,
+    ):
+        self.cache = cache
+        self.rate_limiter = rate_limiter
+        self.slots = BoundedSemaphore(max_in_flight) if max_in_flight is not None else None
+        super().__init__(*args, **kwargs)
+
+    def send(self, request: PreparedRequest, stream: bool = False, *args: Any, **kwargs: Any) -> Response:
+        """Send the request, using the cache if possible."""
+        if self.rate_limiter is not None and request.url is not None:
+            self.rate_limiter.acquire(request.url)
+        if self.slots is None:
+            return self.send_cached(request, stream, *args, **kwargs)
+        with self.slots:
+            return self.send_cached(request, stream, *args, **kwargs)
+
+    def send_cached(self, request: PreparedRequest, stream: bool = False, *args: Any, **kwargs: Any) -> Response:
+        """Send the request, making it conditional on the cached response (if any)."""
+        if self.cache is None or request.method != "GET" or request.url is None:
+            return self.send_measured(request, stream, *args, **kwargs)
+        url: str = request.url
+        if (cached := self.cache.get(url)) is not None:
+            if cached.etag is not None:
+                request.headers.setdefault("If-None-Match", cached.etag)
+            if cached.last_modified is not None:
+                request.headers.setdefault("If-Modified-Since", cached.last_modified)
+        res = self.send_measured(request, stream, *args, **kwargs)
+        if res.status_code == 304 and cached is not None:
+            Logger.debug("Serving %s from the cache", url)
+            res.close()
+            return self.build_cached_response(request, res, cached)
+        # Streamed bodies are left to the caller (see store_response), since reading them here would defeat the purpose
+        if not stream:
+            self.store_response(res, res.content, url)
+        return res
+
+    def store_response(self, res: Response, content: bytes, url: str|None = None) -> None:
+        """Cache a response's body (e.g. once a streamed response has been read to the end), if it can be revalidated."""
+        if self.cache is not None and res.status_code == 200 \
+           and ("ETag" in res.headers or "Last-Modified" in res.headers):
+            self.cache.put(url if url is not None else res.url, dict(res.headers), content)
+
+    def send_measured(self, request: PreparedRequest, stream: bool = False, *args: Any, **kwargs: Any) -> Response:
+        """Send the request, recording its latency, status and size.
+        The latency is the time until the whole body has been read (or until the headers, for streamed responses),
+        and does not include waiting for the rate limiter.
+        """
+        host = urlsplit(request.url).netloc if request.url is not None else ""
+        start = perf_counter()
+        try:
+            res = super().send(request, stream, *args, **kwargs)
+            if not stream:
+                res.content # The session would read this anyway
+        except BaseException:
+            METRICS.observe(REQUEST_SECONDS, perf_counter() - start, host=host)
+            METRICS.count(REQUESTS, host=host, status="error")
+            raise
+        METRICS.observe(REQUEST_SECONDS, perf_counter() - start, host=host)
+        METRICS.count(REQUESTS, host=host, status=str(res.status_code))
+        if not stream:
+            # The bytes read from the connection, which are fewer than len(res.content) if it was compressed
+            METRICS.count(RESPONSE_BYTES, res.raw.tell(), host=host)
+        return res
+
+    def build_cached_response(self, request: PreparedRequest, not_modified: Response, cached: CachedResponse) -> Response:
+        """Create a 200 response from a cached response and the server's 304 response."""
+        res = Response()
+        res.status_code = 200
+        res.reason = "OK"
+        res.headers = CaseInsensitiveDict(cached.headers)
+        # The 304 response may carry updated metadata
+        res.headers.update({
+            key: val for key, val in not_modified.headers.items()
+            if key.lower() not in ("content-length", "content-encoding", "transfer-encoding")
+        })
+        res._content = cached.content
+        res._content_consumed = True
+        res.encoding = get_encoding_from_headers(res.headers)
+        res.url = cached.url
+        res.request = request
+        res.connection = self
+        res.elapsed = not_modified.elapsed
+        res.history = not_modified.history
+        res.cookies = not_modified.cookies
+        return res
+
+    def close(self) -> None:
+        """Close the adapter, pruning the cache."""
+        if self.cache is not None:
+            self.cache.evict()
+        super().close()
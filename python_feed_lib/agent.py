@@ -0,0 +1,18 @@
+#! /usr/bin/python3
+
+"""
+The user agent that requests are sent with.
+This is needed while parsing arguments, so it is kept apart from the (slow to import) networking code.
+"""
+
+from os import getenv
+
+DEFAULT_USER_AGENT: str = "Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/115.0"
+
+def get_user_agent() -> str:
+    """Get the default user agent."""
+    if (user_agent:= getenv("RSS_USER_AGENT")) is not None:
+        return user_agent
+    if (user_agent := getenv("USER_AGENT")) is not None:
+        return user_agent
+    return DEFAULT_USER_AGENT
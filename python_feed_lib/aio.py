@@ -0,0 +1,167 @@
+#! /usr/bin/python3
+
+"""
+Enrich articles with asyncio, limiting the requests in flight overall and per host.
+"""
+
+from concurrent.futures import Executor, ThreadPoolExecutor
+from contextlib import ExitStack, asynccontextmanager
+from inspect import iscoroutinefunction
+from typing import Any, Awaitable, Callable, Iterable
+from urllib.parse import urlsplit
+from xml.dom.minidom import Document, Element
+import asyncio
+import logging
+
+from requests import Session
+
+from .feeds import (
+    apply_enrichment,
+    create_process_pool,
+    finish_parse,
+    get_document,
+    parse_timed,
+    record_entries,
+    restore_entries,
+    skip_seen_entries,
+)
+from .metrics import METRICS, STAGE_SECONDS
+from .seen import SeenIndex
+from .store import ResultStore
+
+## Globals
+
+Logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_IN_FLIGHT: int = 8
+DEFAULT_MAX_PER_HOST: int = 3
+
+type Getter[T] = Callable[[Element, Session], tuple[Element, T]|Element]
+type AsyncGetter[T] = Callable[[Element, Session], Awaitable[tuple[Element, T]|Element]]
+
+
+## Limits
+
+class HostLimiter:
+    """Limit concurrent work overall and for each host."""
+    max_in_flight: int
+    max_per_host: int
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT, max_per_host: int = DEFAULT_MAX_PER_HOST):
+        if max_in_flight < 1 or max_per_host < 1:
+            raise ValueError("Concurrency limits must be at least 1")
+        self.max_in_flight = max_in_flight
+        self.max_per_host = max_per_host
+        self._global = asyncio.Semaphore(max_in_flight)
+        self._hosts: dict[str, asyncio.Semaphore] = {}
+
+    @asynccontextmanager
+    async def slot(self, host: str):
+        """Wait for a free slot for the host."""
+        if (host_limit := self._hosts.get(host)) is None:
+            host_limit = self._hosts[host] = asyncio.Semaphore(self.max_per_host)
+        # The host's slot is taken first, so that waiting on a busy host does not hold a global slot
+        async with host_limit, self._global:
+            yield
+
+def get_host(entry: Element) -> str:
+    """Get the host (and port) that an entry's article is on."""
+    for link in entry.getElementsByTagName("link"):
+        if href := link.getAttribute("href"):
+            return urlsplit(href).netloc.lower()
+    return ""
+
+def to_async_getter[T](getter: Getter[T], executor: Executor|None = None) -> AsyncGetter[T]:
+    """Adapt a synchronous getter (as used by enrich_articles) by running it in an executor.
+    The event loop's default executor is used if none is given.
+    Note that the default executor has few threads, which limits how many getters can run at once.
+    """
+    async def async_getter(entry: Element, sess: Session) -> tuple[Element, T]|Element:
+        return await asyncio.get_running_loop().run_in_executor(executor, getter, entry, sess)
+    return async_getter
+
+
+## Enrichment
+
+async def enrich_articles_async[T](
+        feed: Document|Element,
+        getter: AsyncGetter[T]|Getter[T],
+        setter: Callable[[Element, T, Document], None],
+        sess: Session,
+        doc: Document|None = None,
+        *,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        max_per_host: int = DEFAULT_MAX_PER_HOST,
+        store: ResultStore|None = None,
+        on_entry: Callable[[Element], None]|None = None,
+        logger: logging.Logger = Logger,
+        parser: Callable[[Any], T|None]|None = None,
+        processes: int|None = None,
+        seen: SeenIndex|None = None,
+) -> None:
+    """Get the article body and (if possible) media URL for each element.
+    This behaves like enrich_articles, but getter may be a coroutine function.
+    Synchronous getters are run in a pool of max_in_flight threads.
+    At most max_in_flight getters run at once, and at most max_per_host for the same host.
+    Parsers (see enrich_articles) run in the pool of processes, or otherwise in the threads,
+    and do not count towards the limits, which are for downloads.
+    Setters run on the event loop as each getter completes.
+    """
+    doc = get_document(feed, doc)
+    entries: list[Element] = feed.getElementsByTagName("entry")
+    produced: list[str] = []
+    if seen is not None:
+        on_entry = record_entries(produced, on_entry)
+    if store is not None:
+        entries = restore_entries(entries, store, doc, on_entry)
+    if seen is not None:
+        entries = skip_seen_entries(entries, seen, on_entry)
+    limiter = HostLimiter(max_in_flight, max_per_host)
+    loop = asyncio.get_running_loop()
+    with ExitStack() as pools:
+        process_pool = pools.enter_context(create_process_pool(processes)) \
+            if parser is not None and processes and entries else None
+        pool = pools.enter_context(ThreadPoolExecutor(max_workers=max_in_flight))
+        async_getter: AsyncGetter[T] = getter if iscoroutinefunction(getter) \
+            else to_async_getter(getter, pool) # type: ignore
+
+        async def get(entry: Element) -> tuple[Element, T]|Element:
+            async with limiter.slot(get_host(entry)):
+                downloaded = await async_getter(entry, sess)
+            if parser is None or isinstance(downloaded, Element):
+                return downloaded
+            entry, page = downloaded
+            try:
+                value, seconds = await loop.run_in_executor(
+                    process_pool if process_pool is not None else pool, parse_timed, parser, page,
+                )
+            except Exception as err:
+                return finish_parse(entry, None, err, logger)
+            METRICS.observe(STAGE_SECONDS, seconds, stage="parse")
+            return finish_parse(entry, value)
+
+        for result in asyncio.as_completed([get(entry) for entry in entries]):
+            apply_enrichment(await result, setter, doc, store, logger, on_entry)
+    if seen is not None:
+        seen.add(produced)
+
+async def map_limited[I, R](
+        func: Callable[[I], R],
+        items: Iterable[I],
+        host: Callable[[I], str],
+        *,
+        max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+        max_per_host: int = DEFAULT_MAX_PER_HOST,
+) -> list[R]:
+    """Call a synchronous function on each item in threads, limited by the item's host.
+    Results are returned in the same order as the items.
+    """
+    limiter = HostLimiter(max_in_flight, max_per_host)
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=max_in_flight) as pool:
+
+        async def call(item: I) -> R:
+            async with limiter.slot(host(item)):
+                return await loop.run_in_executor(pool, func, item)
+
+        return await asyncio.gather(*(call(item) for item in items))
@@ -0,0 +1,228 @@
+#! /usr/bin/python3
+
+"""
+Build many feeds in one process, writing each to its own file, e.g. from cron.
+This avoids starting a new interpreter (and opening new connections) for each feed:
+the feeds are built concurrently, and all of their requests go through one adapter,
+which shares its connection pool, cache and rate limits, and limits the number of requests in flight at once.
+
+Usage:
+python -m python_feed_lib.batch [--jobs N] [--max-in-flight N] [--output-dir DIR] [--verbose] CONFIG
+
+CONFIG is an INI file with a section for each feed, e.g.
+
+    [batch]
+    output_dir = ~/.cache/rss/feeds
+    jobs = 4
+    max_in_flight = 16
+    cache_dir = ~/.cache/rss
+
+    [fox6]
+    script = fox-6-milwaukee/fox_6_milwaukee.py
+    args = --store ~/.cache/rss/fox6.sqlite
+
+    [ben-shapiro]
+    script = dailywire-video/daily_wire_video_feed.py
+    args = "The Ben Shapiro Show" --max-entries 20
+    output = shapiro.atom
+
+Feeds are given as for the daemon (see python_feed_lib.daemon), and are written to output
+(relative to output_dir, and <section>.xml by default).
+Each file is replaced atomically, so a feed reader never sees a partial feed, and a feed that fails keeps its last output.
+
+The [batch] section can also set pool_size (connections kept open per host), rate_limit and burst (see with_session).
+Each feed keeps its script's headers (e.g. the user agent, referer and proxy),
+but the script's own cache and rate limit options are replaced by those of the [batch] section.
+Feeds are built in threads, so they cannot parse in processes (--processes).
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from configparser import ConfigParser, SectionProxy
+from contextlib import ExitStack
+from dataclasses import dataclass
+from os import path
+from typing import TYPE_CHECKING
+import argparse
+import logging
+import os
+import shlex
+import stat
+import sys
+import tempfile
+
+from .daemon import Route, load_route
+from .logging import setup_logging
+
+if TYPE_CHECKING:
+    from .adapters import FeedAdapter
+
+## Globals
+
+Logger = logging.getLogger(__name__)
+
+# The config section with the batch's own settings
+BATCH_SECTION: str = "batch"
+DEFAULT_JOBS: int = 4
+DEFAULT_MAX_IN_FLIGHT: int = 16
+# The URL prefixes that the shared adapter is mounted on
+PREFIXES: tuple[str, ...] = ("http://", "https://")
+
+def read_umask() -> int:
+    """Get the process's umask (which can only be read by setting it).
+    This briefly clears the umask, so it should be called before any other threads start (e.g. in main).
+    """
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+## Jobs
+
+@dataclass
+class Job:
+    """A feed built by the batch."""
+    route: Route
+    output: str
+    # The process's umask, which sets the mode of new output files
+    umask: int
+
+    @property
+    def name(self) -> str:
+        return self.route.name
+
+    def run(self) -> None:
+        """Build the feed and write it to the output file."""
+        write_output(self.output, self.route.generate(), self.umask)
+
+def write_output(file_name: str, body: bytes, umask: int) -> None:
+    """Atomically replace a file.
+    The file keeps the mode of the file it replaces, or else gets the mode that the umask gives new files
+    (rather than mkstemp's 0600), so that e.g. a web server can still read it.
+    """
+    try:
+        mode = stat.S_IMODE(os.stat(file_name).st_mode)
+    except FileNotFoundError:
+        mode = 0o666 & ~umask
+    fd, temp_name = tempfile.mkstemp(dir=path.dirname(file_name), prefix=".tmp-", suffix=".xml")
+    try:
+        with os.fdopen(fd, "wb") as opened:
+            opened.write(body)
+            os.fchmod(opened.fileno(), mode)
+        os.replace(temp_name, file_name)
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+
+def create_shared_adapter(settings: SectionProxy|dict[str, str], max_in_flight: int) -> "FeedAdapter":
+    """Create the adapter that every job's requests are sent through."""
+    from .feeds import DEFAULT_POOL_SIZE, create_adapter
+    cache_dir = settings.get("cache_dir")
+    rate_limit = settings.get("rate_limit")
+    return create_adapter(
+        cache_dir=path.expanduser(cache_dir) if cache_dir is not None else None,
+        # Enough connections to a host for every request in flight
+        pool_size=int(settings.get("pool_size", max(DEFAULT_POOL_SIZE, max_in_flight))),
+        rate_limit=float(rate_limit) if rate_limit is not None else None,
+        burst=float(settings.get("burst", 1.0)),
+        max_in_flight=max_in_flight,
+    )
+
+def load_jobs(
+        config: ConfigParser,
+        base_dir: str,
+        output_dir: str,
+        adapter: "FeedAdapter",
+        stack: ExitStack,
+        umask: int,
+) -> list[Job]:
+    """Load the jobs' scripts and open their sessions (which are closed with stack), mounting the shared adapter on each.
+    Jobs cannot parse in processes (e.g. with --processes), since the pools would be forked while other jobs' threads are running
+    (see create_process_pool), and spawned workers could not import the parsers of scripts loaded by path.
+    """
+    jobs: list[Job] = []
+    for name in config.sections():
+        if name == BATCH_SECTION:
+            continue
+        if (script := config[name].get("script")) is None:
+            raise RuntimeError(f"Job {name} has no script")
+        route = load_route(
+            name,
+            path.join(base_dir, path.expanduser(script)),
+            shlex.split(config[name].get("args", "")),
+            stack,
+        )
+        if getattr(route.conf, "processes", None):
+            raise RuntimeError(f"Job {name} cannot parse in processes in a batch (remove --processes from its args)")
+        # This replaces the adapter the script mounted, which has not made any requests yet
+        for prefix in PREFIXES:
+            route.sess.mount(prefix, adapter)
+        output = path.join(output_dir, path.expanduser(config[name].get("output", f"{name}.xml")))
+        jobs.append(Job(route, output, umask))
+    def close() -> None:
+        """Close the shared adapter once, rather than once for each session."""
+        for job in jobs:
+            for prefix in PREFIXES:
+                job.route.sess.adapters.pop(prefix, None)
+        adapter.close()
+    stack.callback(close)
+    return jobs
+
+def run_jobs(jobs: list[Job], workers: int) -> list[Job]:
+    """Run the jobs, at most workers at once. Returns the jobs that failed."""
+    def run(job: Job) -> bool:
+        try:
+            job.run()
+        except (Exception, SystemExit) as err: # Scripts may exit on errors
+            Logger.error("Unable to build %s: %s", job.name, err)
+            return False
+        Logger.info("Wrote %s to %s", job.name, job.output)
+        return True
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        succeeded = list(pool.map(run, jobs))
+    return [job for job, ok in zip(jobs, succeeded) if not ok]
+
+
+## Main function
+
+def main(args: list[str]) -> None:
+    """Build every feed in the config file once."""
+    parser = argparse.ArgumentParser(prog=args[0], description="Build many feeds in one process.")
+    parser.add_argument("config", type=str, help="Config file listing the feeds")
+    parser.add_argument("-j", "--jobs", type=int, default=None, help="Number of feeds to build at once", dest="jobs")
+    parser.add_argument(
+        "-m", "--max-in-flight", type=int, default=None, help="Number of requests to send at once, across all feeds", dest="max_in_flight",
+    )
+    parser.add_argument("-o", "--output-dir", type=str, default=None, help="Directory to write the feeds to", dest="output_dir")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log each feed written", dest="verbose")
+    parsed = parser.parse_args(args[1:])
+    # Read before any threads start (setup_logging starts the log listener's)
+    umask = read_umask()
+    setup_logging(__name__).setLevel(logging.INFO if parsed.verbose else logging.WARNING)
+    config = ConfigParser(interpolation=None)
+    if not config.read(parsed.config, encoding="utf-8"):
+        Logger.fatal("Unable to read config file %s", parsed.config)
+        sys.exit(1)
+    base_dir = path.dirname(path.abspath(parsed.config))
+    settings = config[BATCH_SECTION] if config.has_section(BATCH_SECTION) else {}
+    workers = parsed.jobs if parsed.jobs is not None else int(settings.get("jobs", DEFAULT_JOBS))
+    max_in_flight = parsed.max_in_flight if parsed.max_in_flight is not None \
+        else int(settings.get("max_in_flight", DEFAULT_MAX_IN_FLIGHT))
+    # The output directory in the config file is relative to the config file, and on the command line to the working directory
+    output_dir = path.abspath(path.expanduser(parsed.output_dir)) if parsed.output_dir is not None \
+        else path.join(base_dir, path.expanduser(settings.get("output_dir", base_dir)))
+    if workers < 1 or max_in_flight < 1:
+        parser.error("--jobs and --max-in-flight must be at least 1")
+    with ExitStack() as stack:
+        try:
+            os.makedirs(output_dir, exist_ok=True)
+            jobs = load_jobs(config, base_dir, output_dir, create_shared_adapter(settings, max_in_flight), stack, umask)
+        except (RuntimeError, OSError) as err:
+            Logger.fatal("%s", err)
+            sys.exit(1)
+        failed = run_jobs(jobs, workers)
+    if failed:
+        Logger.error("Unable to build %d of %d feeds: %s", len(failed), len(jobs), ", ".join(job.name for job in failed))
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main(sys.argv)
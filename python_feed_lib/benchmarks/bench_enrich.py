@@ -0,0 +1,73 @@
+#! /usr/bin/python3
+
+"""
+Compare the thread pool in enrich_articles with the asyncio engine, against local servers.
+
+Usage:
+python -m python_feed_lib.benchmarks.bench_enrich [--entries N] [--hosts N] [--latency SECONDS]
+"""
+
+from contextlib import ExitStack
+from time import perf_counter
+from typing import Callable
+from xml.dom.minidom import Document, Element, parseString
+import argparse
+import asyncio
+
+from requests import Session
+
+from .. import aio, feeds
+from .fixtures import make_atom
+from .server import FixtureServer
+
+def get_length(entry: Element, sess: Session) -> tuple[Element, int]|Element:
+    """A minimal getter: download the article."""
+    res = sess.get(feeds.get_entry_link(entry))
+    if res.status_code != 200:
+        return entry
+    return entry, len(res.content)
+
+def set_length(entry: Element, length: int, doc: Document) -> None:
+    """A minimal setter."""
+    entry.appendChild(feeds.create_text_node("content", str(length), doc))
+
+def run(name: str, entries: int, enrich: Callable[[Document, Session], None], base_urls: list[str]) -> None:
+    """Time one engine."""
+    feed = parseString(make_atom(entries, base_urls))
+    with feeds.with_session() as sess:
+        start = perf_counter()
+        enrich(feed, sess)
+        elapsed = perf_counter() - start
+    enriched = len(feed.getElementsByTagName("content"))
+    print(f"{name:<40} {elapsed:8.3f} s {entries / elapsed:10.1f} entries/s ({enriched}/{entries} enriched)")
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(prog="bench_enrich")
+    parser.add_argument("-n", "--entries", type=int, default=200, help="Entries in the feed")
+    parser.add_argument("--hosts", type=int, default=4, help="Number of servers to spread articles over")
+    parser.add_argument("--latency", type=float, default=0.05, help="Server latency in seconds")
+    args = parser.parse_args()
+    with ExitStack() as stack:
+        servers = [stack.enter_context(FixtureServer(args.latency)) for _ in range(args.hosts)]
+        base_urls = [server.url for server in servers]
+        for workers in (3, 16):
+            run(
+                f"thread pool (max_workers={workers})",
+                args.entries,
+                lambda feed, sess: feeds.enrich_articles(feed, get_length, set_length, sess, max_workers=workers),
+                base_urls,
+            )
+        for in_flight, per_host in ((16, 4), (32, 8)):
+            run(
+                f"asyncio (in flight={in_flight}, per host={per_host})",
+                args.entries,
+                lambda feed, sess: asyncio.run(aio.enrich_articles_async(
+                    feed, get_length, set_length, sess,
+                    max_in_flight=in_flight, max_per_host=per_host,
+                )),
+                base_urls,
+            )
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+#! /usr/bin/python3
+
+"""
+Startup benchmark for the entry points (the scripts, the daemon and the library itself).
+Feed readers start a script for every feed on every refresh, so the time before a script does any work matters,
+and --help and argument errors should not import the heavy dependencies at all.
+Each entry point is run in a new interpreter: the wall time is the fastest of several runs,
+and a run with -X importtime gives the total import time and any heavy modules imported.
+
+Usage:
+python -m python_feed_lib.benchmarks.bench_startup [--runs RUNS] [--budget MILLISECONDS] [--json FILE]
+
+With --budget, the exit status is 1 if any entry point takes longer than the budget (beyond the interpreter's own startup)
+or imports a heavy module.
+"""
+
+from dataclasses import asdict, dataclass
+from os import path
+from time import perf_counter
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+from .scripts import REPOSITORY
+
+# Modules that take a while to import, and are only needed once a feed is downloaded
+HEAVY_MODULES: tuple[str, ...] = ("bs4", "lxml", "requests", "soupsieve")
+
+# The command line (after the interpreter) of each entry point
+ENTRY_POINTS: dict[str, list[str]] = {
+    "python": ["-c", "pass"],
+    "import python_feed_lib": ["-c", "import python_feed_lib"],
+    "fox_6_milwaukee --help": [path.join(REPOSITORY, "fox-6-milwaukee/fox_6_milwaukee.py"), "--help"],
+    "npr-morning-edition --help": ["-m", "npr-morning-edition", "--help"],
+    "npr-morning-edition (no URL)": ["-m", "npr-morning-edition"],
+    "daily_wire_video_feed --help": [path.join(REPOSITORY, "dailywire-video/daily_wire_video_feed.py"), "--help"],
+    "filter-articles-by-category (usage)": [
+        path.join(REPOSITORY, "filter-articles-by-category/filter-articles-by-category.py"),
+    ],
+    "python_feed_lib.daemon --help": ["-m", "python_feed_lib.daemon", "--help"],
+    "python_feed_lib.batch --help": ["-m", "python_feed_lib.batch", "--help"],
+}
+
+@dataclass
+class Startup:
+    """The startup cost of an entry point."""
+    name: str
+    seconds: float
+    import_seconds: float
+    heavy: list[str]
+
+def run(args: list[str], env: dict[str, str], importtime: bool = False) -> str:
+    """Run an entry point in a new interpreter, and get its standard error."""
+    command = [sys.executable, *(["-X", "importtime"] if importtime else []), *args]
+    return subprocess.run(
+        command, cwd=REPOSITORY, env=env, stdin=subprocess.DEVNULL,
+        stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True, check=False,
+    ).stderr
+
+def parse_importtime(output: str) -> tuple[float, list[str]]:
+    """Get the total import time (in seconds) and the heavy modules imported from -X importtime's output."""
+    total = 0
+    heavy: set[str] = set()
+    for line in output.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, _, module = line.removeprefix("import time:").split("|")
+        total += int(self_us)
+        if (name := module.strip()) in HEAVY_MODULES:
+            heavy.add(name)
+    return total / 1e6, sorted(heavy)
+
+def measure(name: str, args: list[str], env: dict[str, str], runs: int) -> Startup:
+    """Measure an entry point's startup."""
+    best = float("inf")
+    for _ in range(runs):
+        start = perf_counter()
+        run(args, env)
+        best = min(best, perf_counter() - start)
+    import_seconds, heavy = parse_importtime(run(args, env, importtime=True))
+    return Startup(name, best, import_seconds, heavy)
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(prog="bench_startup")
+    parser.add_argument("--runs", type=int, default=10, help="Runs of each entry point (the fastest is reported)")
+    parser.add_argument("--budget", type=float, default=None, help="Allowed startup time beyond the interpreter's, in milliseconds")
+    parser.add_argument("--json", type=str, default=None, help="Write the results to this file")
+    args = parser.parse_args()
+    # The scripts import python_feed_lib (and the NPR package) from the repository
+    env = {**os.environ, "PYTHONPATH": os.pathsep.join(filter(None, (REPOSITORY, os.getenv("PYTHONPATH"))))}
+    results = [measure(name, command, env, max(args.runs, 1)) for name, command in ENTRY_POINTS.items()]
+    interpreter = results[0].seconds
+    width = max(len(result.name) for result in results)
+    print(f"{'entry point':<{width}} {'time':>9} {'imports':>9}  heavy modules")
+    for result in results:
+        print(f"{result.name:<{width}} {result.seconds * 1000:7.1f}ms {result.import_seconds * 1000:7.1f}ms  {', '.join(result.heavy)}")
+    if args.json is not None:
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump([asdict(result) for result in results], json_file, indent=1)
+    if args.budget is not None:
+        # Importing the library is expected to be cheap, but not free of heavy modules once a name is used
+        failed = [
+            result.name for result in results[1:]
+            if result.heavy or (result.seconds - interpreter) * 1000 > args.budget
+        ]
+        if failed:
+            print(f"Over the startup budget of {args.budget:g}ms: {', '.join(failed)}", file=sys.stderr)
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,54 @@
+#! /usr/bin/python3
+
+"""
+Compare the peak memory of enrich_articles with and without a submission window.
+
+Usage:
+python -m python_feed_lib.benchmarks.bench_streaming [--entries N ...]
+"""
+
+from time import perf_counter
+from xml.dom.minidom import Document, Element, parseString
+import argparse
+import tracemalloc
+
+from bs4 import BeautifulSoup
+from requests import Session
+
+from .. import feeds
+from .fixtures import make_atom
+from .server import FixtureServer
+
+def get_page(entry: Element, sess: Session) -> tuple[Element, BeautifulSoup]|Element:
+    """Download and parse the article, as the scripts' getters do."""
+    res = sess.get(feeds.get_entry_link(entry))
+    if res.status_code != 200:
+        return entry
+    return entry, BeautifulSoup(res.content, "lxml")
+
+def set_page(entry: Element, page: BeautifulSoup, doc: Document) -> None:
+    """Use and free the parse tree."""
+    entry.appendChild(feeds.create_text_node("content", str(len(page.find_all("p"))), doc))
+    page.decompose()
+
+def main() -> None:
+    """Run the benchmark."""
+    parser = argparse.ArgumentParser(prog="bench_streaming")
+    parser.add_argument("-n", "--entries", type=int, nargs="+", default=[25, 50, 100, 200], help="Entries in the feed")
+    parser.add_argument("-w", "--window", type=int, default=8, help="Submission window for streaming mode")
+    args = parser.parse_args()
+    with FixtureServer() as server:
+        for entries in args.entries:
+            for window in (None, args.window):
+                feed = parseString(make_atom(entries, server.base_urls))
+                with feeds.with_session() as sess:
+                    tracemalloc.start()
+                    start = perf_counter()
+                    feeds.enrich_articles(feed, get_page, set_page, sess, window=window)
+                    elapsed = perf_counter() - start
+                    _, peak = tracemalloc.get_traced_memory()
+                    tracemalloc.stop()
+                print(f"entries={entries:<5} window={str(window):<5} {elapsed:7.3f} s  peak {peak / 2**20:8.1f} MiB")
+
+if __name__ == "__main__":
+    main()
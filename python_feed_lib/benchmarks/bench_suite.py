@@ -0,0 +1,223 @@
+#! /usr/bin/python3
+
+"""
+Offline benchmark suite for python_feed_lib and the Python feed scripts.
+Everything is served by a local fixture server: synthetic feeds and articles at several sizes,
+and any recorded fixtures (see the record module).
+Each benchmark reports wall time (the fastest of three runs, or one with --quick), throughput, and peak traced memory.
+
+Usage:
+python -m python_feed_lib.benchmarks.bench_suite [--quick] [--only SUBSTRING] [--json FILE]
+    [--baseline FILE [--tolerance FRACTION]] [--recorded DIRECTORY]
+
+With --baseline, the results are compared to a previous --json run,
+and the exit status is 1 if any benchmark is slower by more than the tolerance.
+"""
+
+from contextlib import redirect_stderr, redirect_stdout
+from dataclasses import asdict, dataclass
+from time import perf_counter
+from typing import Any, Callable
+from xml.dom.minidom import parseString
+import argparse
+import io
+import json
+import os
+import sys
+import tempfile
+import tracemalloc
+
+from bs4 import BeautifulSoup
+
+from .. import feeds
+from . import scripts
+from .fixtures import RecordedFixture, load_recorded, make_article, make_atom, make_rss
+from .record import DEFAULT_DIRECTORY
+from .server import FixtureServer
+
+@dataclass
+class Result:
+    """The result of a benchmark."""
+    name: str
+    items: int
+    seconds: float
+    peak_mib: float
+
+    @property
+    def throughput(self) -> float:
+        """Items per second."""
+        return self.items / self.seconds if self.seconds > 0 else float("inf")
+
+def measure(name: str, items: int, run: Callable[[Any], object], setup: Callable[[], Any] = lambda: None, repeat: int = 3) -> Result:
+    """Time run(setup()) repeat times, then measure its peak memory in one more traced run.
+    Setup is not timed, and runs before every call (so run may consume its input).
+    """
+    best = float("inf")
+    for _ in range(repeat):
+        arg = setup()
+        start = perf_counter()
+        run(arg)
+        best = min(best, perf_counter() - start)
+    arg = setup()
+    tracemalloc.start()
+    try:
+        run(arg)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return Result(name=name, items=items, seconds=best, peak_mib=peak / 2**20)
+
+def quiet[T](func: Callable[[], T]) -> T:
+    """Run a script's function, discarding what it prints."""
+    with redirect_stdout(io.StringIO()), redirect_stderr(io.StringIO()):
+        return func()
+
+def run_main(main: Callable[[list[str]], None], args: list[str]) -> None:
+    """Run a script's main function, which may exit."""
+    try:
+        quiet(lambda: main(args))
+    except SystemExit as err:
+        if err.code not in (None, 0):
+            raise RuntimeError(f"{args[0]} exited with status {err.code}") from err
+
+
+## Benchmarks
+
+def bench_library(sizes: list[int], paragraphs: list[int], recorded: list[RecordedFixture], repeat: int) -> list[Result]:
+    """Benchmark the library's conversion, sorting and cleanup functions."""
+    results: list[Result] = []
+    feeds_data = [(f"{size} entries", size, make_rss(size, ["https://example.org"]).encode("utf-8")) for size in sizes]
+    feeds_data += [
+        (f"recorded {fixture.name}", fixture.feed.count(b"<item"), fixture.feed)
+        for fixture in recorded if b"<rss" in fixture.feed[:1024]
+    ]
+    for label, size, data in feeds_data:
+        results.append(measure(f"convert_feed ({label})", size, feeds.convert_feed, lambda: parseString(data), repeat))
+        results.append(measure(
+            f"sort_elements ({label})", size, feeds.sort_elements,
+            lambda: feeds.convert_feed(parseString(data)), repeat,
+        ))
+    pages = [(f"{count} paragraphs", make_article(0, count)) for count in paragraphs]
+    pages += [(f"recorded {fixture.name}", next(iter(fixture.articles.values()))) for fixture in recorded if fixture.articles]
+    for label, page in pages:
+        results.append(measure(f"BeautifulSoup parse ({label})", 1, lambda data: BeautifulSoup(data, "lxml"), lambda: page, repeat))
+        results.append(measure(f"cleanup_html ({label})", 1, feeds.cleanup_html, lambda: BeautifulSoup(page, "lxml"), repeat))
+    return results
+
+def bench_enrich(server: FixtureServer, sizes: list[int], recorded: list[RecordedFixture], repeat: int) -> list[Result]:
+    """Benchmark enrich_articles end-to-end with the Fox6 and NPR getters and setters."""
+    fox6 = scripts.fox6()
+    npr = scripts.load_package("npr-morning-edition", "feeds")
+    results: list[Result] = []
+    engines = (
+        ("fox6", fox6.fetch_article, fox6.update_article, fox6.extract_article, None),
+        ("fox6, 4 processes", fox6.fetch_article, fox6.update_article, fox6.parse_article, 4),
+        ("npr", npr.fetch_article, npr.enrich_article, npr.parse_article, None),
+    )
+    for name, getter, setter, parser, processes in engines:
+        cases = [(f"{size} entries", size, make_atom(size, server.base_urls).encode("utf-8")) for size in sizes]
+        cases += [
+            (f"recorded {fixture.name}", len(fixture.articles), server.recorded_feed(fixture))
+            for fixture in recorded
+        ]
+        for label, size, data in cases:
+            def setup() -> Any:
+                doc = parseString(data)
+                return doc if doc.documentElement.tagName == "feed" else feeds.convert_feed(doc)
+            with feeds.with_session() as sess:
+                results.append(measure(
+                    f"enrich_articles {name} ({label})", size,
+                    lambda doc: quiet(lambda: feeds.enrich_articles(
+                        doc, getter, setter, sess, window=8, parser=parser, processes=processes,
+                    )),
+                    setup, repeat,
+                ))
+    return results
+
+def bench_scripts(server: FixtureServer, sizes: list[int], repeat: int) -> list[Result]:
+    """Benchmark each script's main function against the fixture server."""
+    results: list[Result] = []
+    fox6 = scripts.fox6()
+    npr = scripts.npr()
+    daily_wire = scripts.daily_wire()
+    filter_articles = scripts.filter_articles()
+    for size in sizes:
+        fox6.FEED_URL = f"{server.url}/rss?entries={size}"
+        results.append(measure(f"fox_6_milwaukee main ({size} entries)", size, lambda _: run_main(fox6.main, ["fox6"]), repeat=repeat))
+        urls = [f"{server.url}/rss?entries={size // 2}", f"{server.url}/atom?entries={size - size // 2}"]
+        results.append(measure(f"npr-morning-edition main ({size} entries)", size, lambda _: run_main(npr.main, ["npr", *urls]), repeat=repeat))
+        # The Daily Wire downloads are made to fixed hosts, so only the feed creation is measured
+        videos = [
+            daily_wire.VideoElement(None, f"{server.url}/article/{i}", f"Episode {i}", "2025-02-01T12:00:00Z", "Description", f"episode-{i}")
+            for i in range(size)
+        ]
+        results.append(measure(
+            f"daily_wire_video_feed create_feed ({size} entries)", size,
+            lambda _: daily_wire.create_feed("Benchmark Show", videos).toxml(), repeat=repeat,
+        ))
+        with tempfile.NamedTemporaryFile("w", suffix=".xml", delete=False) as feed_file:
+            feed_file.write(make_rss(size, server.base_urls))
+        try:
+            results.append(measure(
+                f"filter-articles-by-category main ({size} entries)", size,
+                lambda _: run_main(filter_articles.main, ["filter", feed_file.name, "sports"]), repeat=repeat,
+            ))
+        finally:
+            os.unlink(feed_file.name)
+    return results
+
+
+## Reporting
+
+def print_results(results: list[Result], baseline: dict[str, float]) -> None:
+    """Print a table of results."""
+    width = max(len(result.name) for result in results)
+    print(f"{'benchmark':<{width}} {'time':>10} {'items/s':>10} {'peak MiB':>9} {'change':>8}")
+    for result in results:
+        change = f"{result.seconds / baseline[result.name] - 1:+7.0%}" if result.name in baseline else ""
+        print(f"{result.name:<{width}} {result.seconds * 1000:8.1f}ms {result.throughput:10.1f} {result.peak_mib:9.1f} {change:>8}")
+
+def regressions(results: list[Result], baseline: dict[str, float], tolerance: float) -> list[str]:
+    """Get the names of the benchmarks that are slower than the baseline by more than the tolerance."""
+    return [
+        result.name for result in results
+        if result.name in baseline and result.seconds > baseline[result.name] * (1 + tolerance)
+    ]
+
+def main() -> None:
+    """Run the suite."""
+    parser = argparse.ArgumentParser(prog="bench_suite")
+    parser.add_argument("--quick", action="store_true", help="Use smaller sizes and fewer runs")
+    parser.add_argument("--only", type=str, default=None, help="Only run benchmarks containing this text")
+    parser.add_argument("--json", type=str, default=None, help="Write the results to this file")
+    parser.add_argument("--baseline", type=str, default=None, help="Compare to results written with --json")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="Allowed slowdown compared to the baseline")
+    parser.add_argument("--recorded", type=str, default=DEFAULT_DIRECTORY, help="Directory of recorded fixtures")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latency added to each response, in seconds")
+    args = parser.parse_args()
+    repeat = 1 if args.quick else 3
+    feed_sizes = [100, 1000] if args.quick else [100, 1000, 10000]
+    enrich_sizes = [20] if args.quick else [20, 100]
+    recorded = load_recorded(args.recorded)
+    baseline: dict[str, float] = {}
+    if args.baseline is not None:
+        with open(args.baseline, encoding="utf-8") as baseline_file:
+            baseline = {result["name"]: result["seconds"] for result in json.load(baseline_file)}
+    results: list[Result] = []
+    with FixtureServer(args.latency, recorded=recorded) as server:
+        for bench in (
+                lambda: bench_library(feed_sizes, [10, 100], recorded, repeat),
+                lambda: bench_enrich(server, enrich_sizes, recorded, repeat),
+                lambda: bench_scripts(server, enrich_sizes, repeat),
+        ):
+            results.extend(result for result in bench() if args.only is None or args.only in result.name)
+    print_results(results, baseline)
+    if args.json is not None:
+        with open(args.json, "w", encoding="utf-8") as json_file:
+            json.dump([asdict(result) for result in results], json_file, indent=1)
+    if slower := regressions(results, baseline, args.tolerance):
+        print(f"Slower than the baseline by more than {args.tolerance:.0%}: {', '.join(slower)}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#! /usr/bin/python3
+
+"""
+Synthetic feeds and article pages for benchmarks.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from html import escape
+from os import path
+import json
+import os
+
+# The newest entry in every generated feed
+NEWEST: datetime = datetime(2025, 2, 1, 12, 0, tzinfo=timezone.utc)
+
+def article_url(base_urls: list[str], i: int) -> str:
+    """Get the URL of the i-th article, spread over the servers."""
+    return f"{base_urls[i % len(base_urls)]}/article/{i}"
+
+def make_rss(entries: int, base_urls: list[str]) -> str:
+    """Create an RSS 2.0 feed, newest first."""
+    items = "".join(
+        f"""<item>
+<title>Article {i}</title>
+<guid>{escape(article_url(base_urls, i))}</guid>
+<pubDate>{format_datetime(NEWEST - timedelta(minutes=17 * i))}</pubDate>
+<link>{escape(article_url(base_urls, i))}</link>
+<description>Summary of article {i}.</description>
+<category>{"Sports" if i % 5 == 0 else "News"}</category>
+</item>
+""" for i in range(entries))
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<rss version="2.0">
+<channel>
+<title>Benchmark Feed</title>
+<description>A synthetic feed</description>
+<copyright>Nobody</copyright>
+<lastBuildDate>{format_datetime(NEWEST)}</lastBuildDate>
+<image><url>https://example.org/logo.png</url></image>
+{items}</channel>
+</rss>"""
+
+def make_atom(entries: int, base_urls: list[str]) -> str:
+    """Create an Atom feed, newest first."""
+    items = "".join(
+        f"""<entry>
+<title>Article {i}</title>
+<id>{escape(article_url(base_urls, i))}</id>
+<updated>{(NEWEST - timedelta(minutes=17 * i)).isoformat()}</updated>
+<link href="{escape(article_url(base_urls, i))}"/>
+<summary>Summary of article {i}.</summary>
+<category term="{"Sports" if i % 5 == 0 else "News"}"/>
+</entry>
+""" for i in range(entries))
+    return f"""<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+<title>Benchmark Feed</title>
+<id>urn:benchmark</id>
+<updated>{NEWEST.isoformat()}</updated>
+{items}</feed>"""
+
+def make_article(i: int, paragraphs: int = 40) -> str:
+    """Create an article page, shaped like the pages the scripts download.
+    It has an .article-content body (with scripts, comments and signup links to clean up),
+    an ld+json video description, and an NPR-style audio link.
+    """
+    body = "".join(
+        f"<p>Paragraph {p} of article {i}. " + "Lorem ipsum dolor sit amet, consectetur adipiscing elit. " * 4 + "</p>\n"
+        for p in range(paragraphs)
+    )
+    filler = "".join(f'<li><a href="/section/{n}">Section {n}</a></li>' for n in range(60))
+    return f"""<!DOCTYPE html>
+<html lang="en">
+<head>
+<title>Article {i}</title>
+<script>window.dataLayer = [];</script>
+<script type="application/ld+json">{{"@type": "VideoObject", "contentUrl": "https://example.org/video/{i}.m3u8"}}</script>
+<link rel="stylesheet" href="/style.css">
+</head>
+<body>
+<nav><ul>{filler}</ul></nav>
+<div class="audio-module"><a class="audio-module-listen" href="https://example.org/audio/{i}.mp3?tracking=1">Listen</a></div>
+<div class="article-content">
+{body}<div class="ad"><!-- advertisement --><span>Ad</span></div>
+<script>track({i});</script>
+<p><a href="https://www.fox6now.com/newsletters">Sign up for our newsletter</a></p>
+<p><a href="https://fox6news.onelink.me/abc">Get the app</a></p>
+</div>
+<footer><ul>{filler}</ul></footer>
+</body>
+</html>"""
+
+
+## Recorded fixtures
+
+@dataclass
+class RecordedFixture:
+    """A feed and its article pages, saved by the record module."""
+    name: str
+    feed: bytes
+    articles: dict[str, bytes] # Page, by the URL it was downloaded from
+
+def load_recorded(directory: str) -> list[RecordedFixture]:
+    """Load the recorded fixtures in a directory (one subdirectory per fixture)."""
+    fixtures: list[RecordedFixture] = []
+    if not path.isdir(directory):
+        return fixtures
+    for name in sorted(os.listdir(directory)):
+        if not path.isfile(manifest_path := path.join(directory, name, "manifest.json")):
+            continue
+        with open(manifest_path, encoding="utf-8") as manifest_file:
+            manifest = json.load(manifest_file)
+        with open(path.join(directory, name, manifest["feed"]), "rb") as feed_file:
+            feed = feed_file.read()
+        articles: dict[str, bytes] = {}
+        for url, file_name in manifest["articles"].items():
+            with open(path.join(directory, name, file_name), "rb") as article_file:
+                articles[url] = article_file.read()
+        fixtures.append(RecordedFixture(name=name, feed=feed, articles=articles))
+    return fixtures
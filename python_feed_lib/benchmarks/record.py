@@ -0,0 +1,60 @@
+#! /usr/bin/python3
+
+"""
+Record a feed and its article pages as a benchmark fixture.
+
+Usage:
+python -m python_feed_lib.benchmarks.record NAME FEED_URL [--articles N] [--output DIRECTORY]
+
+The fixture is saved to DIRECTORY/NAME, which can be given to bench_suite with --recorded.
+"""
+
+from os import path
+from xml.dom.minidom import parseString
+import argparse
+import json
+import os
+
+from .. import feeds
+
+DEFAULT_DIRECTORY: str = path.join(path.dirname(path.abspath(__file__)), "recorded")
+
+def main() -> None:
+    """Record a fixture."""
+    parser = argparse.ArgumentParser(prog="record")
+    parser.add_argument("name", type=str, help="Name of the fixture")
+    parser.add_argument("url", type=str, help="URL of the feed")
+    parser.add_argument("-n", "--articles", type=int, default=20, help="Number of articles to record")
+    parser.add_argument("-o", "--output", type=str, default=DEFAULT_DIRECTORY, help="Directory to save fixtures in")
+    parser.add_argument("-p", "--proxy", type=str, default=None, help="Proxy URL to use")
+    args = parser.parse_args()
+    directory = path.join(args.output, args.name)
+    os.makedirs(directory, exist_ok=True)
+    with feeds.with_session(user_agent=feeds.get_user_agent(), proxy=args.proxy) as sess:
+        res = sess.get(args.url)
+        res.raise_for_status()
+        with open(path.join(directory, "feed.xml"), "wb") as feed_file:
+            feed_file.write(res.content)
+        doc = parseString(res.content)
+        if doc.documentElement.tagName == "feed":
+            links = [node.getAttribute("href") for node in doc.getElementsByTagName("link")
+                     if node.parentNode.tagName == "entry" and not node.getAttribute("rel")]
+        else:
+            links = [feeds.get_string(node).strip() for node in doc.getElementsByTagName("link")
+                     if node.parentNode.tagName == "item"]
+        articles: dict[str, str] = {}
+        for i, link in enumerate(links[:args.articles]):
+            res = sess.get(link)
+            if res.status_code != 200:
+                print(f"Skipping {link}: received status code {res.status_code}")
+                continue
+            file_name = f"article-{i}.html"
+            with open(path.join(directory, file_name), "wb") as article_file:
+                article_file.write(res.content)
+            articles[link] = file_name
+    with open(path.join(directory, "manifest.json"), "w", encoding="utf-8") as manifest_file:
+        json.dump({"feed": "feed.xml", "articles": articles}, manifest_file, indent=1)
+    print(f"Recorded {len(articles)} articles to {directory}")
+
+if __name__ == "__main__":
+    main()
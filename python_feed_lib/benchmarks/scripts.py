@@ -0,0 +1,37 @@
+#! /usr/bin/python3
+
+"""
+Load the feed scripts (which live in directories that are not valid module names) for benchmarking.
+"""
+
+from importlib import import_module
+from os import path
+from types import ModuleType
+import sys
+
+from ..loader import load_script
+
+# The root of the repository, which contains python_feed_lib and the scripts
+REPOSITORY: str = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+
+def load_package(directory: str, submodule: str) -> ModuleType:
+    """Load a module from a script package (e.g. npr-morning-edition)."""
+    if REPOSITORY not in sys.path:
+        sys.path.insert(0, REPOSITORY)
+    return import_module(f"{directory}.{submodule}")
+
+def fox6() -> ModuleType:
+    """Load the Fox6 Milwaukee script."""
+    return load_script(path.join(REPOSITORY, "fox-6-milwaukee/fox_6_milwaukee.py"))
+
+def npr() -> ModuleType:
+    """Load the NPR Morning Edition script's entry point."""
+    return load_script(path.join(REPOSITORY, "npr-morning-edition"))
+
+def daily_wire() -> ModuleType:
+    """Load the Daily Wire video script."""
+    return load_script(path.join(REPOSITORY, "dailywire-video/daily_wire_video_feed.py"))
+
+def filter_articles() -> ModuleType:
+    """Load the category filter script."""
+    return load_script(path.join(REPOSITORY, "filter-articles-by-category/filter-articles-by-category.py"))
@@ -0,0 +1,95 @@
+#! /usr/bin/python3
+
+"""
+A local HTTP server for benchmarks, serving synthetic feeds and articles.
+"""
+
+from html import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import sleep
+from urllib.parse import parse_qs, urlsplit
+
+from .fixtures import RecordedFixture, make_article, make_atom, make_rss
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serve the fixtures.
+    /rss?entries=N and /atom?entries=N serve feeds, /article/I serves an article.
+    /recorded/NAME/feed serves a recorded feed (with links to recorded articles made local),
+    and /recorded/NAME/article/I serves its recorded articles.
+    """
+    server: "FixtureServer"
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self) -> None:
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        entries = int(query.get("entries", ["20"])[0])
+        if self.server.latency > 0:
+            sleep(self.server.latency)
+        if url.path == "/rss":
+            self.reply(make_rss(entries, self.server.base_urls), "application/rss+xml")
+        elif url.path == "/atom":
+            self.reply(make_atom(entries, self.server.base_urls), "application/atom+xml")
+        elif url.path.startswith("/article/"):
+            self.reply(make_article(int(url.path.rsplit("/", 1)[1]), self.server.paragraphs), "text/html; charset=utf-8")
+        elif url.path.startswith("/recorded/") and len(parts := url.path.split("/")) >= 4 \
+             and (fixture := self.server.recorded.get(parts[2])) is not None:
+            if parts[3] == "feed":
+                self.reply(self.server.recorded_feed(fixture), "application/xml")
+            elif parts[3] == "article" and len(parts) == 5 and parts[4].isdigit() \
+                 and int(parts[4]) < len(fixture.articles):
+                self.reply(list(fixture.articles.values())[int(parts[4])], "text/html")
+            else:
+                self.send_error(404)
+        else:
+            self.send_error(404)
+
+    def reply(self, body: str|bytes, content_type: str) -> None:
+        data = body.encode("utf-8") if isinstance(body, str) else body
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args) -> None:
+        pass
+
+class FixtureServer(ThreadingHTTPServer):
+    """A fixture server on an ephemeral local port, run in a background thread.
+    base_urls lists the servers that article links are spread over (this server by default).
+    """
+    daemon_threads = True
+    latency: float
+    paragraphs: int
+    base_urls: list[str]
+    recorded: dict[str, RecordedFixture]
+
+    def __init__(self, latency: float = 0.0, paragraphs: int = 40, recorded: list[RecordedFixture]|None = None):
+        super().__init__(("127.0.0.1", 0), FixtureHandler)
+        self.latency = latency
+        self.paragraphs = paragraphs
+        self.base_urls = [self.url]
+        self.recorded = {fixture.name: fixture for fixture in recorded or []}
+
+    def recorded_feed(self, fixture: RecordedFixture) -> bytes:
+        """Get a recorded feed, with its article links pointing at this server."""
+        feed = fixture.feed
+        for i, url in enumerate(fixture.articles):
+            local = f"{self.url}/recorded/{fixture.name}/article/{i}"
+            feed = feed.replace(escape(url).encode("utf-8"), local.encode("utf-8"))
+        return feed
+
+    @property
+    def url(self) -> str:
+        """The base URL of the server."""
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+    def __enter__(self) -> "FixtureServer":
+        Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.shutdown()
+        self.server_close()
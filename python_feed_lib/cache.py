@@ -0,0 +1,183 @@
+#! /usr/bin/python3
+
+"""
+An on-disk store of HTTP responses, used for conditional GET requests.
+"""
+
+from dataclasses import dataclass
+from hashlib import sha256
+from os import getenv, path
+from threading import Lock
+from time import time
+import json
+import logging
+import os
+import tempfile
+
+## Globals
+
+Logger = logging.getLogger(__name__)
+
+# Default limits for the cache
+DEFAULT_MAX_SIZE: int = 64 * 1024 * 1024 # 64 MiB
+DEFAULT_MAX_AGE: float = 7 * 24 * 60 * 60 # One week
+# Entries are evicted after this many writes, so that long-lived sessions (e.g. the daemon's) keep the cache within its limits
+DEFAULT_EVICT_INTERVAL: int = 256
+
+# Headers that describe the transfer, not the stored (decoded) body
+TRANSFER_HEADERS: tuple[str, ...] = ("content-encoding", "content-length", "transfer-encoding")
+
+def get_cache_dir() -> str|None:
+    """Get the default cache directory from the RSS_CACHE_DIR environment variable.
+    Returns None (no caching) if it is not set.
+    """
+    return getenv("RSS_CACHE_DIR") or None
+
+
+## Cache
+
+@dataclass
+class CachedResponse:
+    """A response read from the cache."""
+    url: str
+    headers: dict[str, str]
+    content: bytes
+
+    @property
+    def etag(self) -> str|None:
+        """The entity tag sent by the server."""
+        return self.headers.get("etag")
+
+    @property
+    def last_modified(self) -> str|None:
+        """The Last-Modified date sent by the server."""
+        return self.headers.get("last-modified")
+
+class ResponseCache:
+    """A directory of cached responses, keyed by URL.
+    Each response is stored as a JSON metadata file and a body file.
+    Entries are evicted when older than max_age, and then by least-recent use until the cache is smaller than max_size.
+    Eviction runs every evict_interval writes (and when the session is closed).
+    """
+    directory: str
+    max_size: int
+    max_age: float
+    evict_interval: int
+
+    def __init__(
+            self,
+            directory: str,
+            max_size: int = DEFAULT_MAX_SIZE,
+            max_age: float = DEFAULT_MAX_AGE,
+            evict_interval: int = DEFAULT_EVICT_INTERVAL,
+    ):
+        self.directory = path.expandvars(path.expanduser(directory))
+        self.max_size = max_size
+        self.max_age = max_age
+        self.evict_interval = evict_interval
+        self._writes = 0
+        self._lock = Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def _paths(self, url: str) -> tuple[str, str]:
+        """Get the metadata and body file names for a URL."""
+        key = path.join(self.directory, sha256(url.encode("utf-8")).hexdigest())
+        return f"{key}.json", f"{key}.body"
+
+    def get(self, url: str) -> CachedResponse|None:
+        """Get a response from the cache.
+        Returns None if the URL is not cached (or the entry is unreadable or expired).
+        """
+        meta_path, body_path = self._paths(url)
+        try:
+            if time() - path.getmtime(meta_path) > self.max_age:
+                return None
+            with open(meta_path, encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+            with open(body_path, "rb") as body_file:
+                content = body_file.read()
+            # Mark the entry as recently used
+            os.utime(meta_path)
+        except (OSError, ValueError) as err:
+            if not isinstance(err, FileNotFoundError):
+                Logger.info("Unable to read cached response for %s: %s", url, err)
+            return None
+        if meta.get("url") != url:
+            return None # Hash collision
+        return CachedResponse(url=url, headers=meta["headers"], content=content)
+
+    def put(self, url: str, headers: dict[str, str], content: bytes) -> None:
+        """Store a response in the cache.
+        Files are replaced atomically, so concurrent readers never see a partial entry.
+        """
+        meta_path, body_path = self._paths(url)
+        meta = {
+            "url": url,
+            "headers": {
+                key.lower(): val for key, val in headers.items() if key.lower() not in TRANSFER_HEADERS
+            },
+        }
+        try:
+            # The body is written first, so that the metadata never refers to a missing body
+            self._write(body_path, content)
+            self._write(meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError as err:
+            Logger.info("Unable to cache response for %s: %s", url, err)
+            return
+        with self._lock:
+            self._writes += 1
+            due = self._writes % self.evict_interval == 0
+        if due:
+            self.evict()
+
+    def _write(self, file_name: str, data: bytes) -> None:
+        """Atomically write a file in the cache directory."""
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as opened:
+                opened.write(data)
+            os.replace(tmp, file_name)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+    def evict(self) -> None:
+        """Remove expired entries, then the least recently used entries until under the size limit."""
+        now = time()
+        entries: list[tuple[float, int, str]] = []
+        try:
+            with os.scandir(self.directory) as scan:
+                for entry in scan:
+                    if not entry.name.endswith(".json"):
+                        continue
+                    key = entry.path[:-len(".json")]
+                    try:
+                        stat = entry.stat()
+                        mtime = stat.st_mtime
+                        size = stat.st_size + path.getsize(f"{key}.body")
+                    except OSError: # Incomplete entry
+                        self._remove(key)
+                        continue
+                    if now - mtime > self.max_age:
+                        self._remove(key)
+                    else:
+                        entries.append((mtime, size, key))
+        except OSError as err:
+            Logger.info("Unable to evict cache entries: %s", err)
+            return
+        total = sum(size for _, size, _ in entries)
+        entries.sort()
+        for _, size, key in entries:
+            if total <= self.max_size:
+                break
+            self._remove(key)
+            total -= size
+
+    @staticmethod
+    def _remove(key: str) -> None:
+        """Remove an entry from the cache."""
+        for suffix in (".json", ".body"):
+            try:
+                os.unlink(f"{key}{suffix}")
+            except FileNotFoundError:
+                pass
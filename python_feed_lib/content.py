@@ -0,0 +1,97 @@
+#! /usr/bin/python3
+
+"""
+Put parsed HTML (e.g. an article body) into an Atom feed.
+Beautiful Soup elements are converted straight into minidom nodes, rather than serialized as XML and parsed again.
+"""
+
+from typing import Iterator
+from xml.dom.minidom import Document, Element, getDOMImplementation, parseString
+import re
+
+from bs4 import Comment, Declaration, Doctype, NavigableString, PageElement, ProcessingInstruction, Tag
+
+## Globals
+
+XHTML_NAMESPACE: str = "http://www.w3.org/1999/xhtml"
+
+# HTML allows names that XML does not (e.g. "@click"), so elements and attributes are checked before conversion.
+# Prefixed names (e.g. "fb:like") are also rejected, since their namespaces are not declared.
+XML_NAME = re.compile(r"[A-Za-z_][\w.-]*")
+# Characters that cannot appear in an XML 1.0 document
+INVALID_XML_CHARS = re.compile(r"[^\x09\x0a\x0d\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]")
+
+# Strings that are not part of the content
+SKIPPED_STRINGS: tuple[type, ...] = (Comment, Declaration, Doctype, ProcessingInstruction)
+
+
+## Conversion
+
+def convert_html(content: Tag, doc: Document) -> Element:
+    """Convert a Beautiful Soup element (and its descendants) into a minidom element of doc.
+    Comments and declarations are dropped, as are attributes whose names are not valid in XML.
+    Elements whose names are not valid in XML are replaced by their children.
+    """
+    root = doc.createElement(content.name if XML_NAME.fullmatch(content.name) else "div")
+    set_attributes(root, content)
+    # An explicit stack (of each element's remaining children), since articles can be nested deeper than the recursion limit
+    stack: list[tuple[Element, Iterator[PageElement]]] = [(root, iter(content.children))]
+    while stack:
+        parent, children = stack[-1]
+        if (child := next(children, None)) is None:
+            stack.pop()
+        elif isinstance(child, Tag):
+            if XML_NAME.fullmatch(child.name):
+                element = doc.createElement(child.name)
+                set_attributes(element, child)
+                parent.appendChild(element)
+                stack.append((element, iter(child.children)))
+            else:
+                stack.append((parent, iter(child.children)))
+        elif isinstance(child, NavigableString) and not isinstance(child, SKIPPED_STRINGS):
+            parent.appendChild(doc.createTextNode(INVALID_XML_CHARS.sub("", str(child))))
+    return root
+
+def set_attributes(element: Element, tag: Tag) -> None:
+    """Copy a Beautiful Soup element's attributes to a minidom element."""
+    for key, val in tag.attrs.items():
+        if not XML_NAME.fullmatch(key):
+            continue
+        # Multi-valued attributes (e.g. class) are parsed as lists
+        text = " ".join(val) if isinstance(val, list) else str(val)
+        element.setAttribute(key, INVALID_XML_CHARS.sub("", text))
+
+def create_content_node(content: Tag, doc: Document, content_type: str = "xhtml") -> Element:
+    """Create an Atom <content> element from a Beautiful Soup element.
+
+    content_type: "xhtml" converts the element's nodes directly (see convert_html).
+    The element is wrapped in an XHTML <div>, as Atom requires, unless it is a <div> itself.
+    "html" puts the serialized HTML in the element as text, which never fails, but readers must parse it again.
+    """
+    container = doc.createElement("content")
+    container.setAttribute("type", content_type)
+    if content_type == "html":
+        container.appendChild(doc.createTextNode(INVALID_XML_CHARS.sub("", content.decode())))
+        return container
+    if content_type != "xhtml":
+        raise RuntimeError(f"Unsupported content type: {content_type}")
+    converted = convert_html(content, doc)
+    if converted.tagName != "div":
+        wrapper = doc.createElement("div")
+        wrapper.appendChild(converted)
+        converted = wrapper
+    converted.setAttribute("xmlns", XHTML_NAMESPACE)
+    container.appendChild(converted)
+    return container
+
+def create_content_xml(content: Tag, content_type: str = "xhtml") -> str:
+    """Create an Atom <content> element (see create_content_node) as XML text.
+    Unlike a Beautiful Soup or minidom tree, the text is cheap to pickle, so it can be returned from a worker process.
+    The element is added to a feed with import_content.
+    """
+    doc = getDOMImplementation().createDocument(None, None, None)
+    return create_content_node(content, doc, content_type).toxml()
+
+def import_content(xml: str, doc: Document) -> Element:
+    """Parse an element created by create_content_xml into doc."""
+    return doc.importNode(parseString(xml).documentElement, True)
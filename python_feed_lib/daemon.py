@@ -0,0 +1,191 @@
+#! /usr/bin/python3
+
+"""
+Serve the feed scripts over local HTTP, so that a feed reader fetches e.g. http://localhost:8585/fox6
+instead of starting a new interpreter (and new connections) for each feed on each refresh.
+Each route keeps its script loaded and its session (connection pool, cache, rate limits) open between requests.
+
+Usage:
+python -m python_feed_lib.daemon [--host HOST] [--port PORT] [--verbose] CONFIG
+
+CONFIG is an INI file with a section for each route, e.g.
+
+    [daemon]
+    port = 8585
+
+    [fox6]
+    script = fox-6-milwaukee/fox_6_milwaukee.py
+    args = --cache-dir ~/.cache/rss
+
+    [npr]
+    script = npr-morning-edition
+    args = https://feeds.npr.org/3/rss.xml
+
+Scripts are paths (relative to CONFIG) to a file or a package directory, and args are the script's command line arguments.
+A script can be served if it has parse_args(args) (args includes the program name) and generate(conf, sess, out),
+and it may have create_session(conf) (otherwise a default session is used).
+The metrics of all routes are served at /metrics, in the Prometheus text format.
+"""
+
+from configparser import ConfigParser
+from contextlib import ExitStack
+from dataclasses import dataclass
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path
+from types import ModuleType
+from typing import TYPE_CHECKING, Any
+from urllib.parse import urlsplit
+import argparse
+import io
+import logging
+import shlex
+import sys
+
+from .loader import load_script
+from .logging import setup_logging
+from .metrics import METRICS
+
+if TYPE_CHECKING:
+    from requests import Session
+
+## Globals
+
+Logger = logging.getLogger(__name__)
+
+# The config section with the daemon's own settings
+DAEMON_SECTION: str = "daemon"
+DEFAULT_HOST: str = "127.0.0.1"
+DEFAULT_PORT: int = 8585
+# The job name that metrics are exported with
+JOB: str = "FeedDaemon"
+ROUTE_SECONDS: str = "route_duration_seconds"
+
+
+## Routes
+
+@dataclass
+class Route:
+    """A script served by the daemon."""
+    name: str
+    module: ModuleType
+    conf: Any
+    sess: "Session"
+
+    def generate(self) -> bytes:
+        """Generate the feed."""
+        out = io.StringIO()
+        with METRICS.timer(ROUTE_SECONDS, route=self.name):
+            self.module.generate(self.conf, self.sess, out)
+        return out.getvalue().encode("utf-8")
+
+def load_route(name: str, script: str, args: list[str], stack: ExitStack) -> Route:
+    """Load a route's script, parse its arguments, and open its session (which is closed with stack)."""
+    module = load_script(script)
+    if not callable(getattr(module, "parse_args", None)) or not callable(getattr(module, "generate", None)):
+        raise RuntimeError(f"{script} cannot be served: it must define parse_args and generate")
+    try:
+        conf = module.parse_args([name, *args])
+    except SystemExit as err: # argparse exits on invalid arguments
+        raise RuntimeError(f"Invalid arguments for route {name}: {shlex.join(args)}") from err
+    if callable(create_session := getattr(module, "create_session", None)):
+        sess = stack.enter_context(create_session(conf))
+    else:
+        from .feeds import with_session # Imported here rather than at the top, so that --help does not import requests
+        sess = stack.enter_context(with_session())
+    return Route(name, module, conf, sess)
+
+def load_routes(config_file: str, stack: ExitStack) -> tuple[ConfigParser, dict[str, Route]]:
+    """Read the config file, and load its routes."""
+    config = ConfigParser(interpolation=None)
+    if not config.read(config_file, encoding="utf-8"):
+        raise RuntimeError(f"Unable to read config file {config_file}")
+    base_dir = path.dirname(path.abspath(config_file))
+    routes: dict[str, Route] = {}
+    for name in config.sections():
+        if name == DAEMON_SECTION:
+            continue
+        if name == "metrics":
+            raise RuntimeError("The route name \"metrics\" is reserved")
+        if (script := config[name].get("script")) is None:
+            raise RuntimeError(f"Route {name} has no script")
+        routes[name] = load_route(
+            name,
+            path.join(base_dir, path.expanduser(script)),
+            shlex.split(config[name].get("args", "")),
+            stack,
+        )
+    return config, routes
+
+
+## Server
+
+class FeedServer(ThreadingHTTPServer):
+    """An HTTP server for a set of routes."""
+    daemon_threads = True
+    routes: dict[str, Route]
+
+    def __init__(self, address: tuple[str, int], routes: dict[str, Route]):
+        self.routes = routes
+        super().__init__(address, FeedHandler)
+
+class FeedHandler(BaseHTTPRequestHandler):
+    """Serve a route's feed (or the metrics)."""
+    server: FeedServer
+
+    def do_GET(self) -> None:
+        name = urlsplit(self.path).path.strip("/")
+        if name == "metrics":
+            self.send_body(METRICS.to_prometheus(JOB).encode("utf-8"), "text/plain; version=0.0.4; charset=utf-8")
+            return
+        if (route := self.server.routes.get(name)) is None:
+            self.send_error(404, f"No such feed: {name}")
+            return
+        try:
+            body = route.generate()
+        except (Exception, SystemExit) as err: # Scripts may exit on errors
+            Logger.error("Unable to generate %s: %s", name, err)
+            self.send_error(502, f"Unable to generate the feed: {err}")
+            return
+        self.send_body(body, "application/atom+xml; charset=utf-8")
+
+    def send_body(self, body: bytes, content_type: str) -> None:
+        """Send a 200 response."""
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args: Any) -> None:
+        Logger.info(format, *args)
+
+
+## Main function
+
+def main(args: list[str]) -> None:
+    """Run the daemon until interrupted."""
+    parser = argparse.ArgumentParser(prog=args[0], description="Serve feed scripts over local HTTP.")
+    parser.add_argument("config", type=str, help="Config file listing the routes")
+    parser.add_argument("-H", "--host", type=str, default=None, help="Address to listen on", dest="host")
+    parser.add_argument("-p", "--port", type=int, default=None, help="Port to listen on", dest="port")
+    parser.add_argument("-v", "--verbose", action="store_true", help="Log each request", dest="verbose")
+    parsed = parser.parse_args(args[1:])
+    setup_logging(__name__).setLevel(logging.INFO if parsed.verbose else logging.WARNING)
+    with ExitStack() as stack:
+        try:
+            config, routes = load_routes(parsed.config, stack)
+        except RuntimeError as err:
+            Logger.fatal("%s", err)
+            sys.exit(1)
+        settings = config[DAEMON_SECTION] if config.has_section(DAEMON_SECTION) else {}
+        host = parsed.host if parsed.host is not None else settings.get("host", DEFAULT_HOST)
+        port = parsed.port if parsed.port is not None else int(settings.get("port", DEFAULT_PORT))
+        with FeedServer((host, port), routes) as server:
+            Logger.info("Serving %s on http://%s:%d/", ", ".join(routes), host, server.server_address[1])
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+
+if __name__ == "__main__":
+    main(sys.argv)
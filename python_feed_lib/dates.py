@@ -0,0 +1,66 @@
+#! /usr/bin/python3
+
+"""
+Parse feed dates into sortable timestamps.
+RSS uses RFC 822 dates (e.g. "Sat, 01 Feb 2025 12:00:00 +0000"), and Atom uses RFC 3339 (ISO 8601) dates.
+"""
+
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from time import time
+from typing import Callable
+import heapq
+
+# The timestamp of entries without a valid date, which sorts them as the oldest
+UNKNOWN_TIMESTAMP: float = float("-inf")
+
+def parse_date(text: str) -> datetime|None:
+    """Parse an RFC 3339 or RFC 822 date.
+    Dates without a timezone are assumed to be UTC. Returns None if the date cannot be parsed.
+    """
+    text = text.strip()
+    try:
+        parsed = datetime.fromisoformat(text)
+    except ValueError:
+        try:
+            parsed = parsedate_to_datetime(text)
+        except (TypeError, ValueError):
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def parse_timestamp(text: str) -> float:
+    """Parse a date into a POSIX timestamp, for use as a sort key."""
+    return UNKNOWN_TIMESTAMP if (parsed := parse_date(text)) is None else parsed.timestamp()
+
+def sorted_run[T](items: list[T], key: Callable[[T], float]) -> list[T]:
+    """Get the items in ascending order of key.
+    Feeds are usually already in order (most often newest first), so this avoids a sort when possible.
+    """
+    keys = [key(item) for item in items]
+    if all(a <= b for a, b in zip(keys, keys[1:])):
+        return items
+    if all(a >= b for a, b in zip(keys, keys[1:])):
+        return items[::-1]
+    return [item for _, item in sorted(zip(keys, items), key=lambda pair: pair[0])]
+
+def select_newest[T](
+        items: list[T],
+        key: Callable[[T], float],
+        max_age: float|None = None,
+        max_entries: int|None = None,
+) -> list[T]:
+    """Get the items at most max_age days old, and of those the max_entries newest, in their original order.
+    Items with an unknown timestamp are kept by max_age (since their age is unknown), but are the first left out by max_entries.
+    The newest items are found with a heap (heapq.nlargest), in O(n log k) time for k entries, rather than by sorting.
+    """
+    keyed = [(key(item), item) for item in items]
+    if max_age is not None:
+        cutoff = time() - max_age * 86400
+        keyed = [pair for pair in keyed if pair[0] == UNKNOWN_TIMESTAMP or pair[0] >= cutoff]
+    if max_entries is not None and len(keyed) > max_entries:
+        # Ties are broken in favour of earlier items, as with sorted
+        newest = {id(item) for _, item in heapq.nlargest(max(max_entries, 0), keyed, key=lambda pair: pair[0])}
+        keyed = [pair for pair in keyed if id(pair[1]) in newest]
+    return [item for _, item in keyed]
@@ -0,0 +1,140 @@
+#! /usr/bin/python3
+
+"""
+Parse only the wanted parts of a page.
+Article getters usually need one or two elements (e.g. the article body and its metadata),
+so building a tree of the whole page wastes most of the parsing time and memory.
+An Extractor only creates elements inside the subtrees matched by its selectors.
+"""
+
+from dataclasses import dataclass
+from typing import Callable
+import codecs
+import re
+
+from bs4 import BeautifulSoup, Tag
+from bs4.dammit import EncodingDetector
+from bs4.filter import ElementFilter
+import soupsieve
+
+# A compound selector: an optional tag name, then classes, ids and attributes, e.g. 'script[type="application/ld+json"]'
+SELECTOR_PATTERN = re.compile(r"(?P<name>[A-Za-z][\w-]*|\*)?(?P<rest>(?:\.[\w-]+|#[\w-]+|\[[\w-]+(?:=(?:\"[^\"]*\"|'[^']*'|[\w-]+))?\])*)")
+PART_PATTERN = re.compile(r"\.(?P<class>[\w-]+)|#(?P<id>[\w-]+)|\[(?P<attr>[\w-]+)(?:=(?:\"(?P<dq>[^\"]*)\"|'(?P<sq>[^']*)'|(?P<bare>[\w-]+)))?\]")
+
+type TagTest = Callable[[str, dict[str, str]], bool]
+
+def compile_test(selector: str) -> TagTest:
+    """Compile a compound selector into a test of a tag's name and (unparsed) attributes."""
+    if (match := SELECTOR_PATTERN.fullmatch(selector.strip())) is None or not selector.strip():
+        raise RuntimeError(f"Unsupported selector (only compound selectors such as div.class[attr=value] are supported): {selector}")
+    name = match["name"] if match["name"] != "*" else None
+    classes: list[str] = []
+    attrs: list[tuple[str, str|None]] = []
+    for part in PART_PATTERN.finditer(match["rest"]):
+        if part["class"] is not None:
+            classes.append(part["class"])
+        elif part["id"] is not None:
+            attrs.append(("id", part["id"]))
+        else:
+            value = part["dq"] if part["dq"] is not None else part["sq"] if part["sq"] is not None else part["bare"]
+            attrs.append((part["attr"], value))
+    def test(tag_name: str, tag_attrs: dict[str, str]) -> bool:
+        if name is not None and tag_name != name:
+            return False
+        if classes and not set(classes).issubset(tag_attrs.get("class", "").split()):
+            return False
+        return all(
+            key in tag_attrs if value is None else tag_attrs.get(key) == value
+            for key, value in attrs
+        )
+    return test
+
+
+class TargetFilter(ElementFilter):
+    """Only create the tags matched by one of the tests, and their descendants.
+    Beautiful Soup only consults the filter outside of created tags, so matched subtrees are parsed in full.
+    """
+    tests: list[TagTest]
+
+    def __init__(self, tests: list[TagTest]):
+        super().__init__()
+        self.tests = tests
+
+    @property
+    def includes_everything(self) -> bool:
+        return False
+
+    def allow_tag_creation(self, nsprefix: str|None, name: str, attrs: dict|None) -> bool:
+        attrs = attrs if attrs is not None else {}
+        return any(test(name, attrs) for test in self.tests)
+
+    def allow_string_creation(self, string: str) -> bool:
+        # Text outside of the targets is not wanted
+        return False
+
+
+@dataclass
+class Extraction:
+    """The parts of a page matched by an Extractor.
+    Elements are looked up when asked for, so a lookup stops at the first match.
+    """
+    soup: BeautifulSoup
+    compiled: dict[str, soupsieve.SoupSieve]
+
+    def first(self, selector: str) -> Tag|None:
+        """Get the first element matching one of the extractor's selectors."""
+        return self.compiled[selector].select_one(self.soup)
+
+    def all(self, selector: str) -> list[Tag]:
+        """Get the elements matching one of the extractor's selectors, in document order."""
+        return self.compiled[selector].select(self.soup)
+
+    def decompose(self) -> None:
+        """Free the parsed elements (except any that have been extracted)."""
+        self.soup.decompose()
+
+
+class Extractor:
+    """Extract the elements matching a set of compound CSS selectors from pages.
+    The selectors are compiled once, so an Extractor should be created once per site and reused.
+    Elements nested in a match are also found, e.g. a script inside the article body.
+    """
+    filter: TargetFilter
+    compiled: dict[str, soupsieve.SoupSieve]
+
+    def __init__(self, *selectors: str):
+        self.filter = TargetFilter([compile_test(selector) for selector in selectors])
+        self.compiled = {selector: soupsieve.compile(selector) for selector in selectors}
+
+    def extract(self, markup: str|bytes, features: str = "lxml", encoding: str|None = None) -> Extraction:
+        """Parse the parts of the page that match the selectors.
+        Pages should be given as bytes (e.g. res.content), with the charset the server declared as the encoding (see get_encoding).
+        """
+        if isinstance(markup, str):
+            return Extraction(BeautifulSoup(markup, features, parse_only=self.filter), self.compiled)
+        return Extraction(
+            BeautifulSoup(markup, features, parse_only=self.filter, from_encoding=get_encoding(markup, encoding)),
+            self.compiled,
+        )
+
+def get_encoding(markup: bytes, charset: str|None = None) -> str:
+    """Get the encoding to parse a page with: the charset declared by the server (if given),
+    else the one given by the page's byte order mark or <meta> tag, else UTF-8.
+    Beautiful Soup would otherwise guess the encoding of a page that does not declare one
+    by running charset detection over the whole page, which takes longer than parsing it.
+    """
+    if charset and is_known_encoding(charset):
+        return charset
+    markup, sniffed = EncodingDetector.strip_byte_order_mark(markup)
+    if sniffed:
+        return sniffed
+    declared = EncodingDetector.find_declared_encoding(markup, is_html=True)
+    return declared if declared and is_known_encoding(declared) else "utf-8"
+
+def is_known_encoding(label: str) -> bool:
+    """Check whether Python can decode an encoding label (servers and pages sometimes declare made-up or misspelt ones)."""
+    try:
+        codecs.lookup(label)
+    except LookupError:
+        return False
+    return True
@@ -1,31 +1,92 @@
 #! /usr/bin/python3
 
-from concurrent.futures import ThreadPoolExecutor
-from contextlib import contextmanager
+from concurrent.futures import FIRST_COMPLETED, Executor, Future, ThreadPoolExecutor, as_completed, wait
+from contextlib import ExitStack, contextmanager
+from dataclasses import dataclass
 from datetime import datetime
-from os import getenv
-from typing import Callable
-from xml.dom.minidom import Document, Element, parseString
+from functools import partial
+from time import perf_counter
+from typing import TYPE_CHECKING, Any, Callable, Iterable
+from xml.dom.minidom import Document, Element, Node, parseString
+from xml.parsers.expat import ExpatError
+import heapq
 import logging
+import re
 
-from bs4 import Tag, Comment
-from requests import Session
+from bs4 import Tag
+from requests import Response, Session
+
+from .adapters import FeedAdapter, create_retry
+from .agent import DEFAULT_USER_AGENT, get_user_agent
+from .cache import ResponseCache
+from .dates import UNKNOWN_TIMESTAMP, parse_timestamp, select_newest, sorted_run
+from .extract import is_known_encoding
+from .metrics import METRICS, STAGE_SECONDS, time_stage
+from .ratelimit import HostRateLimiter
+from .sanitize import DEFAULT_SANITIZER
+from .seen import SeenIndex
+from .store import ResultStore
+
+if TYPE_CHECKING:
+    from concurrent.futures import ProcessPoolExecutor
 
 ## Globals
 
 Logger = logging.getLogger(__name__)
 
+# The user data key that entries' parsed <updated> timestamps are cached under
+TIMESTAMP_KEY: str = "python_feed_lib.timestamp"
+
 ## Networking
 
-DEFAULT_USER_AGENT: str = "Mozilla/5.0 (X11; Linux x86_64; rv:109.0) Gecko/20100101 Firefox/115.0"
+# Connections kept open per host. This should be at least the number of workers downloading from one host.
+DEFAULT_POOL_SIZE: int = 10
+DEFAULT_RETRIES: int = 3
+DEFAULT_BACKOFF: float = 0.5
+
+# The charset parameter of a Content-Type header
+CHARSET_PARAMETER = re.compile(r";\s*charset\s*=\s*[\"']?([^\"';\s]+)", re.IGNORECASE)
+# An XML declaration that names the document's encoding
+XML_ENCODING_DECLARATION = re.compile(rb"^(?:\xef\xbb\xbf)?\s*<\?xml[^>]*\sencoding\s*=")
 
 @contextmanager
-def with_session(referer: str|None = None, user_agent: str|None = None, proxy: str|None = None):
+def with_session(
+        referer: str|None = None,
+        user_agent: str|None = None,
+        proxy: str|None = None,
+        *,
+        cache_dir: str|None = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        rate_limit: float|None = None,
+        burst: float = 1.0,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        max_in_flight: int|None = None,
+):
     """Create a session.
     Creates a requests.Session with specified settings.
+
+    cache_dir: If given, responses are cached in this directory and revalidated with conditional GET requests.
+    pool_size: The number of connections to keep open to each host.
+    This should be at least the max_workers (or max_per_host) used to enrich articles, or workers will wait for connections.
+    rate_limit: If given, the most requests per second to make to each host (with bursts of up to burst requests).
+    retries: The number of times to retry connection errors and 429 and 503 responses.
+    Retries wait with jittered exponential backoff (starting at backoff seconds), or as long as Retry-After says.
+    max_in_flight: If given, the most requests to send at once (to any host).
     """
     try:
         with Session() as sess:
+            adapter = create_adapter(
+                cache_dir=cache_dir,
+                pool_size=pool_size,
+                rate_limit=rate_limit,
+                burst=burst,
+                retries=retries,
+                backoff=backoff,
+                max_in_flight=max_in_flight,
+            )
+            sess.mount("http://", adapter)
+            sess.mount("https://", adapter)
             # Set the default headers to send
             sess.headers.update({
                 "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
@@ -51,6 +112,68 @@ def with_session(referer: str|None = None, user_agent: str|None = None, proxy: s
     finally:
         pass
 
+def create_adapter(
+        *,
+        cache_dir: str|None = None,
+        pool_size: int = DEFAULT_POOL_SIZE,
+        rate_limit: float|None = None,
+        burst: float = 1.0,
+        retries: int = DEFAULT_RETRIES,
+        backoff: float = DEFAULT_BACKOFF,
+        max_in_flight: int|None = None,
+) -> FeedAdapter:
+    """Create the adapter that with_session mounts (see with_session for the arguments).
+    An adapter can also be mounted on several sessions, so that they share its connections, cache, rate limits and max_in_flight.
+    """
+    rate_limiter = HostRateLimiter(rate_limit, burst) if rate_limit is not None else None
+    return FeedAdapter(
+        cache=ResponseCache(cache_dir) if cache_dir is not None else None,
+        rate_limiter=rate_limiter,
+        max_in_flight=max_in_flight,
+        pool_maxsize=pool_size,
+        max_retries=create_retry(retries, backoff, rate_limiter),
+    )
+
+@dataclass(frozen=True)
+class Page:
+    """A downloaded page, as bytes.
+    Parsers are given the bytes (and the charset the server declared) rather than res.text,
+    since requests guesses the encoding of pages without a charset by running charset detection over the whole page,
+    and the parsers would encode the text again anyway.
+    Pages can be pickled, e.g. to parse them in enrich_articles' processes.
+    """
+    url: str
+    content: bytes
+    charset: str|None = None
+
+def get_charset(res: Response) -> str|None:
+    """Get the charset declared by the response's Content-Type header, if any.
+    Unlike res.encoding, this is None (rather than ISO-8859-1) for text types without a charset.
+    Charsets that Python does not know are ignored, as if none had been declared.
+    """
+    match = CHARSET_PARAMETER.search(res.headers.get("Content-Type", ""))
+    if match is None:
+        return None
+    if not is_known_encoding(match[1]):
+        Logger.debug("Ignoring unknown charset %r for %s", match[1], res.url)
+        return None
+    return match[1]
+
+def get_page(res: Response) -> Page:
+    """Get a response's body and declared charset, without decoding it."""
+    return Page(res.url, res.content, get_charset(res))
+
+def parse_xml(res: Response) -> Document:
+    """Parse an XML response (e.g. a feed) from its bytes, so that expat decodes it as the document declares.
+    The charset of the Content-Type header is only used if the document does not declare an encoding,
+    since expat would otherwise assume UTF-8.
+    """
+    content = res.content
+    charset = get_charset(res)
+    if charset is not None and charset.lower() not in ("utf-8", "utf8") and not XML_ENCODING_DECLARATION.match(content):
+        return parseString(content.decode(charset, errors="replace"))
+    return parseString(content)
+
 def enrich_articles[T](
         feed: Document|Element,
         getter: Callable[[Element, Session], tuple[Element, T]|Element],
@@ -59,7 +182,13 @@ def enrich_articles[T](
         doc: Document|None = None,
         *,
         max_workers: int = 3,
+        window: int|None = None,
+        store: ResultStore|None = None,
+        on_entry: Callable[[Element], None]|None = None,
         logger: logging.Logger = Logger,
+        parser: Callable[[Any], T|None]|None = None,
+        processes: int|None = None,
+        seen: SeenIndex|None = None,
 ):
     """Get the article body and (if possible) media URL for each element.
     
@@ -67,8 +196,166 @@ def enrich_articles[T](
     failed, and the article will be removed from the feed.
     Otherwise, setter is called to update the element in-place.
 
+    parser: If given, getter only downloads the article (returning the entry and e.g. the page's text),
+    and parser is called with what getter returned to extract the result for setter.
+    If parser returns None (or raises an exception), the article is removed from the feed.
+    processes: If given (and not 0), parser is called in a pool of this many processes (see create_process_pool),
+    so that parsing is not limited by the GIL, and getter's threads only wait for the network.
+    parser must then be a module-level function, and its argument and result must be picklable
+    (e.g. strings, rather than Beautiful Soup or minidom nodes).
+    Otherwise, parser is called in getter's thread.
+
+    window: If given, at most this many articles are submitted at once, and setter is applied as each one completes.
+    Each result can then be freed as soon as it has been applied, so memory does not grow with the number of entries.
+    Otherwise, all articles are downloaded before any setter is applied.
+    store: If given, the nodes appended by setter are saved under the entry's id.
+    Entries with a saved result have those nodes restored instead of calling getter.
+    seen: If given, entries that an earlier run produced (and that could not be restored from store) are removed from the feed,
+    since the feed reader already has them enriched, and the entries produced by this run are recorded in it.
+    on_entry: If given, called with each entry once it is done (or has been removed from the feed), e.g. FeedWriter.write_entry.
     logger: The logger to use. This allows for a different logger to be used than this module's default.
     """
+    doc = get_document(feed, doc)
+    entries: list[Element] = feed.getElementsByTagName("entry")
+    produced: list[str] = []
+    if seen is not None:
+        on_entry = record_entries(produced, on_entry)
+    if store is not None:
+        entries = restore_entries(entries, store, doc, on_entry)
+    if seen is not None:
+        entries = skip_seen_entries(entries, seen, on_entry)
+    futures: list[Future] = []
+    with ExitStack() as pools:
+        # The process pool is entered first, so that it is shut down after the threads that submit to it
+        process_pool = pools.enter_context(create_process_pool(processes)) \
+            if parser is not None and processes and entries else None
+        pool = pools.enter_context(ThreadPoolExecutor(max_workers = max_workers))
+        submit = partial(submit_enrichment, getter=getter, sess=sess, pool=pool, parser=parser, process_pool=process_pool, logger=logger)
+        if window is not None:
+            # The Python documentation does not mention minidom being thread-safe,
+            # so setters are still only called from this thread
+            pending: set[Future] = set()
+            for entry in entries:
+                if len(pending) >= window:
+                    done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        apply_enrichment(future.result(), setter, doc, store, logger, on_entry)
+                pending.add(submit(entry))
+            # as_completed drops its references to each future once it has been yielded,
+            # so the results are only freed if this function does not hold on to them
+            completed = as_completed(pending)
+            del pending
+            for future in completed:
+                apply_enrichment(future.result(), setter, doc, store, logger, on_entry)
+        else:
+            futures = [submit(entry) for entry in entries]
+    for future in futures:
+        # The Python documentation does not mention minidom being thread-safe,
+        # so update this in serial
+        apply_enrichment(future.result(), setter, doc, store, logger, on_entry)
+    if seen is not None:
+        seen.add(produced)
+
+def create_process_pool(processes: int) -> "ProcessPoolExecutor":
+    """Create a pool of processes to call enrich_articles' parser in.
+    Where possible the workers are forked, so that they already have the parsers of scripts that were loaded by path
+    (e.g. by the daemon), which they could not import by name.
+    The workers are started before enrich_articles starts its threads, since a process forked while other threads
+    are running can inherit locks that are never released.
+    """
+    # Imported here, since multiprocessing is only needed when parsing in processes
+    from concurrent.futures import ProcessPoolExecutor
+    import multiprocessing
+    context = multiprocessing.get_context("fork") if "fork" in multiprocessing.get_all_start_methods() else None
+    pool = ProcessPoolExecutor(max_workers=processes, mp_context=context)
+    # Forked workers are all started by the first task
+    pool.submit(int).result()
+    return pool
+
+def submit_enrichment[T](
+        entry: Element,
+        *,
+        getter: Callable[[Element, Session], tuple[Element, Any]|Element],
+        sess: Session,
+        pool: Executor,
+        parser: Callable[[Any], T|None]|None = None,
+        process_pool: Executor|None = None,
+        logger: logging.Logger = Logger,
+) -> "Future[tuple[Element, T]|Element]":
+    """Start enriching an entry: getter is called in pool, then parser (if given) in process_pool (or in getter's thread).
+    Returns a future of the result to apply with apply_enrichment.
+    """
+    if parser is None:
+        return pool.submit(getter, entry, sess)
+    if process_pool is None:
+        return pool.submit(fetch_and_parse, entry, getter, sess, parser, logger)
+    result: Future = Future()
+    def fetched(future: Future) -> None:
+        """Pass the downloaded article to the process pool."""
+        try:
+            downloaded = future.result()
+        except BaseException as err:
+            result.set_exception(err)
+            return
+        if isinstance(downloaded, Element):
+            result.set_result(downloaded)
+            return
+        fetched_entry, page = downloaded
+        try:
+            process_pool.submit(parse_timed, parser, page).add_done_callback(partial(parsed, fetched_entry))
+        except BaseException as err: # The pool is broken (e.g. a worker was killed)
+            result.set_result(finish_parse(fetched_entry, None, err, logger))
+    def parsed(fetched_entry: Element, future: Future) -> None:
+        """Record the parser's result."""
+        try:
+            value, seconds = future.result()
+        except BaseException as err:
+            result.set_result(finish_parse(fetched_entry, None, err, logger))
+            return
+        # The metrics recorded in the workers stay in the workers, so the parse time is recorded here
+        METRICS.observe(STAGE_SECONDS, seconds, stage="parse")
+        result.set_result(finish_parse(fetched_entry, value))
+    pool.submit(getter, entry, sess).add_done_callback(fetched)
+    return result
+
+def fetch_and_parse[T](
+        entry: Element,
+        getter: Callable[[Element, Session], tuple[Element, Any]|Element],
+        sess: Session,
+        parser: Callable[[Any], T|None],
+        logger: logging.Logger = Logger,
+) -> tuple[Element, T]|Element:
+    """Call getter, and then parser with its result (if it succeeded)."""
+    if isinstance(downloaded := getter(entry, sess), Element):
+        return downloaded
+    entry, page = downloaded
+    try:
+        with time_stage("parse"):
+            value = parser(page)
+    except Exception as err:
+        return finish_parse(entry, None, err, logger)
+    return finish_parse(entry, value)
+
+def parse_timed[P, T](parser: Callable[[P], T], page: P) -> tuple[T, float]:
+    """Call parser in a worker process, returning its result and how long it took."""
+    start = perf_counter()
+    value = parser(page)
+    return value, perf_counter() - start
+
+def finish_parse[T](
+        entry: Element,
+        value: T|None,
+        error: BaseException|None = None,
+        logger: logging.Logger = Logger,
+) -> tuple[Element, T]|Element:
+    """Get the result of enriching an entry from the parser's result (or error), as getters return it."""
+    if error is not None:
+        logger.error("Unable to parse article: %s", error)
+        return entry
+    return entry if value is None else (entry, value)
+
+def get_document(feed: Document|Element, doc: Document|None = None) -> Document:
+    """Get the document that the feed belongs to."""
     if doc is None:
         if isinstance(feed, Element) and isinstance(feed.ownerDocument, Document):
             doc = feed.ownerDocument
@@ -77,26 +364,107 @@ def enrich_articles[T](
         else:
             raise RuntimeError("Unable to infer feed document! An actual XML document must somehow be previded to this function!")
     assert isinstance(doc, Document)
-    with ThreadPoolExecutor(max_workers = max_workers) as pool:
-        futures = [pool.submit(getter, entry, sess) for entry in feed.getElementsByTagName("entry")]
-    for future in futures:
-        result = future.result()
-        if isinstance(result, Element): # The article was not able to be downloaded
-            logger.info("Removing entry from feed")
-            result.parentNode.removeChild(result)
-            continue
+    return doc
+
+def apply_enrichment[T](
+        result: tuple[Element, T]|Element,
+        setter: Callable[[Element, T, Document], None],
+        doc: Document,
+        store: ResultStore|None = None,
+        logger: logging.Logger = Logger,
+        on_entry: Callable[[Element], None]|None = None,
+) -> None:
+    """Apply the result of a getter to its entry, then call on_entry with it (if given).
+    If the getter failed (returned only the element), the entry is removed from the feed.
+    The time taken by setter is recorded as the "setter" stage.
+    """
+    if isinstance(result, Element): # The article was not able to be downloaded
+        logger.info("Removing entry from feed")
+        result.parentNode.removeChild(result)
+        entry = result
+    else:
         entry, res = result
-        # The Python documentation does not mention minidom being thread-safe,
-        # so update this in serial
-        setter(entry, res, doc)
+        existing = len(entry.childNodes)
+        with time_stage("setter"):
+            setter(entry, res, doc)
+        if store is not None:
+            save_enrichment(entry, entry.childNodes[existing:], store)
+    if on_entry is not None:
+        on_entry(entry)
+
+def restore_entries(
+        entries: list[Element],
+        store: ResultStore,
+        doc: Document,
+        on_entry: Callable[[Element], None]|None = None,
+) -> list[Element]:
+    """Restore the saved enrichment of each entry (see restore_enrichment), calling on_entry with the restored entries.
+    Returns the entries that still need to be enriched.
+    """
+    remaining: list[Element] = []
+    for entry in entries:
+        if not restore_enrichment(entry, store, doc):
+            remaining.append(entry)
+        elif on_entry is not None:
+            on_entry(entry)
+    return remaining
 
-def get_user_agent() -> str:
-    """Get the default user agent."""
-    if (user_agent:= getenv("RSS_USER_AGENT")) is not None:
-        return user_agent
-    if (user_agent := getenv("USER_AGENT")) is not None:
-        return user_agent
-    return DEFAULT_USER_AGENT
+def skip_seen_entries(
+        entries: list[Element],
+        seen: SeenIndex,
+        on_entry: Callable[[Element], None]|None = None,
+) -> list[Element]:
+    """Remove the entries that the index has seen from the feed, calling on_entry with them.
+    The feed reader already has them enriched, and writing them out unenriched could replace its copy.
+    They are recorded as seen again, so that they are not forgotten while they are still in the feed.
+    Returns the entries that still need to be enriched.
+    """
+    known = seen.known(entry_id for entry in entries if (entry_id := get_entry_id(entry)) is not None)
+    if not known:
+        return entries
+    remaining: list[Element] = []
+    for entry in entries:
+        if get_entry_id(entry) not in known:
+            remaining.append(entry)
+            continue
+        entry.parentNode.removeChild(entry)
+        if on_entry is not None:
+            on_entry(entry)
+    seen.add(known)
+    return remaining
+
+def record_entries(
+        produced: list[str],
+        on_entry: Callable[[Element], None]|None = None,
+) -> Callable[[Element], None]:
+    """Wrap on_entry to append the id of each entry still in the feed to produced (before on_entry frees the entry)."""
+    def record(entry: Element) -> None:
+        if entry.parentNode is not None and (entry_id := get_entry_id(entry)) is not None:
+            produced.append(entry_id)
+        if on_entry is not None:
+            on_entry(entry)
+    return record
+
+def save_enrichment(entry: Element, nodes: list[Node], store: ResultStore) -> None:
+    """Save the nodes added to an entry by enrichment."""
+    if (key := get_entry_id(entry)) is None:
+        return
+    store.put(key, "".join(node.toxml() for node in nodes))
+
+def restore_enrichment(entry: Element, store: ResultStore, doc: Document) -> bool:
+    """Restore the nodes saved by save_enrichment.
+    Returns False if there is no (valid) saved result for the entry.
+    """
+    if (key := get_entry_id(entry)) is None or (saved := store.get(key)) is None:
+        return False
+    try:
+        fragment: Document = parseString(f"<enrichment>{saved}</enrichment>")
+    except ExpatError:
+        store.delete(key)
+        return False
+    for node in fragment.documentElement.childNodes:
+        entry.appendChild(doc.importNode(node, True))
+    return True
 
 
 ## Conversion
@@ -136,7 +504,9 @@ def convert_feed(feed: Document) -> Document:
     return doc
 
 def convert_element(original: Element, doc: Document) -> Element:
-    """Convert an RSS item from RSS to an Atom entry."""
+    """Convert an RSS item from RSS to an Atom entry.
+    Its categories and author are kept (as <category term="..."> and <author><name>), so that they can be filtered and rewritten.
+    """
     new = doc.createElement("entry")
     if (title := get_single_element("title", original)) is not None:
         new.appendChild(title)
@@ -147,7 +517,9 @@ def convert_element(original: Element, doc: Document) -> Element:
     else:
         raise RuntimeError("The element is missing its guid")
     if (pubdate := get_single_element("pubDate", original)) is not None:
-        new.appendChild(create_text_node("updated", get_string(pubdate), doc))
+        new.appendChild(create_text_node("updated", date := get_string(pubdate), doc))
+        # Cache the sort key, so that it is not parsed again by sort_elements or merge_entries
+        new.setUserData(TIMESTAMP_KEY, parse_timestamp(date), None)
     else:
         raise RuntimeError("While pubDate is optional in RSS, updated is mandatory in Atom")
     if (link := get_single_element("link", original)) is not None:
@@ -157,34 +529,108 @@ def convert_element(original: Element, doc: Document) -> Element:
     if (desc := get_single_element("description", original)) is not None:
         desc.tagName = "summary"
         new.appendChild(desc)
+    for category in original.getElementsByTagName("category"):
+        if term := get_string(category).strip():
+            _c = doc.createElement("category")
+            _c.setAttribute("term", term)
+            new.appendChild(_c)
+    for tag in ("author", "dc:creator"):
+        if (author := get_single_element(tag, original)) is not None and (name := get_string(author).strip()):
+            person = doc.createElement("author")
+            person.appendChild(create_text_node("name", name, doc))
+            new.appendChild(person)
+            break
     return new
 
 def sort_elements(feed: Document) -> None:
-    """Sort the <entry> elements by date/time.
+    """Sort the <entry> elements by date/time, oldest first.
     Modification is done in-place.
     """
-    def get_date(e: Element) -> str:
-        updated: list[Element] = e.getElementsByTagName("updated")
-        if len(updated) != 1:
-            raise RuntimeError("Invalid number of updated tags")
-        return " ".join(node.nodeValue for node in updated[0].childNodes if node.nodeType == node.TEXT_NODE)
-    elements: list[Element] = feed.documentElement.getElementsByTagName("entry")
-    for element in elements:
-        feed.documentElement.removeChild(element)
-    for element in sorted(elements, key=get_date):
-        feed.documentElement.appendChild(element)
+    root = feed.documentElement
+    entries = get_entries(feed)
+    ordered = sorted_run(entries, get_timestamp)
+    if ordered is entries: # Already sorted
+        return
+    # Entries are moved after the other children, as removing and appending each of them used to do (in quadratic time)
+    set_children(root, [node for node in root.childNodes if not is_entry(node)] + ordered)
+
+def merge_entries(feed: Document, runs: Iterable[list[Element]]) -> None:
+    """Merge entries from other feeds into the feed, ordered by date/time (oldest first).
+    Each run of entries (e.g. the entries of one feed) is sorted unless it is already in order,
+    and the runs are combined with a heap-based merge, in O(n log k) time for k runs.
+    Entries are removed from their original documents, which can then be freed (e.g. with unlink) without freeing the entries.
+    """
+    root = feed.documentElement
+    merged = list(heapq.merge(
+        *(sorted_run(run, get_timestamp) for run in (get_entries(feed), *runs)),
+        key=get_timestamp,
+    ))
+    parents = {id(parent): parent for entry in merged if (parent := entry.parentNode) is not None and parent is not root}
+    set_children(root, [node for node in root.childNodes if not is_entry(node)] + merged)
+    # Otherwise the original documents would keep the entries (and each other's nodes) alive until they are discarded
+    for parent in parents.values():
+        set_children(parent, [node for node in parent.childNodes if node.parentNode is parent])
+
+def dedup_entries(feed: Document) -> int:
+    """Remove entries whose id (see get_entry_id) appeared earlier in the feed.
+    Returns the number of entries removed.
+    """
+    root = feed.documentElement
+    seen: set[str] = set()
+    kept: list[Node] = []
+    removed: list[Node] = []
+    for node in root.childNodes:
+        if is_entry(node) and (key := get_entry_id(node)) is not None:
+            if key in seen:
+                removed.append(node)
+                continue
+            seen.add(key)
+        kept.append(node)
+    if removed:
+        set_children(root, kept)
+        for node in removed:
+            node.parentNode = node.previousSibling = node.nextSibling = None
+    return len(removed)
+
+def truncate_entries(feed: Document, max_age: float|None = None, max_entries: int|None = None) -> int:
+    """Remove the entries more than max_age days old, and all but the max_entries newest (see select_newest).
+    This is meant to be done before enrich_articles, so that old entries are never downloaded.
+    Entries without a (valid) <updated> date are kept by max_age, and are the first removed by max_entries.
+    Returns the number of entries removed.
+    """
+    entries = get_entries(feed)
+    kept = {id(entry) for entry in select_newest(entries, get_known_timestamp, max_age, max_entries)}
+    if len(kept) == len(entries):
+        return 0
+    root = feed.documentElement
+    set_children(root, [node for node in root.childNodes if not is_entry(node) or id(node) in kept])
+    for entry in entries:
+        if id(entry) not in kept: # Free the removed entries
+            entry.unlink()
+    return len(entries) - len(kept)
+
+def set_children(parent: Element, children: list[Node]) -> None:
+    """Replace the children of a node in linear time.
+    Moving each node with removeChild/appendChild is quadratic, since minidom removes nodes from a list.
+    Nodes taken from another parent are not removed from it.
+    """
+    parent.childNodes[:] = children
+    previous: Node|None = None
+    for node in children:
+        node.parentNode = parent
+        node.previousSibling = previous
+        if previous is not None:
+            previous.nextSibling = node
+        previous = node
+    if previous is not None:
+        previous.nextSibling = None
 
 def cleanup_html(content: Tag) -> None:
     """Cleanup HTML content in-place.
-    This entails removing scripts, comments, etc.
+    This entails removing scripts, comments, etc. (see DEFAULT_SANITIZER).
+    Sites with additional rules should use their own Sanitizer instead.
     """
-    for script in content.find_all("script"):
-        if script is not None:
-            script.decompose()
-    for comment in content.find_all(lambda x: isinstance(x, Comment)):
-        assert isinstance(comment, Comment)
-        if comment.parent is not None:
-            comment.parent.decompose()
+    DEFAULT_SANITIZER.sanitize(content)
 
 ## Getters
 
@@ -205,6 +651,42 @@ def get_entry_link(e: Element) -> str:
         raise RuntimeError("The link does not contain an href attribute")
     return link
 
+def is_entry(node: Node) -> bool:
+    """Test if a node is an Atom <entry> element."""
+    return node.nodeType == Node.ELEMENT_NODE and node.tagName == "entry"
+
+def get_entries(feed: Document|Element) -> list[Element]:
+    """Get the <entry> elements of an Atom feed."""
+    root = feed.documentElement if isinstance(feed, Document) else feed
+    return [node for node in root.childNodes if is_entry(node)]
+
+def get_timestamp(entry: Element) -> float:
+    """Get the timestamp of an entry's <updated> date, for use as a sort key.
+    The timestamp is cached on the entry.
+    """
+    if (timestamp := entry.getUserData(TIMESTAMP_KEY)) is not None:
+        return timestamp
+    if (updated := get_single_element("updated", entry)) is None:
+        raise RuntimeError("The entry has no updated tag")
+    timestamp = parse_timestamp(get_string(updated))
+    entry.setUserData(TIMESTAMP_KEY, timestamp, None)
+    return timestamp
+
+def get_known_timestamp(entry: Element) -> float:
+    """Get the timestamp of an entry's <updated> date, or UNKNOWN_TIMESTAMP if it has none."""
+    try:
+        return get_timestamp(entry)
+    except RuntimeError:
+        return UNKNOWN_TIMESTAMP
+
+def get_entry_id(e: Element) -> str|None:
+    """Get a key identifying an entry: its <id>, or the link if it has none."""
+    if (id_node := get_single_element("id", e)) is not None and (_id := get_string(id_node).strip()):
+        return _id
+    if (link_node := get_single_element("link", e)) is not None and (link := link_node.getAttribute("href")):
+        return link
+    return None
+
 ## Element Creation
 
 def create_text_node(tag: str, val: str, doc: Document, attr: dict[str, str]|None = None) -> Element:
@@ -0,0 +1,42 @@
+#! /usr/bin/python3
+
+"""
+Load the feed scripts as modules.
+Scripts live in directories whose names are not valid module names (e.g. "fox-6-milwaukee"),
+so they are loaded by path: either a single file, or a package directory with a __main__ module.
+"""
+
+from importlib import import_module, util
+from os import path
+from types import ModuleType
+import re
+import sys
+
+def module_name(file_name: str) -> str:
+    """Get the module name to load a script file under, e.g. "fox_6_milwaukee" for "fox-6-milwaukee.py"."""
+    return re.sub(r"\W", "_", path.splitext(path.basename(file_name))[0])
+
+def load_script(script: str, name: str|None = None) -> ModuleType:
+    """Load a script from a file, or from a package directory's __main__ module.
+    Scripts are only loaded once, so loading a script again returns the same module.
+    """
+    script = path.abspath(path.expanduser(script))
+    if path.isdir(script):
+        # Packages use relative imports, so they are imported from their parent directory
+        if (parent := path.dirname(script)) not in sys.path:
+            sys.path.insert(0, parent)
+        return import_module(f"{path.basename(script)}.__main__")
+    name = name if name is not None else module_name(script)
+    if name in sys.modules:
+        return sys.modules[name]
+    spec = util.spec_from_file_location(name, script)
+    if spec is None or spec.loader is None:
+        raise RuntimeError(f"Unable to load {script}")
+    module = util.module_from_spec(spec)
+    sys.modules[name] = module
+    try:
+        spec.loader.exec_module(module)
+    except BaseException:
+        del sys.modules[name]
+        raise
+    return module
@@ -9,9 +9,18 @@ import sys
 #     # Windows et al. do not support syslog
 #     import syslog
 
-def setup_logging(name: str) -> logging.Logger:
-    """Set up logging for a script."""
+from .metrics import get_metrics_dir, report_metrics
+
+def setup_logging(name: str, metrics_dir: str|None = None) -> logging.Logger:
+    """Set up logging for a script.
+    At exit, a summary of the run's metrics is logged, and written to metrics_dir (or RSS_METRICS_DIR) if set.
+    The summary is logged by the "<name>.metrics" logger, which logs info messages whatever the script logger's level is.
+    """
     logger = logging.getLogger(name)
+    # Records propagate to the script logger's handlers without checking its level
+    metrics_logger = logging.getLogger(f"{name}.metrics")
+    if metrics_logger.level == logging.NOTSET:
+        metrics_logger.setLevel(logging.INFO)
 
     queue: SimpleQueue = SimpleQueue()
     async_handler = handlers.QueueHandler(queue)
@@ -27,5 +36,8 @@ def setup_logging(name: str) -> logging.Logger:
     async_handlers = [logging.StreamHandler(stream=sys.stderr)]
     listener = handlers.QueueListener(queue, *async_handlers)
     listener.start()
+    # Exit handlers run in reverse order, so the listener is stopped (and flushed) last
+    atexit(listener.stop)
     atexit(logger.info, "Finished preparing feed")
+    atexit(report_metrics, metrics_logger, name, metrics_dir if metrics_dir is not None else get_metrics_dir())
     return logger
@@ -0,0 +1,207 @@
+#! /usr/bin/python3
+
+"""
+Counters and histograms describing a feed run, so that slow origins and slow stages can be found.
+Requests made through with_session record their latency, bytes and status per host,
+enrich_articles records the time spent in setters, fetch_page counts the downloads it stops early, and scripts time their own stages with time_stage().
+Everything is recorded to a process-wide registry (METRICS), which setup_logging summarizes at exit.
+If RSS_METRICS_DIR is set, the metrics are also written there in the Prometheus text format
+(as <job>.prom, e.g. for node_exporter's textfile collector).
+"""
+
+from bisect import bisect_left
+from contextlib import contextmanager
+from os import getenv, path
+from threading import Lock
+from time import perf_counter
+import json
+import logging
+import os
+import tempfile
+
+## Globals
+
+# Histogram bucket upper bounds, in seconds
+DEFAULT_BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# The prefix of exported metric names
+PREFIX: str = "rss_feed_"
+
+# Metric names
+ABORTED_DOWNLOADS: str = "aborted_downloads_total"
+REQUEST_SECONDS: str = "request_duration_seconds"
+REQUESTS: str = "requests_total"
+RESPONSE_BYTES: str = "response_bytes_total"
+STAGE_SECONDS: str = "stage_duration_seconds"
+
+type Labels = tuple[tuple[str, str], ...]
+
+def get_metrics_dir() -> str|None:
+    """Get the directory to write Prometheus textfiles to from the RSS_METRICS_DIR environment variable.
+    Returns None (no textfile) if it is not set.
+    """
+    return getenv("RSS_METRICS_DIR") or None
+
+
+## Metrics
+
+class Histogram:
+    """A histogram of observed values, with cumulative buckets as in Prometheus."""
+    buckets: tuple[float, ...]
+    counts: list[int]
+    count: int
+    total: float
+    maximum: float
+
+    def __init__(self, buckets: tuple[float, ...] = DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.count = 0
+        self.total = 0.0
+        self.maximum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Add a value to the histogram."""
+        if (index := bisect_left(self.buckets, value)) < len(self.buckets):
+            self.counts[index] += 1
+        self.count += 1
+        self.total += value
+        self.maximum = max(self.maximum, value)
+
+    def cumulative(self) -> list[int]:
+        """Get the number of values less than or equal to each bucket's bound."""
+        counts: list[int] = []
+        running = 0
+        for count in self.counts:
+            running += count
+            counts.append(running)
+        return counts
+
+
+class Metrics:
+    """A thread-safe registry of counters and histograms, identified by name and labels."""
+    counters: dict[tuple[str, Labels], float]
+    histograms: dict[tuple[str, Labels], Histogram]
+
+    def __init__(self):
+        self.counters = {}
+        self.histograms = {}
+        self.lock = Lock()
+
+    def count(self, name: str, value: float = 1.0, **labels: str) -> None:
+        """Add to a counter."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Add a value to a histogram."""
+        key = (name, tuple(sorted(labels.items())))
+        with self.lock:
+            if (histogram := self.histograms.get(key)) is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    @contextmanager
+    def timer(self, name: str, **labels: str):
+        """Observe the time taken by the body of a with statement, in seconds."""
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, perf_counter() - start, **labels)
+
+    def clear(self) -> None:
+        """Remove all metrics."""
+        with self.lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def summary(self) -> dict[str, list[dict[str, str|float]]]:
+        """Get the metrics as JSON-serializable data, keyed by metric name.
+        Histograms are summarized by their count, sum and maximum.
+        """
+        summary: dict[str, list[dict[str, str|float]]] = {}
+        with self.lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                summary.setdefault(name, []).append({**dict(labels), "value": value})
+            for (name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                summary.setdefault(name, []).append({
+                    **dict(labels),
+                    "count": histogram.count,
+                    "sum": round(histogram.total, 6),
+                    "max": round(histogram.maximum, 6),
+                })
+        return summary
+
+    def to_prometheus(self, job: str) -> str:
+        """Format the metrics in the Prometheus text exposition format, labelled with the job."""
+        lines: list[str] = []
+        with self.lock:
+            names = sorted({name for name, _ in self.counters})
+            for name in names:
+                lines.append(f"# TYPE {PREFIX}{name} counter")
+                for (_name, labels), value in sorted(self.counters.items()):
+                    if _name == name:
+                        lines.append(f"{PREFIX}{name}{{{format_labels(job, labels)}}} {value}")
+            names = sorted({name for name, _ in self.histograms})
+            for name in names:
+                lines.append(f"# TYPE {PREFIX}{name} histogram")
+                for (_name, labels), histogram in sorted(self.histograms.items(), key=lambda item: item[0]):
+                    if _name != name:
+                        continue
+                    for bound, count in zip(histogram.buckets, histogram.cumulative()):
+                        lines.append(f"{PREFIX}{name}_bucket{{{format_labels(job, labels, le=str(bound))}}} {count}")
+                    lines.append(f"{PREFIX}{name}_bucket{{{format_labels(job, labels, le='+Inf')}}} {histogram.count}")
+                    lines.append(f"{PREFIX}{name}_sum{{{format_labels(job, labels)}}} {histogram.total}")
+                    lines.append(f"{PREFIX}{name}_count{{{format_labels(job, labels)}}} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+def format_labels(job: str, labels: Labels, **extra: str) -> str:
+    """Format the labels of a Prometheus sample."""
+    def escape(value: str) -> str:
+        return value.replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+    return ",".join(f"{key}=\"{escape(value)}\"" for key, value in (("job", job), *labels, *extra.items()))
+
+# The registry used by the library
+METRICS = Metrics()
+
+def time_stage(stage: str):
+    """Time a stage of a run (e.g. "parse" or "serialize"), for use in a with statement."""
+    return METRICS.timer(STAGE_SECONDS, stage=stage)
+
+
+## Reporting
+
+def log_metrics(logger: logging.Logger, metrics: Metrics = METRICS) -> None:
+    """Log a summary of the metrics as a single JSON message."""
+    if (summary := metrics.summary()):
+        logger.info("Metrics: %s", json.dumps(summary, sort_keys=True))
+
+def write_metrics(directory: str, job: str, metrics: Metrics = METRICS) -> None:
+    """Write the metrics to <directory>/<job>.prom.
+    The file is replaced atomically, so that a collector never reads a partial file.
+    """
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_name = tempfile.mkstemp(dir=directory, prefix=".tmp-", suffix=".prom")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as textfile:
+            textfile.write(metrics.to_prometheus(job))
+        os.replace(temp_name, path.join(directory, f"{job}.prom"))
+    except BaseException:
+        os.unlink(temp_name)
+        raise
+
+def report_metrics(logger: logging.Logger|None, job: str, directory: str|None = None) -> None:
+    """Log the metrics (if a logger is given), and write them to directory (if given).
+    Errors writing the textfile are logged rather than raised, since this is called at exit.
+    """
+    if logger is not None:
+        log_metrics(logger)
+    if directory is None:
+        return
+    try:
+        write_metrics(directory, job)
+    except OSError as err:
+        if logger is not None:
+            logger.error("Unable to write metrics to %s: %s", directory, err)
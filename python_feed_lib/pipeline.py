@@ -0,0 +1,317 @@
+#! /usr/bin/python3
+
+"""
+Post-process a feed in the same process that downloaded it, rather than by piping it through other programs
+(e.g. filter-articles-by-category or simulate-browser --regex), which each start an interpreter and parse the feed again.
+A Pipeline runs its stages in order on one parsed Atom feed, and scripts can let their users choose the stages
+with add_pipeline_args and create_pipeline.
+
+Stages run before articles are enriched, so removed entries are never downloaded.
+This module is imported while arguments are parsed, so it only imports the feed functions when a stage runs.
+"""
+
+from typing import Callable, Iterable
+from xml.dom.minidom import Document, Element, Node
+import abc
+import argparse
+import logging
+import re
+
+from .metrics import time_stage
+
+## Globals
+
+Logger = logging.getLogger(__name__)
+
+# Elements naming a person: Atom's <author> and <contributor>, and (in RSS) <author>, <managingEditor>, <webMaster> and <dc:creator>
+AUTHOR_TAGS: frozenset[str] = frozenset(("author", "contributor", "managingEditor", "webMaster", "dc:creator"))
+
+# The name of the group that each rewrite rule is matched by, in the combined pattern
+RULE_GROUP: str = "_rule"
+# Backreferences and conditional groups, which refer to the rule's groups by number (or name), and so cannot be combined.
+# Escaped backslashes may match too, which only costs a pass of their own.
+BACKREFERENCE = re.compile(r"\\[1-9]|\(\?P=|\(\?\(")
+
+
+## Matching
+
+def compile_matcher(categories: Iterable[str]) -> re.Pattern[str]:
+    """Compile categories into one case-insensitive pattern, which finds any of them in an entry's category.
+    The categories are merged into a trie, so that the pattern checks each character once, however many categories there are.
+    """
+    trie: dict[str, dict] = {}
+    for category in categories:
+        node = trie
+        for char in category.lower():
+            node = node.setdefault(char, {})
+        node[""] = {} # A category ends here
+    if not trie: # Nothing matches
+        return re.compile(r"(?!)")
+    return re.compile(trie_pattern(trie), re.IGNORECASE)
+
+def trie_pattern(node: dict[str, dict]) -> str:
+    """Get the pattern for a node of the category trie."""
+    if "" in node:
+        # Categories are found anywhere in an entry's category, so the longer categories below this one add nothing
+        return ""
+    alternatives = [re.escape(char) + trie_pattern(child) for char, child in sorted(node.items())]
+    return alternatives[0] if len(alternatives) == 1 else f"(?:{'|'.join(alternatives)})"
+
+class Rewriter:
+    """Find and replace several patterns in one pass over each string.
+    The patterns are combined into one, so each string is searched once however many rules there are.
+    Where rules overlap, the first rule that matches at a position is used (not each rule in turn, as with sed).
+    Rules that cannot be combined (those with backreferences, or that reuse an earlier rule's group names)
+    are applied by themselves, after the rules before them.
+    Replacements use Python's syntax (e.g. \\1 or \\g<name> for groups).
+    """
+    rules: list[tuple[re.Pattern[str], str]]
+    # The patterns searched in turn (runs of rules combined into one, or rules by themselves), with their replacements
+    passes: list[tuple[re.Pattern[str], str|Callable[[re.Match[str]], str]]]
+
+    def __init__(self, rules: Iterable[tuple[str, str]]):
+        try:
+            self.rules = [(re.compile(pattern), replacement) for pattern, replacement in rules]
+        except re.error as err:
+            raise RuntimeError(f"Invalid pattern: {err}") from err
+        self.passes = []
+        run: list[int] = []
+        for index, (pattern, _) in enumerate(self.rules):
+            if BACKREFERENCE.search(pattern.pattern) is not None:
+                self.add_pass(run)
+                self.add_pass([index])
+                run = []
+            elif run and self.combine(run + [index]) is None:
+                self.add_pass(run)
+                run = [index]
+            else:
+                run.append(index)
+        self.add_pass(run)
+
+    def combine(self, run: list[int]) -> re.Pattern[str]|None:
+        """Combine rules into one pattern, in which each rule is wrapped in a named group that tells which rule matched.
+        Returns None if the rules cannot be combined (e.g. they define the same group name, or use global flags).
+        """
+        try:
+            return re.compile("|".join(f"(?P<{RULE_GROUP}{index}>{self.rules[index][0].pattern})" for index in run))
+        except re.error:
+            return None
+
+    def add_pass(self, run: list[int]) -> None:
+        """Add a pass applying a run of rules (which combine cleanly)."""
+        if len(run) == 1:
+            self.passes.append(self.rules[run[0]])
+        elif run:
+            combined = self.combine(run)
+            assert combined is not None
+            self.passes.append((combined, self.replace))
+
+    def replace(self, match: re.Match[str]) -> str:
+        """Replace a match of a combined pattern, as the rule that matched would."""
+        pattern, replacement = self.rules[int(match.lastgroup.removeprefix(RULE_GROUP))]
+        if "\\" not in replacement:
+            return replacement
+        # The rule's own groups are numbered differently in the combined pattern, so the rule is matched again by itself
+        own = pattern.match(match.string, match.start())
+        return own.expand(replacement) if own is not None else match.group()
+
+    def rewrite(self, text: str) -> str:
+        """Apply the rules to text."""
+        for pattern, replacement in self.passes:
+            text = pattern.sub(replacement, text)
+        return text
+
+
+## Stages
+
+class Stage(abc.ABC):
+    """A step of a Pipeline."""
+    # Used as the stage label of the metrics
+    name: str = "stage"
+
+    @abc.abstractmethod
+    def apply(self, feed: Document) -> int:
+        """Change the feed in-place. Returns the number of entries (or nodes) changed or removed."""
+
+def remove_entries(feed: Document, removed: Iterable[Element]) -> int:
+    """Remove entries from the feed (and free them). Returns the number removed."""
+    count = 0
+    for entry in removed:
+        feed.documentElement.removeChild(entry).unlink()
+        count += 1
+    return count
+
+class CategoryFilter(Stage):
+    """Remove the entries with a category containing one of the categories (ignoring case).
+    Entries without categories are kept.
+    """
+    name = "category_filter"
+    matcher: re.Pattern[str]
+
+    def __init__(self, categories: Iterable[str]):
+        self.matcher = compile_matcher(categories)
+
+    def matches(self, entry: Element) -> bool:
+        """Test if any of the entry's categories contains one of the categories."""
+        for category in entry.getElementsByTagName("category"):
+            # Atom categories are in the term attribute, and RSS categories are in the text
+            text = category.getAttribute("term") or "".join(
+                node.data for node in category.childNodes if node.nodeType == Node.TEXT_NODE
+            )
+            if self.matcher.search(text) is not None:
+                return True
+        return False
+
+    def apply(self, feed: Document) -> int:
+        from .feeds import get_entries
+        return remove_entries(feed, [entry for entry in get_entries(feed) if self.matches(entry)])
+
+class Truncate(Stage):
+    """Remove the entries more than max_age days old, and all but the max_entries newest (see truncate_entries).
+    Entries whose date is missing or cannot be parsed are kept by max_age, and are the first removed by max_entries.
+    """
+    name = "truncate"
+    max_age: float|None
+    max_entries: int|None
+
+    def __init__(self, max_age: float|None = None, max_entries: int|None = None):
+        self.max_age = max_age
+        self.max_entries = max_entries
+
+    def apply(self, feed: Document) -> int:
+        from .feeds import truncate_entries
+        return truncate_entries(feed, self.max_age, self.max_entries)
+
+class Dedup(Stage):
+    """Remove the entries whose id (or link) appeared earlier in the feed."""
+    name = "dedup"
+
+    def apply(self, feed: Document) -> int:
+        from .feeds import dedup_entries
+        return dedup_entries(feed)
+
+class RegexRewrite(Stage):
+    """Find and replace in the feed's text and attribute values (see Rewriter).
+    Unlike simulate-browser --regex, the rules apply to the parsed feed, so they cannot change the markup itself.
+    """
+    name = "rewrite"
+    rewriter: Rewriter
+
+    def __init__(self, rules: Iterable[tuple[str, str]]):
+        self.rewriter = Rewriter(rules)
+
+    def apply(self, feed: Document) -> int:
+        changed = 0
+        # An explicit stack, since content can be nested deeper than the recursion limit
+        stack: list[Node] = [feed.documentElement]
+        while stack:
+            node = stack.pop()
+            if node.nodeType in (Node.TEXT_NODE, Node.CDATA_SECTION_NODE):
+                if (text := self.rewriter.rewrite(node.data)) != node.data:
+                    node.data = text
+                    changed += 1
+            elif node.nodeType == Node.ELEMENT_NODE:
+                for attr in node.attributes.values():
+                    if (text := self.rewriter.rewrite(attr.value)) != attr.value:
+                        attr.value = text
+                        changed += 1
+                stack.extend(node.childNodes)
+        return changed
+
+class AuthorRewrite(Stage):
+    """Find and replace in the names of the feed's authors (see Rewriter).
+    A person whose name is rewritten to nothing (e.g. a webmaster's address) is removed.
+    """
+    name = "author_rewrite"
+    rewriter: Rewriter
+
+    def __init__(self, rules: Iterable[tuple[str, str]]):
+        self.rewriter = Rewriter(rules)
+
+    def apply(self, feed: Document) -> int:
+        changed = 0
+        people = [node for tag in AUTHOR_TAGS for node in feed.getElementsByTagName(tag)]
+        for person in people:
+            # Atom people have a <name>, and RSS people are the text of the element
+            names = person.getElementsByTagName("name")
+            holder = names[0] if names else person
+            text = "".join(node.data for node in holder.childNodes if node.nodeType == Node.TEXT_NODE)
+            if (rewritten := self.rewriter.rewrite(text)) == text:
+                continue
+            changed += 1
+            name = rewritten.strip()
+            if not name:
+                if person.parentNode is not None:
+                    person.parentNode.removeChild(person).unlink()
+                continue
+            for node in list(holder.childNodes):
+                if node.nodeType == Node.TEXT_NODE:
+                    holder.removeChild(node)
+            holder.appendChild(feed.createTextNode(name))
+        return changed
+
+
+## Pipeline
+
+class Pipeline:
+    """Stages that are applied to a feed in order.
+    Cheap removals (e.g. Dedup, CategoryFilter and Truncate) should come first, so that later stages see fewer entries.
+    """
+    stages: list[Stage]
+
+    def __init__(self, stages: Iterable[Stage] = ()):
+        self.stages = list(stages)
+
+    def run(self, feed: Document) -> Document:
+        """Apply the stages to the feed, in-place. Returns the feed."""
+        for stage in self.stages:
+            with time_stage(stage.name):
+                changed = stage.apply(feed)
+            Logger.debug("Stage %s changed %d nodes", stage.name, changed)
+        return feed
+
+
+## Arguments
+
+def add_pipeline_args(parser: argparse.ArgumentParser) -> None:
+    """Add the arguments selecting post-processing stages to a script's parser (see create_pipeline)."""
+    group = parser.add_argument_group("post-processing")
+    group.add_argument("--dedup", action="store_true", help="Remove entries that appear more than once", dest="dedup")
+    group.add_argument("--max-age", type=float, default=None, metavar="DAYS", help="Remove entries older than this many days", dest="max_age")
+    group.add_argument("--max-entries", type=int, default=None, metavar="N", help="Keep only the N newest entries", dest="max_entries")
+    group.add_argument(
+        "--drop-category", type=str, action="append", default=[], metavar="CATEGORY",
+        help="Remove entries with a category containing this (ignoring case). Can be repeated", dest="drop_categories",
+    )
+    group.add_argument(
+        "--rewrite", type=str, nargs=2, action="append", default=[], metavar=("PATTERN", "REPLACEMENT"),
+        help="Replace a regular expression in the feed's text. Can be repeated", dest="rewrites",
+    )
+    group.add_argument(
+        "--rewrite-author", type=str, nargs=2, action="append", default=[], metavar=("PATTERN", "REPLACEMENT"),
+        help="Replace a regular expression in author names (removing authors rewritten to nothing). Can be repeated",
+        dest="author_rewrites",
+    )
+
+def create_pipeline(parser: argparse.ArgumentParser, parsed: argparse.Namespace) -> Pipeline:
+    """Create the pipeline selected by the arguments that add_pipeline_args added.
+    Invalid patterns are reported as argument errors.
+    """
+    stages: list[Stage] = []
+    if parsed.max_entries is not None and parsed.max_entries < 0:
+        parser.error("--max-entries cannot be negative")
+    if parsed.dedup:
+        stages.append(Dedup())
+    if parsed.drop_categories:
+        stages.append(CategoryFilter(parsed.drop_categories))
+    # After the other removals, so that --max-entries keeps that many of the entries that would be kept anyway
+    if parsed.max_age is not None or parsed.max_entries is not None:
+        stages.append(Truncate(parsed.max_age, parsed.max_entries))
+    try:
+        if parsed.rewrites:
+            stages.append(RegexRewrite(parsed.rewrites))
+        if parsed.author_rewrites:
+            stages.append(AuthorRewrite(parsed.author_rewrites))
+    except RuntimeError as err:
+        parser.error(str(err))
+    return Pipeline(stages)
@@ -0,0 +1,58 @@
+#! /usr/bin/python3
+
+"""
+Limit the rate of requests to each host with token buckets.
+"""
+
+from threading import Lock
+from time import monotonic, sleep
+from urllib.parse import urlsplit
+
+
+class TokenBucket:
+    """A thread-safe token bucket.
+    Tokens are added at rate per second, up to burst; each acquisition takes one token, waiting if none are left.
+    """
+    rate: float
+    burst: float
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        if rate <= 0:
+            raise ValueError("The rate must be positive")
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+        self._tokens = self.burst
+        self._updated = monotonic()
+        self._lock = Lock()
+
+    def acquire(self) -> None:
+        """Take a token, waiting until one is available."""
+        while True:
+            with self._lock:
+                now = monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            sleep(wait)
+
+class HostRateLimiter:
+    """A token bucket for each host."""
+    rate: float
+    burst: float
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self._buckets: dict[str, TokenBucket] = {}
+        self._lock = Lock()
+
+    def acquire(self, url: str) -> None:
+        """Wait until a request may be made to the URL's host."""
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if (bucket := self._buckets.get(host)) is None:
+                bucket = self._buckets[host] = TokenBucket(self.rate, self.burst)
+        bucket.acquire()
@@ -0,0 +1,76 @@
+#! /usr/bin/python3
+
+"""
+Remove unwanted parts of an article (scripts, ads, signup links, ...) according to a site's rules.
+All of the rules are checked in a single traversal of the tree, so adding rules does not add passes over the article.
+"""
+
+from typing import Iterable
+
+from bs4 import Comment, PageElement, Tag
+import soupsieve
+
+class Sanitizer:
+    """A set of removal rules for HTML content.
+
+    tags: Elements with these names are removed.
+    comments: If True, the parent of each comment is removed (comments usually mark ads and embeds).
+    Comments directly inside the content are removed by themselves.
+    hrefs: The parent of each link whose href is one of these is removed (e.g. "Sign up" paragraphs).
+    href_prefixes: The parent of each link whose href starts with one of these is removed.
+    selectors: Elements matching any of these CSS selectors are removed.
+    """
+    tags: frozenset[str]
+    comments: bool
+    hrefs: frozenset[str]
+    href_prefixes: tuple[str, ...]
+    selector: soupsieve.SoupSieve|None
+
+    def __init__(
+            self,
+            tags: Iterable[str] = ("script",),
+            comments: bool = True,
+            hrefs: Iterable[str] = (),
+            href_prefixes: Iterable[str] = (),
+            selectors: Iterable[str] = (),
+    ):
+        self.tags = frozenset(tags)
+        self.comments = comments
+        self.hrefs = frozenset(hrefs)
+        self.href_prefixes = tuple(href_prefixes)
+        # A selector list matches an element if any of its selectors do, so the selectors are compiled together
+        selectors = tuple(selectors)
+        self.selector = soupsieve.compile(", ".join(selectors)) if selectors else None
+
+    def sanitize(self, content: Tag) -> None:
+        """Remove the nodes matched by the rules from content, in-place."""
+        for node in self.find_removals(content):
+            if not isinstance(node, Tag):
+                node.extract()
+            elif not node.decomposed: # Nodes inside an earlier removal have already been decomposed
+                node.decompose()
+
+    def find_removals(self, content: Tag) -> list[PageElement]:
+        """Get the nodes to remove from content, in document order."""
+        removals: list[PageElement] = []
+        stack = list(reversed(content.contents))
+        while stack:
+            node = stack.pop()
+            if isinstance(node, Comment):
+                if self.comments and node.parent is not None:
+                    removals.append(node if node.parent is content else node.parent)
+                continue
+            if not isinstance(node, Tag):
+                continue
+            if node.name in self.tags or (self.selector is not None and self.selector.match(node)):
+                # The element's children are removed with it, so they are not checked
+                removals.append(node)
+                continue
+            if (self.hrefs or self.href_prefixes) and node.name == "a" and node.parent is not None \
+               and isinstance(href := node.get("href"), str) and (href in self.hrefs or href.startswith(self.href_prefixes)):
+                removals.append(node.parent)
+            stack.extend(reversed(node.contents))
+        return removals
+
+# The rules used by cleanup_html
+DEFAULT_SANITIZER = Sanitizer()
@@ -0,0 +1,117 @@
+#! /usr/bin/python3
+
+"""
+A persistent index of the entries that earlier runs produced, backed by SQLite.
+Scripts can use it to skip enriching entries that a feed reader already has (see enrich_articles),
+or to only output new entries (see remove_seen_entries).
+Entries are identified by their id (or link), so one index covers all the feeds that a script combines.
+Entries that have not been seen for max_age are forgotten, so the index does not grow forever.
+"""
+
+from itertools import batched
+from os import path
+from threading import Lock
+from time import time
+from typing import Iterable
+from xml.dom.minidom import Document
+import logging
+import sqlite3
+
+## Globals
+
+Logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_AGE: float = 30 * 24 * 60 * 60 # 30 days
+# The most ids to look up in one query (SQLite allows 999 parameters in older versions)
+QUERY_BATCH: int = 500
+
+
+## Index
+
+class SeenIndex:
+    """Set of the entry ids that earlier runs produced, kept across runs in a SQLite database.
+    The namespace separates the entries of different scripts sharing one database.
+    Each id records when it was last seen, and ids not seen for max_age seconds are pruned.
+    """
+    file_name: str
+    max_age: float
+    namespace: str
+
+    def __init__(self, file_name: str, max_age: float = DEFAULT_MAX_AGE, namespace: str = ""):
+        self.file_name = path.expandvars(path.expanduser(file_name))
+        self.max_age = max_age
+        self.namespace = namespace
+        self._lock = Lock()
+        self._conn = sqlite3.connect(self.file_name, check_same_thread=False)
+        with self._conn:
+            # Looked up by id, so the rows are kept in the primary key's B-tree rather than beside it
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS seen (
+                namespace TEXT NOT NULL,
+                id TEXT NOT NULL,
+                last_seen REAL NOT NULL,
+                PRIMARY KEY (namespace, id)
+            ) WITHOUT ROWID""")
+
+    def __enter__(self) -> "SeenIndex":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def __contains__(self, entry_id: str) -> bool:
+        return bool(self.known((entry_id,)))
+
+    def known(self, ids: Iterable[str]) -> set[str]:
+        """Get the ids that have been seen, looking them up a batch at a time."""
+        found: set[str] = set()
+        with self._lock:
+            for batch in batched(set(ids), QUERY_BATCH):
+                found.update(row[0] for row in self._conn.execute(
+                    f"SELECT id FROM seen WHERE namespace = ? AND id IN ({', '.join('?' * len(batch))})",
+                    (self.namespace, *batch),
+                ))
+        return found
+
+    def add(self, ids: Iterable[str]) -> None:
+        """Record that the ids were seen now (in one transaction)."""
+        now = time()
+        with self._lock, self._conn:
+            self._conn.executemany(
+                "INSERT INTO seen (namespace, id, last_seen) VALUES (?, ?, ?) ON CONFLICT (namespace, id) DO UPDATE SET last_seen = excluded.last_seen",
+                ((self.namespace, entry_id, now) for entry_id in ids),
+            )
+
+    def prune(self) -> None:
+        """Forget the ids not seen for max_age (in this namespace)."""
+        with self._lock, self._conn:
+            removed = self._conn.execute(
+                "DELETE FROM seen WHERE namespace = ? AND last_seen <= ?", (self.namespace, time() - self.max_age),
+            ).rowcount
+        if removed:
+            Logger.debug("Pruned %d seen entries", removed)
+
+    def close(self) -> None:
+        """Prune old ids and close the database."""
+        try:
+            self.prune()
+        except sqlite3.Error as err:
+            Logger.info("Unable to prune seen index: %s", err)
+        self._conn.close()
+
+
+## Feeds
+
+def remove_seen_entries(feed: Document, seen: SeenIndex) -> int:
+    """Remove the entries that the index has seen (and free them). Returns the number removed.
+    The removed entries are recorded as seen again, so that they are not forgotten while they are still in the feed.
+    """
+    from .feeds import get_entries, get_entry_id
+    entries = [(entry, entry_id) for entry in get_entries(feed) if (entry_id := get_entry_id(entry)) is not None]
+    known = seen.known(entry_id for _, entry_id in entries)
+    removed = 0
+    for entry, entry_id in entries:
+        if entry_id in known:
+            feed.documentElement.removeChild(entry).unlink()
+            removed += 1
+    seen.add(known)
+    return removed
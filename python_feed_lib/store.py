@@ -0,0 +1,88 @@
+#! /usr/bin/python3
+
+"""
+A persistent store of results that expire, backed by SQLite.
+"""
+
+from os import path
+from threading import Lock
+from time import time
+import logging
+import sqlite3
+
+## Globals
+
+Logger = logging.getLogger(__name__)
+
+DEFAULT_TTL: float = 24 * 60 * 60 # One day
+
+
+## Store
+
+class ResultStore:
+    """Key/value store with a time-to-live for each value.
+    Values are kept across runs in a SQLite database.
+    The namespace separates the results of different scripts sharing one database.
+    """
+    file_name: str
+    ttl: float
+    namespace: str
+
+    def __init__(self, file_name: str, ttl: float = DEFAULT_TTL, namespace: str = ""):
+        self.file_name = path.expandvars(path.expanduser(file_name))
+        self.ttl = ttl
+        self.namespace = namespace
+        self._lock = Lock()
+        self._conn = sqlite3.connect(self.file_name, check_same_thread=False)
+        with self._conn:
+            self._conn.execute("""CREATE TABLE IF NOT EXISTS results (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                expires REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )""")
+
+    def __enter__(self) -> "ResultStore":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def get(self, key: str) -> str|None:
+        """Get a value, or None if it is missing or has expired."""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM results WHERE namespace = ? AND key = ? AND expires > ?",
+                (self.namespace, key, time()),
+            ).fetchone()
+        return None if row is None else row[0]
+
+    def put(self, key: str, value: str, ttl: float|None = None) -> None:
+        """Store a value, replacing any previous value for the key."""
+        expires = time() + (self.ttl if ttl is None else ttl)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO results (namespace, key, value, expires) VALUES (?, ?, ?, ?)",
+                (self.namespace, key, value, expires),
+            )
+
+    def delete(self, key: str) -> None:
+        """Remove a value."""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM results WHERE namespace = ? AND key = ?", (self.namespace, key))
+
+    def prune(self) -> None:
+        """Remove all expired values (in every namespace)."""
+        with self._lock, self._conn:
+            removed = self._conn.execute("DELETE FROM results WHERE expires <= ?", (time(),)).rowcount
+        if removed:
+            Logger.debug("Pruned %d expired results", removed)
+
+    def close(self) -> None:
+        """Prune expired values and close the database."""
+        try:
+            self.prune()
+        except sqlite3.Error as err:
+            Logger.info("Unable to prune result store: %s", err)
+        self._conn.close()
@@ -0,0 +1,142 @@
+#! /usr/bin/python3
+
+"""
+Download pages as a stream, stopping once the parts of the page that an Extractor wants have been read.
+Article getters usually want an element near the top of the page (e.g. the article body, its metadata or a link to its audio),
+so most of each page's bytes (comments, related articles, footers and scripts) are downloaded only to be thrown away.
+fetch_page feeds the body to lxml's pull parser as it arrives, and closes the response once every target has ended
+(unless the session caches responses, in which case the page is read to the end and cached).
+
+Bodies are decoded as they are read, so compressed pages are only inflated as far as they are read.
+Responses are compressed with whichever encodings urllib3 supports (requests sends urllib3's Accept-Encoding):
+gzip and deflate, and also br and zstd if the brotli and zstandard packages are installed.
+"""
+
+from urllib.parse import urlsplit
+import logging
+
+from lxml.etree import HTMLPullParser
+from requests import Response, Session
+
+from .adapters import FeedAdapter
+from .extract import Extractor, TagTest, get_encoding
+from .feeds import Page, get_charset
+from .metrics import ABORTED_DOWNLOADS, METRICS, RESPONSE_BYTES
+
+## Globals
+
+Logger = logging.getLogger(__name__)
+
+# The largest body to read (after decoding). Larger responses raise a RuntimeError, rather than being read into memory.
+DEFAULT_MAX_BYTES: int = 8 * 2**20
+# The size of the chunks fed to the parser
+CHUNK_SIZE: int = 16 * 2**10
+# If no more than this much of the body is left when the targets have been read, it is read anyway,
+# so that the connection can be reused rather than closed
+DRAIN_BYTES: int = 16 * 2**10
+
+
+## Target tracking
+
+class TargetTracker:
+    """Follow a page as it is parsed, until an element matching each of the tests has ended."""
+    parser: HTMLPullParser
+    remaining: list[TagTest]
+
+    def __init__(self, tests: list[TagTest], encoding: str|None = None):
+        try:
+            self.parser = HTMLPullParser(events=("end",), encoding=encoding)
+        except LookupError: # An encoding that libxml2 does not know, which only matters to the targets' text
+            self.parser = HTMLPullParser(events=("end",))
+        self.remaining = list(tests)
+
+    def feed(self, chunk: bytes) -> bool:
+        """Parse the next chunk of the page. Returns True once every target has been read."""
+        self.parser.feed(chunk)
+        for _, element in self.parser.read_events():
+            if self.remaining and isinstance(element.tag, str):
+                attrs = dict(element.attrib)
+                self.remaining = [test for test in self.remaining if not test(element.tag, attrs)]
+            # Only the events are needed, so free the elements that have been read
+            element.clear(keep_tail=False)
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+        return not self.remaining
+
+
+## Downloads
+
+def fetch_page(
+        url: str,
+        sess: Session,
+        extractor: Extractor|None = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+) -> Page:
+    """Download a page as a stream.
+    If an extractor is given, the download stops once an element matching each of its selectors has been read,
+    so the Page holds the start of the page, up to the end of the last target (which extractor.extract can parse as usual).
+    Only the first match of each selector is waited for, so Extraction.all may miss later matches.
+    If the session caches responses (see with_session), the whole page is read and cached instead,
+    since revalidating it on later runs costs less than downloading even part of it again.
+    Raises a RuntimeError if the body (or its Content-Length) is larger than max_bytes,
+    and requests' exceptions (e.g. HTTPError) if the request fails.
+    """
+    adapter = sess.get_adapter(url)
+    caching = adapter if isinstance(adapter, FeedAdapter) and adapter.cache is not None else None
+    if caching is not None:
+        extractor = None
+    with sess.get(url, stream=True) as res:
+        res.raise_for_status()
+        length = get_content_length(res)
+        if length is not None and length > max_bytes:
+            raise RuntimeError(f"{res.url} is larger than {max_bytes} bytes ({length} bytes)")
+        charset = get_charset(res)
+        chunks: list[bytes] = []
+        size = 0
+        tracker: TargetTracker|None = None
+        finished = False
+        for chunk in res.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if size > max_bytes:
+                raise RuntimeError(f"{res.url} is larger than {max_bytes} bytes")
+            chunks.append(chunk)
+            if extractor is None:
+                continue
+            if tracker is None:
+                # The first chunk usually holds the page's <meta charset>
+                tracker = TargetTracker(extractor.filter.tests, get_encoding(chunk, charset))
+            if tracker.feed(chunk):
+                finished = True
+                break
+        content = b"".join(chunks)
+        if finished:
+            stop_reading(res, length)
+        elif caching is not None and res.raw is not None: # Not already served from the cache
+            caching.store_response(res, content)
+        count_bytes(res)
+        return Page(res.url, content, charset)
+
+def get_content_length(res: Response) -> int|None:
+    """Get the length of the body sent by the server (which is compressed, if it has a Content-Encoding)."""
+    try:
+        return int(res.headers["Content-Length"])
+    except (KeyError, ValueError):
+        return None
+
+def stop_reading(res: Response, length: int|None) -> None:
+    """Stop reading a streamed response before its end.
+    The rest of the body is read (and discarded) if it is short enough, so that the connection can be reused.
+    Otherwise, the connection is closed (by the caller's with block).
+    """
+    if res.raw is None:
+        return
+    if length is not None and length - res.raw.tell() <= DRAIN_BYTES:
+        res.raw.drain_conn()
+        return
+    Logger.debug("Stopped reading %s after %d bytes", res.url, res.raw.tell())
+    METRICS.count(ABORTED_DOWNLOADS, host=urlsplit(res.url).netloc)
+
+def count_bytes(res: Response) -> None:
+    """Record the bytes read from the connection, which the adapter does not count for streamed responses."""
+    if res.raw is not None:
+        METRICS.count(RESPONSE_BYTES, res.raw.tell(), host=urlsplit(res.url).netloc)
@@ -0,0 +1,76 @@
+#! /usr/bin/python3
+
+from collections import Counter
+from xml.dom.minidom import Document, Element, parseString
+import asyncio
+import os
+import unittest
+
+from .. import aio, feeds
+from . import test_feeds
+
+def make_feed(links: list[str]) -> Document:
+    """Create a feed with an entry for each link."""
+    entries = "".join(f'<entry><id>{i}</id><link href="{link}"/></entry>' for i, link in enumerate(links))
+    return parseString(f'<feed xmlns="http://www.w3.org/2005/Atom">{entries}</feed>')
+
+def set_text(entry: Element, text: str, doc: Document) -> None:
+    entry.appendChild(feeds.create_text_node("content", text, doc))
+
+
+class TestEnrichArticlesAsync(unittest.TestCase):
+    """Test the enrich_articles_async function."""
+    def test_limits(self) -> None:
+        """Test that the global and per-host limits are respected."""
+        links = [f"https://{host}.example.org/{i}" for i in range(6) for host in ("a", "b", "c")]
+        running: Counter[str] = Counter()
+        peaks: Counter[str] = Counter()
+
+        async def getter(entry: Element, _) -> tuple[Element, str]:
+            host = aio.get_host(entry)
+            running[host] += 1
+            running["all"] += 1
+            for key in (host, "all"):
+                peaks[key] = max(peaks[key], running[key])
+            await asyncio.sleep(0.01)
+            running[host] -= 1
+            running["all"] -= 1
+            return entry, host
+
+        feed = make_feed(links)
+        asyncio.run(aio.enrich_articles_async(feed, getter, set_text, None, max_in_flight=4, max_per_host=2)) # type: ignore
+        self.assertEqual(len(feed.getElementsByTagName("content")), len(links))
+        self.assertEqual(peaks["all"], 4)
+        for host in ("a", "b", "c"):
+            self.assertLessEqual(peaks[f"{host}.example.org"], 2)
+
+    def test_sync_getter(self) -> None:
+        """Test that synchronous getters work, and that failed entries are removed."""
+        def getter(entry: Element, _) -> tuple[Element, str]|Element:
+            link = feeds.get_entry_link(entry)
+            return entry if link.endswith("/1") else (entry, link)
+
+        feed = make_feed(["https://example.org/0", "https://example.org/1"])
+        asyncio.run(aio.enrich_articles_async(feed, getter, set_text, None)) # type: ignore
+        self.assertEqual(len(feed.getElementsByTagName("entry")), 1)
+        self.assertEqual(
+            feeds.get_string(feed.getElementsByTagName("content")[0]),
+            "https://example.org/0",
+        )
+
+    def test_parser(self) -> None:
+        """Test that pages are parsed in other processes, and that failed parses are removed."""
+        async def getter(entry: Element, _) -> tuple[Element, str]:
+            return entry, feeds.get_entry_link(entry)
+
+        feed = make_feed([f"https://example.org/{i}" for i in range(8)])
+        with self.assertLogs(aio.Logger, "ERROR"):
+            asyncio.run(aio.enrich_articles_async(feed, getter, set_text, None, parser=test_feeds.parse_page, processes=2)) # type: ignore
+        contents = [feeds.get_string(node) for node in feed.getElementsByTagName("content")]
+        self.assertEqual(len(contents), 6)
+        self.assertNotIn(str(os.getpid()), {content.rpartition(" ")[2] for content in contents})
+
+    def test_map_limited(self) -> None:
+        """Test that map_limited keeps the order of the items."""
+        results = asyncio.run(aio.map_limited(lambda x: x * 2, range(10), lambda _: "", max_per_host=3))
+        self.assertEqual(results, [x * 2 for x in range(10)])
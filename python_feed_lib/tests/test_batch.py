@@ -0,0 +1,145 @@
+#! /usr/bin/python3
+
+from configparser import ConfigParser
+from contextlib import ExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from os import path
+from threading import Lock, Thread
+from time import sleep
+import os
+import stat
+import sys
+import tempfile
+import unittest
+
+from .. import batch
+
+SCRIPT = """
+from dataclasses import dataclass
+
+@dataclass
+class Config:
+    title: str
+    processes: int|None = None
+
+def parse_args(args):
+    return Config(args[1], int(args[2]) if len(args) > 2 else None)
+
+def generate(conf, sess, out):
+    if conf.title == "fail":
+        raise RuntimeError("broken")
+    out.write(f"<feed><title>{conf.title}</title><body>{sess.get(URL).text}</body></feed>")
+"""
+
+CONFIG = """
+[batch]
+max_in_flight = 2
+
+[one]
+script = batch_test_script.py
+args = One
+
+[two]
+script = batch_test_script.py
+args = Two
+output = feeds/two.atom
+
+[broken]
+script = batch_test_script.py
+args = fail
+"""
+
+
+class SlowHandler(BaseHTTPRequestHandler):
+    """Reply slowly, counting the requests handled at once."""
+    lock = Lock()
+    in_flight: int = 0
+    most_in_flight: int = 0
+
+    def do_GET(self) -> None:
+        cls = type(self)
+        with cls.lock:
+            cls.in_flight += 1
+            cls.most_in_flight = max(cls.most_in_flight, cls.in_flight)
+        sleep(0.05)
+        with cls.lock:
+            cls.in_flight -= 1
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class TestBatch(unittest.TestCase):
+    """Test building several feeds at once."""
+    def setUp(self) -> None:
+        SlowHandler.most_in_flight = 0
+        self.stack = ExitStack()
+        server = self.stack.enter_context(ThreadingHTTPServer(("127.0.0.1", 0), SlowHandler))
+        Thread(target=server.serve_forever, daemon=True).start()
+        self.stack.callback(server.shutdown)
+        self.dir = self.stack.enter_context(tempfile.TemporaryDirectory())
+        with open(path.join(self.dir, "batch_test_script.py"), "w") as script:
+            script.write(f"URL = \"http://127.0.0.1:{server.server_address[1]}/\"\n{SCRIPT}")
+        os.makedirs(path.join(self.dir, "feeds"))
+        self.config = ConfigParser(interpolation=None)
+        self.config.read_string(CONFIG)
+        self.umask = batch.read_umask()
+
+    def tearDown(self) -> None:
+        self.stack.close()
+        # The script is loaded again by the next test, with the next server's URL
+        sys.modules.pop("batch_test_script", None)
+
+    def test_run(self) -> None:
+        """Test that feeds are written to their outputs, and a failed feed keeps its last output."""
+        broken = path.join(self.dir, "broken.xml")
+        with open(broken, "w") as output:
+            output.write("<feed>Last run</feed>")
+        two = path.join(self.dir, "feeds", "two.atom")
+        with open(two, "w") as output:
+            output.write("<feed>Last run</feed>")
+        os.chmod(two, 0o640)
+        adapter = batch.create_shared_adapter(self.config[batch.BATCH_SECTION], 2)
+        with ExitStack() as stack:
+            jobs = batch.load_jobs(self.config, self.dir, self.dir, adapter, stack, self.umask)
+            # Every job sends its requests through the same adapter
+            self.assertTrue(all(job.route.sess.get_adapter("http://example.org/") is adapter for job in jobs))
+            with self.assertLogs(batch.Logger, "ERROR"):
+                failed = batch.run_jobs(jobs, workers=3)
+        self.assertEqual([job.name for job in failed], ["broken"])
+        with open(path.join(self.dir, "one.xml")) as output:
+            self.assertEqual(output.read(), "<feed><title>One</title><body>ok</body></feed>")
+        # New files get the umask's mode (not mkstemp's 0600), and replaced files keep theirs
+        self.assertEqual(stat.S_IMODE(os.stat(path.join(self.dir, "one.xml")).st_mode), 0o666 & ~self.umask)
+        self.assertEqual(stat.S_IMODE(os.stat(two).st_mode), 0o640)
+        with open(two) as output:
+            self.assertIn("<title>Two</title>", output.read())
+        with open(broken) as output:
+            self.assertEqual(output.read(), "<feed>Last run</feed>")
+        # No temporary files are left behind
+        self.assertEqual(sorted(os.listdir(self.dir)), ["batch_test_script.py", "broken.xml", "feeds", "one.xml"])
+
+    def test_max_in_flight(self) -> None:
+        """Test that requests from every job count towards one budget."""
+        for index in range(3, 7):
+            self.config[f"extra{index}"] = {"script": "batch_test_script.py", "args": f"Extra{index}"}
+        adapter = batch.create_shared_adapter({}, 2)
+        with ExitStack() as stack:
+            jobs = batch.load_jobs(self.config, self.dir, self.dir, adapter, stack, self.umask)
+            with self.assertLogs(batch.Logger, "ERROR"):
+                batch.run_jobs(jobs, workers=len(jobs))
+        self.assertEqual(SlowHandler.most_in_flight, 2)
+
+    def test_processes(self) -> None:
+        """Test that jobs parsing in processes are refused, since the pools would be forked while other jobs are running."""
+        self.config["parallel"] = {"script": "batch_test_script.py", "args": "Parallel 2"}
+        adapter = batch.create_shared_adapter({}, 2)
+        with ExitStack() as stack, self.assertRaises(RuntimeError):
+            batch.load_jobs(self.config, self.dir, self.dir, adapter, stack, self.umask)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,120 @@
+#! /usr/bin/python3
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+import os
+import tempfile
+import time
+import unittest
+
+from .. import cache, feeds
+
+
+class ConditionalHandler(BaseHTTPRequestHandler):
+    """Serve a fixed body with an ETag, honoring If-None-Match."""
+    body: bytes = b"<rss><channel><title>Test</title></channel></rss>"
+    etag: str = '"v1"'
+    requests: list[str|None] = []
+
+    def do_GET(self) -> None:
+        self.requests.append(self.headers.get("If-None-Match"))
+        if self.headers.get("If-None-Match") == self.etag:
+            self.send_response(304)
+            self.send_header("ETag", self.etag)
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("ETag", self.etag)
+        self.send_header("Content-Type", "application/rss+xml")
+        self.send_header("Content-Length", str(len(self.body)))
+        self.end_headers()
+        self.wfile.write(self.body)
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class TestResponseCache(unittest.TestCase):
+    """Test the ResponseCache storage."""
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_round_trip(self) -> None:
+        """Test storing and reading a response."""
+        store = cache.ResponseCache(self.dir.name)
+        self.assertIsNone(store.get("https://example.org"))
+        store.put("https://example.org", {"ETag": '"a"', "Content-Encoding": "gzip"}, b"body")
+        cached = store.get("https://example.org")
+        assert cached is not None
+        self.assertEqual(cached.content, b"body")
+        self.assertEqual(cached.etag, '"a"')
+        # The body is stored decoded, so the transfer encoding must not be kept
+        self.assertNotIn("content-encoding", cached.headers)
+
+    def test_evict_by_age(self) -> None:
+        """Test that expired entries are not served and are removed."""
+        store = cache.ResponseCache(self.dir.name, max_age=60)
+        store.put("https://example.org", {"ETag": '"a"'}, b"body")
+        meta, _ = store._paths("https://example.org")
+        old = time.time() - 120
+        os.utime(meta, (old, old))
+        self.assertIsNone(store.get("https://example.org"))
+        store.evict()
+        self.assertEqual(os.listdir(self.dir.name), [])
+
+    def test_evict_by_size(self) -> None:
+        """Test that the least recently used entries are removed first."""
+        store = cache.ResponseCache(self.dir.name, max_size=1500)
+        for i, url in enumerate(("https://example.org/1", "https://example.org/2")):
+            store.put(url, {"ETag": '"a"'}, b"x" * 1000)
+            meta, _ = store._paths(url)
+            os.utime(meta, (i, time.time() - 10 + i))
+        store.evict()
+        self.assertIsNone(store.get("https://example.org/1"))
+        self.assertIsNotNone(store.get("https://example.org/2"))
+
+    def test_evict_periodically(self) -> None:
+        """Test that entries are evicted while writing, without waiting for the cache to be closed."""
+        store = cache.ResponseCache(self.dir.name, max_size=2500, evict_interval=4)
+        for i in range(8):
+            url = f"https://example.org/{i}"
+            store.put(url, {"ETag": '"a"'}, b"x" * 1000)
+            meta, _ = store._paths(url)
+            os.utime(meta, (i, time.time() - 10 + i))
+        # Evicted after the 4th and 8th writes, keeping the most recent entries
+        self.assertEqual([i for i in range(8) if store.get(f"https://example.org/{i}") is not None], [6, 7])
+
+
+class TestCachedSession(unittest.TestCase):
+    """Test conditional requests through with_session."""
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        ConditionalHandler.requests = []
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), ConditionalHandler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/feed"
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        self.dir.cleanup()
+
+    def test_not_modified(self) -> None:
+        """Test that a 304 response is served from the cache."""
+        for _ in range(2):
+            with feeds.with_session(cache_dir=self.dir.name) as sess:
+                res = sess.get(self.url)
+                self.assertEqual(res.status_code, 200)
+                self.assertEqual(res.content, ConditionalHandler.body)
+                self.assertEqual(res.headers["Content-Type"], "application/rss+xml")
+        self.assertEqual(ConditionalHandler.requests, [None, ConditionalHandler.etag])
+
+    def test_without_cache(self) -> None:
+        """Test that no conditional request is made without a cache."""
+        for _ in range(2):
+            with feeds.with_session() as sess:
+                self.assertEqual(sess.get(self.url).content, ConditionalHandler.body)
+        self.assertEqual(ConditionalHandler.requests, [None, None])
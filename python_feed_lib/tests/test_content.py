@@ -0,0 +1,62 @@
+#! /usr/bin/python3
+
+from xml.dom.minidom import parseString
+import unittest
+
+from bs4 import BeautifulSoup, Tag
+
+from .. import content
+
+ARTICLE = """<div class="article-content main"><p>First <b>bold</b> &amp; <br>more</p>
+<!-- comment --><p data-x="1" @click="go()">Second<fb:like></fb:like><span>\x0bnested</span></p>
+<ul><li>One</li><li>Two</li></ul><p>Last</p></div>"""
+
+def parse(html: str = ARTICLE) -> Tag:
+    tag = BeautifulSoup(html, "lxml").find(class_="article-content")
+    assert isinstance(tag, Tag)
+    return tag
+
+
+class TestContent(unittest.TestCase):
+    """Test converting HTML into feed content."""
+    def setUp(self) -> None:
+        self.doc = parseString("<feed/>")
+
+    def test_xhtml(self) -> None:
+        """Test that the converted content is well-formed XML in the XHTML namespace."""
+        node = content.create_content_node(parse(), self.doc)
+        text = node.toxml()
+        reparsed = parseString(text).documentElement
+        self.assertEqual(reparsed.getAttribute("type"), "xhtml")
+        div = reparsed.firstChild
+        self.assertEqual(div.getAttribute("xmlns"), content.XHTML_NAMESPACE)
+        self.assertEqual(div.getAttribute("class"), "article-content main")
+        self.assertNotIn("comment", text)
+        self.assertNotIn("@click", text)
+        self.assertIn('data-x="1"', text)
+        self.assertIn("<p>First <b>bold</b> &amp; <br/>more</p>", text)
+        self.assertIn("<span>nested</span>", text)
+        self.assertEqual([li.firstChild.data for li in reparsed.getElementsByTagName("li")], ["One", "Two"])
+
+    def test_order(self) -> None:
+        """Test that the children of dropped elements stay in place."""
+        node = content.convert_html(parse('<div class="article-content"><a:b>One</a:b><i>Two</i></div>'), self.doc)
+        self.assertEqual(node.toxml(), '<div class="article-content">One<i>Two</i></div>')
+
+    def test_wrapper(self) -> None:
+        """Test that content that is not a div is wrapped in one."""
+        node = content.create_content_node(parse('<section class="article-content">Text</section>'), self.doc)
+        self.assertEqual(
+            node.toxml(),
+            f'<content type="xhtml"><div xmlns="{content.XHTML_NAMESPACE}"><section class="article-content">Text</section></div></content>',
+        )
+
+    def test_html(self) -> None:
+        """Test escaped HTML content."""
+        node = content.create_content_node(parse('<div class="article-content"><p>A &amp; B</p></div>'), self.doc, "html")
+        self.assertEqual(node.getAttribute("type"), "html")
+        self.assertEqual(node.firstChild.data, '<div class="article-content"><p>A &amp; B</p></div>')
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,93 @@
+#! /usr/bin/python3
+
+from contextlib import ExitStack
+from os import path
+from threading import Thread
+import tempfile
+import unittest
+
+import requests
+
+from .. import daemon
+
+SCRIPT = """
+from dataclasses import dataclass
+
+@dataclass
+class Config:
+    title: str
+
+def parse_args(args):
+    if len(args) != 2:
+        raise SystemExit(2)
+    return Config(args[1])
+
+calls = 0
+
+def generate(conf, sess, out):
+    global calls
+    calls += 1
+    if conf.title == "fail":
+        raise RuntimeError("broken")
+    out.write(f"<feed><title>{conf.title}</title><calls>{calls}</calls></feed>")
+"""
+
+CONFIG = """
+[daemon]
+port = 0
+
+[hello]
+script = daemon_test_script.py
+args = "Hello world"
+
+[broken]
+script = daemon_test_script.py
+args = fail
+"""
+
+
+class TestDaemon(unittest.TestCase):
+    """Test serving scripts over HTTP."""
+    def setUp(self) -> None:
+        self.stack = ExitStack()
+        directory = self.stack.enter_context(tempfile.TemporaryDirectory())
+        with open(path.join(directory, "daemon_test_script.py"), "w") as script:
+            script.write(SCRIPT)
+        self.config = path.join(directory, "daemon.ini")
+        with open(self.config, "w") as config:
+            config.write(CONFIG)
+
+    def tearDown(self) -> None:
+        self.stack.close()
+
+    def serve(self) -> str:
+        """Start the daemon, returning its URL."""
+        _, routes = daemon.load_routes(self.config, self.stack)
+        server = self.stack.enter_context(daemon.FeedServer(("127.0.0.1", 0), routes))
+        Thread(target=server.serve_forever, daemon=True).start()
+        self.stack.callback(server.shutdown)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def test_routes(self) -> None:
+        """Test that routes are served by the same (loaded) script, and errors are reported."""
+        url = self.serve()
+        res = requests.get(f"{url}/hello")
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(res.headers["Content-Type"], "application/atom+xml; charset=utf-8")
+        self.assertEqual(res.text, "<feed><title>Hello world</title><calls>1</calls></feed>")
+        self.assertIn("<calls>2</calls>", requests.get(f"{url}/hello/").text)
+        with self.assertLogs(daemon.Logger, "ERROR"):
+            self.assertEqual(requests.get(f"{url}/broken").status_code, 502)
+        self.assertEqual(requests.get(f"{url}/missing").status_code, 404)
+        self.assertIn('route="hello"', requests.get(f"{url}/metrics").text)
+
+    def test_invalid_args(self) -> None:
+        """Test that a route with invalid arguments is reported."""
+        with open(self.config, "a") as config:
+            config.write("\n[invalid]\nscript = daemon_test_script.py\n")
+        with self.assertRaises(RuntimeError):
+            daemon.load_routes(self.config, self.stack)
+
+
+if __name__ == "__main__":
+    unittest.main()
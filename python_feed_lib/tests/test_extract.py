@@ -0,0 +1,69 @@
+#! /usr/bin/python3
+
+import unittest
+
+from .. import extract
+
+PAGE = """<html><head>
+<title>Page</title>
+<script type="application/ld+json">{"contentUrl": "https://example.org/video.m3u8"}</script>
+<script>track();</script>
+</head><body>
+<nav><a href="/">Home</a></nav>
+<div class="wrapper"><div class="article-content main"><p>Body <b>text</b></p><a class="listen">No link</a></div></div>
+<a class="listen" href="https://example.org/audio.mp3">Listen</a>
+</body></html>"""
+
+
+class TestExtractor(unittest.TestCase):
+    """Test partial parsing."""
+    def test_extract(self) -> None:
+        """Test that only the matched subtrees are parsed, including nested matches."""
+        extractor = extract.Extractor(".article-content", 'script[type="application/ld+json"]', "a.listen[href]", "a.listen")
+        found = extractor.extract(PAGE)
+        content = found.first(".article-content")
+        assert content is not None
+        self.assertEqual(content.get_text(), "Body textNo link")
+        metadata = found.first('script[type="application/ld+json"]')
+        assert metadata is not None
+        self.assertIn("contentUrl", metadata.get_text())
+        link = found.first("a.listen[href]")
+        assert link is not None
+        self.assertEqual(link.get("href"), "https://example.org/audio.mp3")
+        self.assertEqual(len(found.all("a.listen")), 2)
+        self.assertEqual(found.soup.find_all("nav"), [])
+        self.assertEqual(found.soup.find_all("title"), [])
+        found.decompose()
+
+    def test_missing(self) -> None:
+        """Test that a selector without matches finds nothing."""
+        self.assertIsNone(extract.Extractor("#missing").extract(PAGE).first("#missing"))
+
+    def test_bytes(self) -> None:
+        """Test that pages given as bytes are decoded as declared, and as UTF-8 otherwise."""
+        extractor = extract.Extractor(".article-content")
+        text = "Caf\u00e9 \u2014 na\u00efve"
+        page = f'<html><head><meta charset="windows-1252"></head><body><div class="article-content">{text}</div></body></html>'
+        cases = [
+            (page.encode("windows-1252"), None), # Declared by the page
+            (page.replace("windows-1252", "utf-8").encode("iso-8859-1", errors="replace"), "iso-8859-1"), # Declared by the server
+            (page.replace('<meta charset="windows-1252">', "").encode("utf-8"), None), # Not declared
+        ]
+        self.assertEqual(extract.get_encoding(cases[2][0]), "utf-8")
+        # Unknown labels are ignored, whether declared by the server or by the page
+        self.assertEqual(extract.get_encoding(cases[0][0], "bogus"), "windows-1252")
+        self.assertEqual(extract.get_encoding(page.replace("windows-1252", "bogus").encode("utf-8")), "utf-8")
+        for markup, charset in cases:
+            content = extractor.extract(markup, encoding=charset).first(".article-content")
+            assert content is not None
+            expected = text if charset is None else text.encode("iso-8859-1", errors="replace").decode("iso-8859-1")
+            self.assertEqual(content.get_text(), expected)
+
+    def test_unsupported(self) -> None:
+        """Test that selectors with combinators are rejected."""
+        with self.assertRaises(RuntimeError):
+            extract.Extractor("div p")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,10 @@
 #! /usr/bin/python3
 
+from datetime import datetime, timedelta, timezone
 from os import environ
+from threading import Lock
+from xml.dom.minidom import Document, Element, parseString
+import os
 import unittest
 
 import requests
@@ -58,6 +62,185 @@ class TestWithSession(unittest.TestCase):
             if "https" in sess.proxies:
                 self.assertNotEqual(sess.proxies["https"], proxy)
 
+def parse_page(page: str) -> str|None:
+    """A parser for enrich_articles, at module level so that it can be called in worker processes."""
+    if page.endswith("/5"):
+        return None
+    if page.endswith("/7"):
+        raise ValueError("Unparseable page")
+    return f"{page} from {os.getpid()}"
+
+def make_response(content: bytes, content_type: str) -> requests.Response:
+    """Create a response as if it had been downloaded."""
+    res = requests.Response()
+    res.status_code = 200
+    res.url = "https://example.org/feed"
+    res.headers["Content-Type"] = content_type
+    res._content = content
+    return res
+
+class TestResponses(unittest.TestCase):
+    """Test parsing responses from their bytes."""
+    def test_charset(self) -> None:
+        self.assertEqual(feeds.get_charset(make_response(b"", 'text/html; charset="UTF-8"')), "UTF-8")
+        # Unlike res.encoding, there is no default for text types
+        self.assertIsNone(feeds.get_charset(make_response(b"", "text/html")))
+        # Unknown charsets are ignored
+        self.assertIsNone(feeds.get_charset(make_response(b"", "text/html; charset=bogus")))
+        page = feeds.get_page(make_response(b"<p>", "text/html;charset=iso-8859-1"))
+        self.assertEqual(page, feeds.Page("https://example.org/feed", b"<p>", "iso-8859-1"))
+
+    def test_parse_xml(self) -> None:
+        """Test that the document's declared encoding is used, then the server's, then UTF-8."""
+        title = "Caf\u00e9"
+        declared = f'<?xml version="1.0" encoding="iso-8859-1"?><feed><title>{title}</title></feed>'.encode("iso-8859-1")
+        undeclared = f"<feed><title>{title}</title></feed>"
+        for content, content_type in (
+                (declared, "text/xml"),
+                (declared, "text/xml; charset=utf-8"), # The document's declaration wins
+                (undeclared.encode("iso-8859-1"), "text/xml; charset=iso-8859-1"),
+                (undeclared.encode("utf-8"), "text/xml"),
+                (undeclared.encode("utf-8"), "text/xml; charset=bogus"), # Unknown, so UTF-8
+        ):
+            doc = feeds.parse_xml(make_response(content, content_type))
+            self.assertEqual(feeds.get_string(doc.getElementsByTagName("title")[0]), title)
+
+class TestEnrichArticles(unittest.TestCase):
+    """Test the enrich_articles function."""
+    feed: str = "<feed>" + "".join(f'<entry><link href="https://example.org/{i}"/></entry>' for i in range(20)) + "</feed>"
+
+    def test_window(self) -> None:
+        """Test that results are applied as they complete, with a bounded number outstanding."""
+        lock = Lock()
+        outstanding: list[int] = [0, 0] # Current, peak
+
+        def getter(entry: Element, _) -> tuple[Element, str]|Element:
+            link = feeds.get_entry_link(entry)
+            if link.endswith("/3"):
+                return entry
+            with lock:
+                outstanding[0] += 1
+                outstanding[1] = max(outstanding)
+            return entry, link
+
+        def setter(entry: Element, link: str, doc: Document) -> None:
+            with lock:
+                outstanding[0] -= 1
+            entry.appendChild(feeds.create_text_node("content", link, doc))
+
+        doc = parseString(self.feed)
+        feeds.enrich_articles(doc, getter, setter, None, window=4) # type: ignore
+        self.assertEqual(len(doc.getElementsByTagName("entry")), 19)
+        self.assertEqual(len(doc.getElementsByTagName("content")), 19)
+        self.assertEqual(outstanding[0], 0)
+        self.assertLessEqual(outstanding[1], 4)
+
+    def test_parser(self) -> None:
+        """Test that pages are parsed in the getter's threads, or in other processes, with failures removed."""
+        def getter(entry: Element, _) -> tuple[Element, str]|Element:
+            return entry, feeds.get_entry_link(entry)
+
+        def setter(entry: Element, parsed: str, doc: Document) -> None:
+            entry.appendChild(feeds.create_text_node("content", parsed, doc))
+
+        for processes, window in ((None, 4), (2, 4), (2, None)):
+            doc = parseString(self.feed)
+            with self.assertLogs(feeds.Logger, "ERROR"):
+                feeds.enrich_articles(doc, getter, setter, None, window=window, parser=parse_page, processes=processes) # type: ignore
+            contents = [feeds.get_string(node) for node in doc.getElementsByTagName("content")]
+            self.assertEqual(len(doc.getElementsByTagName("entry")), 18)
+            self.assertEqual(len(contents), 18)
+            pids = {content.rpartition(" ")[2] for content in contents}
+            if processes is None:
+                self.assertEqual(pids, {str(os.getpid())})
+            else:
+                self.assertNotIn(str(os.getpid()), pids)
+
+## Conversion
+
+def make_feed(dates: list[str]) -> Document:
+    """Create an Atom feed with an entry for each date."""
+    entries = "".join(f"<entry><id>{date}</id><updated>{date}</updated></entry>" for date in dates)
+    return parseString(f'<feed xmlns="http://www.w3.org/2005/Atom"><title>Test</title>{entries}</feed>')
+
+def get_ids(feed: Document) -> list[str]:
+    """Get the ids of the entries in a feed, in order."""
+    return [feeds.get_string(feeds.get_single_element("id", e)) for e in feeds.get_entries(feed)] # type: ignore
+
+class TestSortElements(unittest.TestCase):
+    """Test sorting and merging entries."""
+    dates: list[str] = [
+        "Tue, 04 Feb 2025 08:00:00 +0000",
+        "Mon, 03 Feb 2025 08:00:00 +0000",
+        "Wed, 05 Feb 2025 08:00:00 +0000",
+    ]
+
+    def test_chronological(self) -> None:
+        """Test that RFC 822 dates are sorted by time, not as text."""
+        feed = make_feed(self.dates)
+        feeds.sort_elements(feed)
+        self.assertEqual(get_ids(feed), [self.dates[1], self.dates[0], self.dates[2]])
+        # Other children are kept
+        self.assertIsNotNone(feeds.get_single_element("title", feed))
+        # Sibling links are consistent with the new order
+        entries = feeds.get_entries(feed)
+        self.assertIs(entries[0].nextSibling, entries[1])
+        self.assertIs(entries[2].previousSibling, entries[1])
+        self.assertIsNone(entries[2].nextSibling)
+
+    def test_converted_timestamp(self) -> None:
+        """Test that converted RSS items carry their timestamp."""
+        rss = parseString(
+            "<rss><channel><title>Feed</title><item><title>A</title><guid>a</guid>"
+            "<pubDate>Mon, 03 Feb 2025 08:00:00 GMT</pubDate></item></channel></rss>"
+        )
+        entry = feeds.convert_feed(rss).getElementsByTagName("entry")[0]
+        self.assertEqual(entry.getUserData(feeds.TIMESTAMP_KEY), 1738569600.0)
+
+    def test_merge(self) -> None:
+        """Test merging feeds that are sorted in either direction, or not at all."""
+        main = make_feed(["2025-02-05T00:00:00Z", "2025-02-03T00:00:00Z"])
+        others = [
+            make_feed(["2025-02-01T00:00:00Z", "2025-02-04T00:00:00Z"]),
+            make_feed(["2025-02-06T00:00:00Z", "2025-02-02T00:00:00Z", "2025-02-07T00:00:00Z"]),
+        ]
+        feeds.merge_entries(main, (feeds.get_entries(other) for other in others))
+        self.assertEqual(get_ids(main), [f"2025-02-0{day}T00:00:00Z" for day in range(1, 8)])
+        self.assertIn("2025-02-07T00:00:00Z", main.toxml())
+        # The entries are detached from the other feeds, which can be freed without them
+        for other in others:
+            self.assertEqual(feeds.get_entries(other), [])
+            other.unlink()
+        self.assertEqual(len(feeds.get_entries(main)), 7)
+        self.assertIn("2025-02-07T00:00:00Z", main.toxml())
+
+    def test_dedup(self) -> None:
+        """Test that entries with the same id are only kept once."""
+        feed = make_feed(["a", "b", "a", "c", "b"])
+        self.assertEqual(feeds.dedup_entries(feed), 2)
+        self.assertEqual(get_ids(feed), ["a", "b", "c"])
+        self.assertEqual(feeds.dedup_entries(feed), 0)
+
+    def test_truncate(self) -> None:
+        """Test keeping the newest entries, in their original order."""
+        now = datetime.now(timezone.utc)
+        dates = [(now - timedelta(days=days)).isoformat() for days in (3, 1, 30, 2, 0)] + ["not a date"]
+        feed = make_feed(dates)
+        self.assertEqual(feeds.truncate_entries(feed), 0)
+        self.assertEqual(feeds.truncate_entries(feed, max_entries=4), 2)
+        # Entries without a valid date are the first removed by max_entries
+        self.assertEqual(get_ids(feed), [dates[0], dates[1], dates[3], dates[4]])
+        self.assertEqual(feeds.truncate_entries(feed, max_age=2.5), 1)
+        self.assertEqual(get_ids(feed), [dates[1], dates[3], dates[4]])
+        self.assertIsNotNone(feeds.get_single_element("title", feed))
+        entries = feeds.get_entries(feed)
+        self.assertIs(entries[0].nextSibling, entries[1])
+        # Entries without a valid date are kept by max_age
+        feed = make_feed(dates)
+        self.assertEqual(feeds.truncate_entries(feed, max_age=1.5), 3)
+        self.assertEqual(get_ids(feed), [dates[1], dates[4], dates[5]])
+        self.assertEqual(feeds.truncate_entries(feed, max_entries=0), 3)
+
 class TestGetUserAgent(unittest.TestCase):
     """Test the get_user_agent function."""
     env: dict[str, str] = {}
@@ -0,0 +1,102 @@
+#! /usr/bin/python3
+
+from contextlib import redirect_stderr
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from unittest import mock
+import io
+import logging
+import os
+import tempfile
+import unittest
+
+from .. import feeds, metrics
+from .. import logging as feed_logging
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """Reply with a fixed body."""
+    def do_GET(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Length", "5")
+        self.end_headers()
+        self.wfile.write(b"hello")
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class TestMetrics(unittest.TestCase):
+    """Test the metrics registry."""
+    def test_histogram(self) -> None:
+        """Test that bucket counts are cumulative, and that values above every bucket are only counted."""
+        histogram = metrics.Histogram((1.0, 2.0))
+        for value in (0.5, 1.0, 1.5, 3.0):
+            histogram.observe(value)
+        self.assertEqual(histogram.cumulative(), [2, 3])
+        self.assertEqual(histogram.count, 4)
+        self.assertEqual(histogram.total, 6.0)
+        self.assertEqual(histogram.maximum, 3.0)
+
+    def test_prometheus(self) -> None:
+        """Test the text exposition format."""
+        registry = metrics.Metrics()
+        registry.count("requests_total", host="example.org", status="200")
+        registry.observe("request_duration_seconds", 0.2, host="example.org")
+        text = registry.to_prometheus("test")
+        self.assertIn("# TYPE rss_feed_requests_total counter\n", text)
+        self.assertIn('rss_feed_requests_total{job="test",host="example.org",status="200"} 1.0\n', text)
+        self.assertIn('rss_feed_request_duration_seconds_bucket{job="test",host="example.org",le="0.1"} 0\n', text)
+        self.assertIn('rss_feed_request_duration_seconds_bucket{job="test",host="example.org",le="0.25"} 1\n', text)
+        self.assertIn('rss_feed_request_duration_seconds_bucket{job="test",host="example.org",le="+Inf"} 1\n', text)
+        self.assertIn('rss_feed_request_duration_seconds_count{job="test",host="example.org"} 1\n', text)
+
+    def test_write(self) -> None:
+        """Test that the textfile is written under the job's name."""
+        registry = metrics.Metrics()
+        registry.count("requests_total", host="example.org", status="200")
+        with tempfile.TemporaryDirectory() as directory:
+            metrics.write_metrics(directory, "job", registry)
+            self.assertEqual(os.listdir(directory), ["job.prom"])
+
+    def test_summary(self) -> None:
+        """Test that a script's logger prints the summary at exit, without logging its info messages."""
+        metrics.METRICS.count("summary_test_total")
+        output = io.StringIO()
+        # The exit handlers are called here rather than at exit
+        with redirect_stderr(output), mock.patch.object(feed_logging, "atexit") as registered:
+            feed_logging.setup_logging("metrics_summary_test")
+        for call in reversed(registered.call_args_list):
+            call.args[0](*call.args[1:])
+        self.assertIn("Metrics: ", output.getvalue())
+        self.assertIn("summary_test_total", output.getvalue())
+        self.assertNotIn("Finished preparing feed", output.getvalue())
+        self.assertEqual(logging.getLogger("metrics_summary_test").level, logging.NOTSET)
+
+
+class TestSessionMetrics(unittest.TestCase):
+    """Test the metrics recorded by with_session."""
+    def setUp(self) -> None:
+        metrics.METRICS.clear()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), PageHandler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.host = f"127.0.0.1:{self.server.server_address[1]}"
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+        metrics.METRICS.clear()
+
+    def test_requests(self) -> None:
+        """Test that the latency, status and size of requests are recorded per host."""
+        with feeds.with_session() as sess:
+            for _ in range(2):
+                sess.get(f"http://{self.host}/")
+        summary = metrics.METRICS.summary()
+        self.assertEqual(summary[metrics.REQUESTS], [{"host": self.host, "status": "200", "value": 2.0}])
+        self.assertEqual(summary[metrics.RESPONSE_BYTES], [{"host": self.host, "value": 10.0}])
+        self.assertEqual(summary[metrics.REQUEST_SECONDS][0]["count"], 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
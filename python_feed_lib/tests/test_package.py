@@ -0,0 +1,55 @@
+#! /usr/bin/python3
+
+from os import path
+import subprocess
+import sys
+import unittest
+
+import python_feed_lib
+
+# The directory containing python_feed_lib
+ROOT = path.dirname(path.dirname(path.dirname(path.abspath(__file__))))
+
+class TestLazyImports(unittest.TestCase):
+    """Test that the package's submodules are imported when their names are used."""
+    def imported_modules(self, code: str) -> set[str]:
+        """Run code in a new interpreter, and get the modules it imported."""
+        res = subprocess.run(
+            [sys.executable, "-c", f"import sys\n{code}\nprint(' '.join(sys.modules))"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        return set(res.stdout.split())
+
+    def test_import(self):
+        modules = self.imported_modules("import python_feed_lib")
+        self.assertNotIn("bs4", modules)
+        self.assertNotIn("requests", modules)
+        self.assertNotIn("python_feed_lib.feeds", modules)
+
+    def test_argument_names(self):
+        modules = self.imported_modules(
+            "from python_feed_lib import get_cache_dir, get_metrics_dir, get_user_agent, setup_logging"
+        )
+        self.assertNotIn("bs4", modules)
+        self.assertNotIn("requests", modules)
+
+    def test_use(self):
+        modules = self.imported_modules("from python_feed_lib import with_session")
+        self.assertIn("python_feed_lib.feeds", modules)
+        self.assertIn("requests", modules)
+
+    def test_names(self):
+        from python_feed_lib import feeds
+        self.assertIs(python_feed_lib.with_session, feeds.with_session)
+        for name in python_feed_lib.__all__:
+            self.assertTrue(hasattr(python_feed_lib, name), name)
+        self.assertLessEqual(set(python_feed_lib.__all__), set(dir(python_feed_lib)))
+
+    def test_unknown_name(self):
+        with self.assertRaises(AttributeError):
+            python_feed_lib.not_a_name
+        with self.assertRaises(ImportError):
+            from python_feed_lib import not_a_name
+
+if __name__ == "__main__":
+    unittest.main()
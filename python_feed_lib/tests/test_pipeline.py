@@ -0,0 +1,141 @@
+#! /usr/bin/python3
+
+from contextlib import redirect_stderr
+from datetime import datetime, timedelta, timezone
+from xml.dom.minidom import Document, parseString
+import argparse
+import io
+import unittest
+
+from .. import feeds, pipeline
+
+def make_feed() -> Document:
+    now = datetime.now(timezone.utc)
+    return parseString(f"""<feed xmlns="http://www.w3.org/2005/Atom">
+<title>Feed by webmaster@example.org</title>
+<entry><id>1</id><updated>{now.isoformat()}</updated><category term="Sports/Baseball"/>
+<author><name>apps.support@example.org (Apps Support)</name></author>
+<link href="https://pdst.fm/e/cdn.example.org/1.mp3"/></entry>
+<entry><id>2</id><updated>{(now - timedelta(days=10)).isoformat()}</updated><category term="News"/></entry>
+<entry><id>3</id><updated>not a date</updated><author><name>webmaster@example.org</name></author></entry>
+<entry><id>1</id><updated>{now.isoformat()}</updated></entry>
+</feed>""")
+
+def get_ids(feed: Document) -> list[str]:
+    return [feeds.get_string(feeds.get_single_element("id", entry)) for entry in feeds.get_entries(feed)]
+
+
+class TestStages(unittest.TestCase):
+    """Test the pipeline's stages."""
+    def test_category_filter(self) -> None:
+        feed = make_feed()
+        self.assertEqual(pipeline.CategoryFilter(["opinion", "BASEBALL"]).apply(feed), 1)
+        # Entries without categories are kept
+        self.assertEqual(get_ids(feed), ["2", "3", "1"])
+
+    def test_converted_categories(self) -> None:
+        """Test that RSS categories survive conversion, so that they can be filtered."""
+        rss = parseString("""<rss version="2.0"><channel><title>T</title>
+<item><title>A</title><guid>a</guid><pubDate>Sat, 01 Feb 2025 12:00:00 +0000</pubDate><category>Opinion</category></item>
+<item><title>B</title><guid>b</guid><pubDate>Sat, 01 Feb 2025 12:00:00 +0000</pubDate><category>Local</category></item>
+</channel></rss>""")
+        feed = feeds.convert_feed(rss)
+        pipeline.CategoryFilter(["opinion"]).apply(feed)
+        self.assertEqual(get_ids(feed), ["b"])
+
+    def test_matcher(self) -> None:
+        matcher = pipeline.compile_matcher(["sport", "sports", "a.b", "opinion"])
+        self.assertIsNotNone(matcher.search("Local SPORTS"))
+        self.assertIsNotNone(matcher.search("x a.b y"))
+        self.assertIsNone(matcher.search("axb"))
+        self.assertIsNone(matcher.search("News"))
+        self.assertIsNone(pipeline.compile_matcher([]).search("anything"))
+
+    def test_truncate(self) -> None:
+        feed = make_feed()
+        self.assertEqual(pipeline.Truncate(max_age=2).apply(feed), 1)
+        # Entries with invalid dates are kept
+        self.assertEqual(get_ids(feed), ["1", "3", "1"])
+        self.assertEqual(pipeline.Truncate(max_entries=2).apply(feed), 1)
+        self.assertEqual(get_ids(feed), ["1", "1"])
+
+    def test_dedup(self) -> None:
+        feed = make_feed()
+        self.assertEqual(pipeline.Dedup().apply(feed), 1)
+        self.assertEqual(get_ids(feed), ["1", "2", "3"])
+
+    def test_rewrite(self) -> None:
+        feed = make_feed()
+        stage = pipeline.RegexRewrite([
+            (r"pdst\.fm.*/(cdn\.example\.org)/", r"\1/"),
+            (r"(\w+)@example\.org", r"\1 at example.org"),
+        ])
+        self.assertGreater(stage.apply(feed), 0)
+        link = feeds.get_single_element("link", feed)
+        assert link is not None
+        self.assertEqual(link.getAttribute("href"), "https://cdn.example.org/1.mp3")
+        title = feeds.get_single_element("title", feed)
+        assert title is not None
+        self.assertEqual(feeds.get_string(title), "Feed by webmaster at example.org")
+
+    def test_rewriter(self) -> None:
+        rewriter = pipeline.Rewriter([("a", "b"), ("b", "c"), (r"(?P<x>\d+)", r"<\g<x>>")])
+        # Each position is rewritten once, by the first rule that matches
+        self.assertEqual(rewriter.rewrite("ab 12"), "bc <12>")
+        self.assertEqual(pipeline.Rewriter([]).rewrite("ab"), "ab")
+        with self.assertRaises(RuntimeError):
+            pipeline.Rewriter([("(", "")])
+
+    def test_uncombined_rules(self) -> None:
+        """Test that rules with backreferences, or reusing a group name, are applied by themselves in order."""
+        rewriter = pipeline.Rewriter([("x", "y"), (r"(a)\1", "<\\1>"), (r"(?P<n>b)", "c"), (r"(?P<n>c)\d", "[\\g<n>]"), ("z", "w")])
+        self.assertEqual(len(rewriter.passes), 4) # x | (a)\1 | (?P<n>b) | (?P<n>c)\d and z
+        self.assertEqual(rewriter.rewrite("xaa b1 c2 z"), "y<a> [c] [c] w")
+        self.assertEqual(pipeline.Rewriter([(r"(?P<n>\w)(?P=n)", "\\g<n>")]).rewrite("aabb"), "ab")
+
+    def test_author_rewrite(self) -> None:
+        feed = make_feed()
+        stage = pipeline.AuthorRewrite([
+            (r"apps\.support@example\.org \(Apps Support\)", "Example News"),
+            (r".*webmaster.*", ""),
+        ])
+        self.assertEqual(stage.apply(feed), 2)
+        names = [feeds.get_string(name) for name in feed.getElementsByTagName("name")]
+        self.assertEqual(names, ["Example News"])
+        # Only names are rewritten
+        title = feeds.get_single_element("title", feed)
+        assert title is not None
+        self.assertEqual(feeds.get_string(title), "Feed by webmaster@example.org")
+
+
+class TestArguments(unittest.TestCase):
+    """Test selecting stages from the command line."""
+    def parse(self, args: list[str]) -> pipeline.Pipeline:
+        parser = argparse.ArgumentParser()
+        pipeline.add_pipeline_args(parser)
+        return pipeline.create_pipeline(parser, parser.parse_args(args))
+
+    def test_none(self) -> None:
+        feed = make_feed()
+        self.assertEqual(self.parse([]).stages, [])
+        self.assertEqual(len(get_ids(self.parse([]).run(feed))), 4)
+
+    def test_stages(self) -> None:
+        created = self.parse([
+            "--rewrite", "a", "b", "--drop-category", "news", "--max-age", "2", "--dedup",
+            "--drop-category", "sports", "--rewrite-author", "x", "y", "--max-entries", "5",
+        ])
+        self.assertEqual(
+            [type(stage) for stage in created.stages],
+            [pipeline.Dedup, pipeline.CategoryFilter, pipeline.Truncate, pipeline.RegexRewrite, pipeline.AuthorRewrite],
+        )
+        feed = created.run(make_feed())
+        self.assertEqual(get_ids(feed), ["3"])
+
+    def test_invalid_pattern(self) -> None:
+        # Reported like other argument errors
+        with self.assertRaises(SystemExit), redirect_stderr(io.StringIO()):
+            self.parse(["--rewrite", "(", ""])
+
+if __name__ == "__main__":
+    unittest.main()
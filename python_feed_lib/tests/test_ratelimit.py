@@ -0,0 +1,81 @@
+#! /usr/bin/python3
+
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+from time import monotonic
+import unittest
+
+from .. import feeds, ratelimit
+
+
+class FlakyHandler(BaseHTTPRequestHandler):
+    """Reply 503 (with Retry-After) to the first request, then 200."""
+    calls: int = 0
+
+    def do_GET(self) -> None:
+        type(self).calls += 1
+        if self.calls == 1:
+            self.send_response(503)
+            self.send_header("Retry-After", "0")
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        self.send_response(200)
+        self.send_header("Content-Length", "2")
+        self.end_headers()
+        self.wfile.write(b"ok")
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class TestRetries(unittest.TestCase):
+    """Test retries in with_session."""
+    def setUp(self) -> None:
+        FlakyHandler.calls = 0
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyHandler)
+        Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def tearDown(self) -> None:
+        self.server.shutdown()
+        self.server.server_close()
+
+    def test_retry(self) -> None:
+        """Test that a 503 response is retried."""
+        with feeds.with_session(backoff=0) as sess:
+            res = sess.get(self.url)
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(FlakyHandler.calls, 2)
+
+    def test_retry_rate_limit(self) -> None:
+        """Test that retries wait for the rate limit too."""
+        with feeds.with_session(backoff=0, rate_limit=5, burst=1) as sess:
+            start = monotonic()
+            self.assertEqual(sess.get(self.url).status_code, 200)
+        self.assertEqual(FlakyHandler.calls, 2)
+        self.assertGreaterEqual(monotonic() - start, 0.19)
+
+    def test_no_retry(self) -> None:
+        """Test that the last response is returned when retries are disabled."""
+        with feeds.with_session(retries=0) as sess:
+            self.assertEqual(sess.get(self.url).status_code, 503)
+
+
+class TestRateLimiter(unittest.TestCase):
+    """Test the token bucket rate limiter."""
+    def test_rate(self) -> None:
+        """Test that requests to one host are spaced out, but other hosts are not delayed."""
+        limiter = ratelimit.HostRateLimiter(rate=20, burst=1)
+        start = monotonic()
+        for _ in range(3):
+            limiter.acquire("https://a.example.org/")
+        self.assertGreaterEqual(monotonic() - start, 0.09)
+        start = monotonic()
+        limiter.acquire("https://b.example.org/")
+        self.assertLess(monotonic() - start, 0.04)
+
+    def test_invalid_rate(self) -> None:
+        """Test that a rate must be positive."""
+        with self.assertRaises(ValueError):
+            ratelimit.TokenBucket(0)
@@ -0,0 +1,75 @@
+#! /usr/bin/python3
+
+import unittest
+
+from bs4 import BeautifulSoup, Tag
+
+from .. import feeds, sanitize
+
+ARTICLE = """<div class="article-content">
+<p>First <b>paragraph</b></p>
+<script>track();</script>
+<div class="ad"><!-- advertisement --><span>Ad</span><script>ad();</script></div>
+<p><a href="https://example.org/newsletters">Sign up</a></p>
+<p><a href="https://example.org/newsletters/archive">Past issues</a></p>
+<p><a href="https://example.org/story">Related story</a></p>
+<aside class="related"><p>More</p></aside>
+<p id="last">Last paragraph</p>
+</div>"""
+
+def parse(html: str = ARTICLE) -> Tag:
+    content = BeautifulSoup(html, "lxml").find(class_="article-content")
+    assert isinstance(content, Tag)
+    return content
+
+
+class TestSanitizer(unittest.TestCase):
+    """Test the rule-driven sanitizer."""
+    def test_default(self) -> None:
+        """Test that scripts and the parents of comments are removed, like cleanup_html."""
+        content = parse()
+        feeds.cleanup_html(content)
+        self.assertEqual(content.find_all("script"), [])
+        self.assertIsNone(content.find(class_="ad"))
+        self.assertIsNotNone(content.find("a", href="https://example.org/newsletters"))
+
+    def test_top_level_comment(self) -> None:
+        """Test that a comment directly inside the content does not remove all of it."""
+        content = parse('<div class="article-content"><!-- body --><p>Text</p></div>')
+        feeds.cleanup_html(content)
+        self.assertEqual(str(content), '<div class="article-content"><p>Text</p></div>')
+
+    def test_rules(self) -> None:
+        """Test href prefix and selector rules."""
+        content = parse()
+        sanitize.Sanitizer(
+            href_prefixes=("https://example.org/newsletters",),
+            selectors=("aside.related", "#missing"),
+        ).sanitize(content)
+        self.assertEqual([p.get_text() for p in content.find_all("p")], ["First paragraph", "Related story", "Last paragraph"])
+        self.assertIsNone(content.find("aside"))
+        self.assertEqual(content.find_all("script"), [])
+
+    def test_exact_href(self) -> None:
+        """Test that exact href rules only remove links to that URL."""
+        content = parse()
+        sanitize.Sanitizer(hrefs=("https://example.org/newsletters",)).sanitize(content)
+        self.assertIsNone(content.find("a", href="https://example.org/newsletters"))
+        self.assertIsNotNone(content.find("a", href="https://example.org/newsletters/archive"))
+
+    def test_nested(self) -> None:
+        """Test that removals inside other removals are skipped."""
+        content = parse()
+        removals = sanitize.Sanitizer(selectors=("div.ad",)).find_removals(content)
+        self.assertEqual([node.name for node in removals], ["script", "div"])
+
+    def test_disabled(self) -> None:
+        """Test that rules can be turned off."""
+        content = parse()
+        sanitize.Sanitizer(tags=(), comments=False).sanitize(content)
+        self.assertEqual(len(content.find_all("script")), 2)
+        self.assertIsNotNone(content.find(class_="ad"))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,111 @@
+#! /usr/bin/python3
+
+from xml.dom.minidom import Document, Element, parseString
+import io
+import os
+import tempfile
+import unittest
+
+from .. import feeds, seen, writer
+from ..store import ResultStore
+
+def make_feed(count: int) -> str:
+    return "<feed>" + "".join(f'<entry><id>urn:{i}</id><link href="https://example.org/{i}"/></entry>' for i in range(count)) + "</feed>"
+
+
+class TestSeenIndex(unittest.TestCase):
+    """Test the SeenIndex class."""
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.dir.name, "seen.sqlite")
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_round_trip(self) -> None:
+        """Test that ids persist between instances, and that namespaces do not share them."""
+        ids = [f"urn:{i}" for i in range(1200)] # More than one query's batch
+        with seen.SeenIndex(self.file_name, namespace="a") as index:
+            self.assertEqual(index.known(ids), set())
+            index.add(ids)
+        with seen.SeenIndex(self.file_name, namespace="a") as index:
+            self.assertEqual(index.known(ids + ["urn:new"]), set(ids))
+            self.assertIn("urn:5", index)
+        with seen.SeenIndex(self.file_name, namespace="b") as index:
+            self.assertNotIn("urn:5", index)
+
+    def test_prune(self) -> None:
+        """Test that ids not seen for max_age are forgotten."""
+        with seen.SeenIndex(self.file_name) as index:
+            index.add(["urn:old"])
+        with seen.SeenIndex(self.file_name, max_age=-1) as index:
+            index.prune()
+            self.assertNotIn("urn:old", index)
+            index.add(["urn:new"])
+        with seen.SeenIndex(self.file_name) as index:
+            # Pruned again when the previous index was closed
+            self.assertNotIn("urn:new", index)
+
+    def test_remove_seen(self) -> None:
+        with seen.SeenIndex(self.file_name) as index:
+            index.add(["urn:1", "urn:3"])
+            doc = parseString(make_feed(5))
+            self.assertEqual(seen.remove_seen_entries(doc, index), 2)
+            self.assertEqual([feeds.get_entry_id(entry) for entry in feeds.get_entries(doc)], ["urn:0", "urn:2", "urn:4"])
+
+
+class TestEnrichWithSeen(unittest.TestCase):
+    """Test enrich_articles with a SeenIndex."""
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.dir.name, "seen.sqlite")
+        self.fetched: list[str] = []
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def getter(self, entry: Element, _) -> tuple[Element, str]|Element:
+        link = feeds.get_entry_link(entry)
+        self.fetched.append(link)
+        if link.endswith("/2") and len(self.fetched) <= 4: # Fails on the first run
+            return entry
+        return entry, link
+
+    @staticmethod
+    def setter(entry: Element, link: str, doc: Document) -> None:
+        entry.appendChild(feeds.create_text_node("content", link, doc))
+
+    def run_feed(self, count: int, store: ResultStore|None = None) -> tuple[list[str], list[str]]:
+        """Enrich and write a feed. Returns the ids and contents of the entries written, and the ids known afterward."""
+        doc = parseString(make_feed(count))
+        stream = io.StringIO()
+        # The writer frees each entry once it is written, so ids are recorded before on_entry is called
+        with seen.SeenIndex(self.file_name) as index, writer.FeedWriter(stream) as output:
+            output.start(doc)
+            feeds.enrich_articles(doc, self.getter, self.setter, None, window=2, seen=index, store=store, on_entry=output.write_entry) # type: ignore
+            known = sorted(index.known(f"urn:{i}" for i in range(count)))
+        written = parseString(stream.getvalue())
+        contents = [feeds.get_string(content) for content in written.getElementsByTagName("content")]
+        self.assertEqual(len(contents), len(feeds.get_entries(written)), "Every entry written is enriched")
+        return contents, known
+
+    def test_skip(self) -> None:
+        """Test that entries produced by an earlier run are left out rather than enriched again, but failed entries are retried."""
+        outputs = [self.run_feed(count) for count in (4, 6)]
+        self.assertEqual(self.fetched[:4], [f"https://example.org/{i}" for i in range(4)])
+        self.assertEqual(sorted(self.fetched[4:]), ["https://example.org/2", "https://example.org/4", "https://example.org/5"])
+        self.assertEqual(outputs, [
+            (["https://example.org/0", "https://example.org/1", "https://example.org/3"], ["urn:0", "urn:1", "urn:3"]),
+            (["https://example.org/2", "https://example.org/4", "https://example.org/5"], [f"urn:{i}" for i in range(6)]),
+        ])
+
+    def test_restore(self) -> None:
+        """Test that entries produced by an earlier run are still written if their enrichment can be restored from the store."""
+        with ResultStore(os.path.join(self.dir.name, "store.sqlite")) as store:
+            self.run_feed(4, store)
+            contents, _ = self.run_feed(6, store)
+        self.assertEqual(len(self.fetched), 7) # Only the failed and new entries are fetched again
+        self.assertEqual(sorted(contents), [f"https://example.org/{i}" for i in range(6)])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,83 @@
+#! /usr/bin/python3
+
+from xml.dom.minidom import Document, Element, parseString
+import os
+import tempfile
+import unittest
+
+from .. import feeds, store
+
+FEED: str = """<?xml version="1.0" encoding="utf-8"?>
+<feed xmlns="http://www.w3.org/2005/Atom">
+<entry><title>One</title><id>urn:1</id><link href="https://example.org/1"/></entry>
+<entry><title>Two</title><link href="https://example.org/2"/></entry>
+</feed>"""
+
+
+class TestResultStore(unittest.TestCase):
+    """Test the ResultStore class."""
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.dir.name, "store.sqlite")
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def test_round_trip(self) -> None:
+        """Test that values persist between instances."""
+        with store.ResultStore(self.file_name) as results:
+            self.assertIsNone(results.get("key"))
+            results.put("key", "value")
+        with store.ResultStore(self.file_name) as results:
+            self.assertEqual(results.get("key"), "value")
+
+    def test_namespace(self) -> None:
+        """Test that namespaces do not share values."""
+        with store.ResultStore(self.file_name, namespace="a") as results:
+            results.put("key", "value")
+        with store.ResultStore(self.file_name, namespace="b") as results:
+            self.assertIsNone(results.get("key"))
+
+    def test_expiry(self) -> None:
+        """Test that expired values are not returned."""
+        with store.ResultStore(self.file_name) as results:
+            results.put("key", "value", ttl=-1)
+            self.assertIsNone(results.get("key"))
+
+
+class TestEnrichWithStore(unittest.TestCase):
+    """Test enrich_articles with a ResultStore."""
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.file_name = os.path.join(self.dir.name, "store.sqlite")
+        self.fetched: list[str] = []
+
+    def tearDown(self) -> None:
+        self.dir.cleanup()
+
+    def getter(self, entry: Element, _) -> tuple[Element, str]:
+        link = feeds.get_entry_link(entry)
+        self.fetched.append(link)
+        return entry, link
+
+    @staticmethod
+    def setter(entry: Element, link: str, doc: Document) -> None:
+        entry.appendChild(feeds.create_text_node("content", f"Body of {link}", doc, {"type": "text"}))
+
+    def test_restore(self) -> None:
+        """Test that stored results are used instead of calling the getter."""
+        outputs = []
+        for _ in range(2):
+            doc = parseString(FEED)
+            with store.ResultStore(self.file_name) as results:
+                feeds.enrich_articles(doc, self.getter, self.setter, None, store=results) # type: ignore
+            outputs.append(doc.toxml())
+        self.assertEqual(self.fetched, ["https://example.org/1", "https://example.org/2"])
+        self.assertEqual(outputs[0], outputs[1])
+        self.assertIn('<content type="text">Body of https://example.org/2</content>', outputs[1])
+
+    def test_entry_id(self) -> None:
+        """Test that the id is preferred over the link."""
+        entries = parseString(FEED).getElementsByTagName("entry")
+        self.assertEqual(feeds.get_entry_id(entries[0]), "urn:1")
+        self.assertEqual(feeds.get_entry_id(entries[1]), "https://example.org/2")
@@ -0,0 +1,121 @@
+#! /usr/bin/python3
+
+from contextlib import ExitStack
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Thread
+import gzip
+import tempfile
+import unittest
+
+from .. import extract, feeds, stream
+
+HEAD = b"""<html><head><meta charset="utf-8">
+<script type="application/ld+json">{"contentUrl": "https://example.org/video.m3u8"}</script>
+</head><body><div class="article-content"><p>Caf\xc3\xa9</p></div>
+"""
+# Comments, related articles, footers and scripts
+TAIL = b"<div class=\"related\"><p>Related article</p></div>\n" * 20000 + b"</body></html>"
+
+
+class PageHandler(BaseHTTPRequestHandler):
+    """Serve a page with a long tail, compressed if asked for, and record the connections used."""
+    protocol_version = "HTTP/1.1"
+    ports: set[int] = set()
+    not_modified: int = 0
+
+    def do_GET(self) -> None:
+        type(self).ports.add(self.client_address[1])
+        if self.path == "/etag" and self.headers.get("If-None-Match") == '"1"':
+            type(self).not_modified += 1
+            self.send_response(304)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = HEAD + (TAIL if self.path != "/short" else b"</body></html>")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/html")
+        self.send_header("ETag", '"1"')
+        if self.path == "/gzip":
+            body = gzip.compress(body)
+            self.send_header("Content-Encoding", "gzip")
+        if self.path == "/chunked":
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for start in range(0, len(body), 4096):
+                part = body[start:start + 4096]
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(part), part))
+            self.wfile.write(b"0\r\n\r\n")
+            return
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def handle(self) -> None:
+        try:
+            super().handle()
+        except OSError: # The client stopped reading
+            pass
+
+    def log_message(self, *args) -> None:
+        pass
+
+
+class TestFetchPage(unittest.TestCase):
+    """Test streamed downloads."""
+    def setUp(self) -> None:
+        PageHandler.ports = set()
+        PageHandler.not_modified = 0
+        self.stack = ExitStack()
+        server = self.stack.enter_context(ThreadingHTTPServer(("127.0.0.1", 0), PageHandler))
+        Thread(target=server.serve_forever, daemon=True).start()
+        self.stack.callback(server.shutdown)
+        self.url = f"http://127.0.0.1:{server.server_address[1]}"
+        self.sess = self.stack.enter_context(feeds.with_session())
+        self.extractor = extract.Extractor(".article-content", 'script[type="application/ld+json"]')
+
+    def tearDown(self) -> None:
+        self.stack.close()
+
+    def check_page(self, page: feeds.Page) -> None:
+        found = self.extractor.extract(page.content, encoding=page.charset)
+        content = found.first(".article-content")
+        assert content is not None
+        self.assertEqual(content.get_text(), "Café")
+        self.assertIsNotNone(found.first('script[type="application/ld+json"]'))
+
+    def test_stop(self) -> None:
+        """Test that the download stops once the targets have been read, with or without compression."""
+        for path in ("/plain", "/gzip", "/chunked"):
+            page = stream.fetch_page(self.url + path, self.sess, self.extractor)
+            self.assertLess(len(page.content), len(TAIL) // 10)
+            self.check_page(page)
+
+    def test_whole(self) -> None:
+        """Test that the whole page is read without an extractor, or if a target is missing."""
+        page = stream.fetch_page(self.url + "/gzip", self.sess)
+        self.assertEqual(page.content, HEAD + TAIL)
+        page = stream.fetch_page(self.url + "/plain", self.sess, extract.Extractor(".article-content", "#missing"))
+        self.assertEqual(len(page.content), len(HEAD + TAIL))
+
+    def test_reuse(self) -> None:
+        """Test that the connection is kept when little of the page is left."""
+        for _ in range(3):
+            self.check_page(stream.fetch_page(self.url + "/short", self.sess, self.extractor))
+        self.assertEqual(len(PageHandler.ports), 1)
+
+    def test_cache(self) -> None:
+        """Test that pages are read to the end and cached, and then revalidated, if the session has a cache."""
+        with tempfile.TemporaryDirectory() as cache_dir, feeds.with_session(cache_dir=cache_dir) as sess:
+            for _ in range(2):
+                page = stream.fetch_page(self.url + "/etag", sess, self.extractor)
+                self.assertEqual(page.content, HEAD + TAIL)
+        self.assertEqual(PageHandler.not_modified, 1)
+
+    def test_max_bytes(self) -> None:
+        """Test that large pages are refused, whether or not their length is known."""
+        for path in ("/plain", "/chunked"):
+            with self.assertRaises(RuntimeError):
+                stream.fetch_page(self.url + path, self.sess, max_bytes=len(HEAD) + 1000)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+#! /usr/bin/python3
+
+from xml.dom.minidom import Document, parseString
+import io
+import unittest
+
+from .. import feeds, writer
+
+def make_feed() -> Document:
+    """Create an Atom feed with three entries."""
+    entries = "".join(f"<entry><id>{i}</id><title>Entry &amp; {i}</title></entry>" for i in range(3))
+    return parseString(f'<feed xmlns="http://www.w3.org/2005/Atom"><title>Test "feed"</title>{entries}</feed>')
+
+
+class TestFeedWriter(unittest.TestCase):
+    """Test writing feeds incrementally."""
+    def test_same_output(self) -> None:
+        """Test that the output is the same as serializing the whole document."""
+        for pretty in (False, True):
+            out = io.StringIO()
+            writer.FeedWriter(out, pretty).write_feed(make_feed())
+            expected = make_feed().toprettyxml() if pretty else make_feed().toxml() + "\n"
+            self.assertEqual(out.getvalue(), expected)
+
+    def test_order(self) -> None:
+        """Test that entries are written in document order, as soon as the entries before them are done."""
+        feed = make_feed()
+        entries = feeds.get_entries(feed)
+        out = io.StringIO()
+        with writer.FeedWriter(out) as feed_writer:
+            feed_writer.start(feed)
+            head = out.getvalue()
+            self.assertTrue(head.endswith("<title>Test &quot;feed&quot;</title>"))
+            feed_writer.write_entry(entries[1])
+            self.assertEqual(out.getvalue(), head)
+            entries[0].parentNode.removeChild(entries[0]) # e.g. the article could not be downloaded
+            feed_writer.write_entry(entries[0])
+            self.assertIn("<id>1</id>", out.getvalue())
+            self.assertNotIn("<id>0</id>", out.getvalue())
+            self.assertNotIn("<id>2</id>", out.getvalue())
+        # Entries that were not marked as done are written when the writer is closed
+        self.assertIn("<id>2</id>", out.getvalue())
+        self.assertEqual(len(feeds.get_entries(parseString(out.getvalue()))), 2)
+
+    def test_enrich(self) -> None:
+        """Test writing entries from enrich_articles."""
+        feed = make_feed()
+        out = io.StringIO()
+        def getter(entry, sess):
+            return entry if feeds.get_entry_id(entry) == "1" else (entry, None)
+        def setter(entry, res, doc):
+            entry.appendChild(feeds.create_text_node("summary", "Enriched", doc))
+        with writer.FeedWriter(out) as feed_writer:
+            feed_writer.start(feed)
+            feeds.enrich_articles(feed, getter, setter, None, window=2, on_entry=feed_writer.write_entry) # type: ignore
+        result = parseString(out.getvalue())
+        self.assertEqual([feeds.get_entry_id(e) for e in feeds.get_entries(result)], ["0", "2"])
+        self.assertEqual(len(result.getElementsByTagName("summary")), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,108 @@
+#! /usr/bin/python3
+
+"""
+Write an Atom feed incrementally, rather than serializing the whole document at once.
+The feed's head is written as soon as the feed is ready, and each entry as soon as it has been enriched,
+so readers receive output early, and each entry's nodes can be freed once they have been written.
+"""
+
+from collections import deque
+from typing import IO
+from xml.dom.minidom import Document, Element
+from xml.sax.saxutils import quoteattr
+import sys
+
+from .feeds import get_entries, is_entry
+from .metrics import time_stage
+
+class FeedWriter:
+    """Write an Atom feed to a text stream (by default, standard output), one entry at a time.
+
+    Call start with the feed, then pass write_entry as enrich_articles' on_entry callback, and call close at the end
+    (or use the writer in a with statement). Entries are written in document order:
+    an entry that is enriched early waits until the entries before it have been written.
+    Written entries are unlinked (their nodes are freed), so the feed cannot be used afterward.
+    If pretty is True, the output is indented like toprettyxml.
+    """
+    stream: IO[str]
+    pretty: bool
+    pending: deque[Element]
+    done: set[int]
+    started: bool
+    root_tag: str
+
+    def __init__(self, stream: IO[str]|None = None, pretty: bool = False):
+        self.stream = stream if stream is not None else sys.stdout
+        self.pretty = pretty
+        self.pending = deque()
+        self.done = set()
+        self.started = False
+        self.root_tag = "feed"
+
+    def start(self, feed: Document) -> None:
+        """Write the XML declaration, the <feed> start tag, and the feed's other (non-entry) children."""
+        if self.started:
+            raise RuntimeError("The feed has already been started")
+        self.started = True
+        root = feed.documentElement
+        newl = "\n" if self.pretty else ""
+        with time_stage("serialize"):
+            self.stream.write(f"<?xml version=\"1.0\" ?>{newl}<{root.tagName}")
+            for key, val in root.attributes.items():
+                self.stream.write(f" {key}={quoteattr(val)}")
+            self.stream.write(f">{newl}")
+            for node in root.childNodes:
+                if not is_entry(node):
+                    self.write_node(node)
+            self.stream.flush()
+        self.root_tag = root.tagName
+        self.pending.extend(get_entries(feed))
+
+    def write_entry(self, entry: Element) -> None:
+        """Mark an entry as ready, and write it and any entries after it that are ready.
+        Entries that have been removed from the feed (e.g. because they could not be enriched) are skipped.
+        """
+        self.done.add(id(entry))
+        if not self.pending or id(self.pending[0]) not in self.done:
+            return
+        with time_stage("serialize"):
+            while self.pending and id(self.pending[0]) in self.done:
+                self.write_pending()
+            self.stream.flush()
+
+    def write_pending(self) -> None:
+        """Write the first pending entry, and free it."""
+        entry = self.pending.popleft()
+        self.done.discard(id(entry))
+        if entry.parentNode is not None:
+            self.write_node(entry)
+        entry.unlink()
+
+    def write_node(self, node) -> None:
+        """Write a node of the feed."""
+        if self.pretty:
+            node.writexml(self.stream, "\t", "\t", "\n")
+        else:
+            node.writexml(self.stream)
+
+    def close(self) -> None:
+        """Write the remaining entries (whether or not they are marked as ready), and end the feed."""
+        if not self.started:
+            return
+        with time_stage("serialize"):
+            while self.pending:
+                self.write_pending()
+            self.stream.write(f"</{self.root_tag}>\n")
+            self.stream.flush()
+        self.started = False
+
+    def write_feed(self, feed: Document) -> None:
+        """Write a complete feed."""
+        self.start(feed)
+        self.close()
+
+    def __enter__(self) -> "FeedWriter":
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()